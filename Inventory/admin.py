@@ -1,4 +1,6 @@
 from django.contrib import admin
-from .models import Item
+from .models import Category, Item, StockMovement
 
-admin.site.register(Item)
\ No newline at end of file
+admin.site.register(Item)
+admin.site.register(Category)
+admin.site.register(StockMovement)
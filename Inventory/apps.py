@@ -13,3 +13,7 @@ class InventoryConfig(AppConfig):
     
     # A human-readable name used in the Django Admin and other interfaces
     verbose_name = 'POS Inventory Management'
+
+    def ready(self):
+        # Register signal handlers that keep ItemDemandStats up to date
+        from . import signals  # noqa: F401
@@ -0,0 +1,439 @@
+"""
+Cold storage for old sales.
+
+Sales are never deleted, so POS_sale, POS_saleitem and POS_transaction (and
+with them backups, VACUUM and every unindexed scan) grow without bound.
+archive_sales() moves whole local-calendar months older than
+SALES_ARCHIVE_AFTER_DAYS out of the database into two compressed columnar
+files per month under SALES_ARCHIVE_DIR:
+
+    sales-2024-01-<token>.parquet   sales, with their transaction and sync key
+    lines-2024-01-<token>.parquet   sale lines
+
+Parquet needs pyarrow, which is optional; without it (or with
+SALES_ARCHIVE_FORMAT = 'csv') the files are gzip CSV. Every model column is
+kept (money as decimal strings, timestamps in UTC ISO format) plus the local
+`day`, so restore_month() writes back exactly what was archived, ids included
+(`manage.py restore_sales_archive`).
+
+The rollups (SaleItemUnit, DailySalesRecord) stay in the database: the
+dashboard, demand stats and forecasting keep reading them unchanged.
+Archived rows are removed with raw DELETEs, which skip the per-row sale
+signals. Each archived month is an ArchivedMonth row with its files'
+checksums. A month that gets new sales after it was archived (a late
+offline upload) is rewritten with them on the next run.
+
+Reads go through archived_lines() / archived_sales(), which load only the
+months asked for and cache the parsed files per process: the day's sale
+details, rollup rebuilds (so rebuilt rollups keep archived days) and
+sale_lines(), which returns live and archived lines together for
+forecasting features.
+"""
+import hashlib
+import os
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from functools import lru_cache
+
+import pandas as pd
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import IntegrityError, connection, models, transaction
+from django.utils import timezone
+
+from .models import ArchivedMonth, SyncedSale
+from .synthetic import insert_rows
+from .versions import bump_version
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+try:
+    from POS.models import Sale, SaleItem, Transaction
+except ImportError:
+    Sale = SaleItem = Transaction = None
+
+ARCHIVE_AFTER_DAYS = 730
+# format -> file extension
+ARCHIVE_FORMATS = {'parquet': 'parquet', 'csv': 'csv.gz'}
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+class ArchiveError(ValueError):
+    """A month cannot be archived, read or restored."""
+
+
+def archive_dir():
+    return getattr(settings, 'SALES_ARCHIVE_DIR', None) or os.path.join(settings.BASE_DIR, 'sales_archive')
+
+
+def archive_format(requested=None):
+    """The file format to write: `requested`, else SALES_ARCHIVE_FORMAT (CSV when pyarrow is missing)."""
+    fmt = requested or getattr(settings, 'SALES_ARCHIVE_FORMAT', 'parquet')
+    if fmt not in ARCHIVE_FORMATS:
+        raise ArchiveError(f"Unknown archive format '{fmt}' (use {' or '.join(ARCHIVE_FORMATS)}).")
+    if fmt == 'parquet' and pyarrow is None:
+        if requested:
+            raise ArchiveError("Parquet archives need pyarrow; install it or use the csv format.")
+        return 'csv'
+    return fmt
+
+
+def next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def month_bounds(month):
+    """Aware local midnights starting `month` and the month after it."""
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(month, time.min), tz),
+        timezone.make_aware(datetime.combine(next_month(month), time.min), tz),
+    )
+
+
+def _is_integer(field):
+    return isinstance(getattr(field, 'target_field', field), models.IntegerField)
+
+
+def _sale_columns():
+    """(column, model field) of a sales file; `day` has no field."""
+    return (
+        [(f.attname, f) for f in Sale._meta.concrete_fields] + [('day', None)]
+        + [(f'transaction.{f.attname}', f) for f in Transaction._meta.concrete_fields if f.attname != 'sale_id']
+        + [(f'sync.{f.attname}', f) for f in SyncedSale._meta.concrete_fields if f.attname != 'sale_id']
+    )
+
+
+def _line_columns():
+    return [(f.attname, f) for f in SaleItem._meta.concrete_fields] + [('day', None)]
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.astimezone(dt_timezone.utc).isoformat() if timezone.is_aware(value) else value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if value is None or isinstance(value, (int, str)):
+        return value
+    return str(value)
+
+
+def _frame(columns, rows):
+    """DataFrame of encoded rows: nullable Int64 for integer columns, strings otherwise."""
+    frame = pd.DataFrame([[_encode(value) for value in row] for row in rows],
+                         columns=[name for name, _ in columns], dtype=object)
+    for name, field in columns:
+        if field is not None and _is_integer(field):
+            frame[name] = frame[name].astype('Int64')
+    return frame
+
+
+def _values(frame, name):
+    return [None if pd.isna(value) else value for value in frame[name].tolist()]
+
+
+def _month_frames(sales):
+    """(sales frame, lines frame) for a queryset of sales."""
+    sale_fields = [f.attname for f in Sale._meta.concrete_fields]
+    ids = sales.values('id')
+    related = []
+    for model in (Transaction, SyncedSale):
+        names = [f.attname for f in model._meta.concrete_fields if f.attname != 'sale_id']
+        rows = model.objects.filter(sale_id__in=ids).values_list('sale_id', *names)
+        related.append(({row[0]: row[1:] for row in rows}, (None,) * len(names)))
+
+    days, sale_rows = {}, []
+    id_index, date_index = sale_fields.index('id'), sale_fields.index('date')
+    for row in sales.order_by('id').values_list(*sale_fields):
+        day = timezone.localtime(row[date_index]).date() if timezone.is_aware(row[date_index]) else row[date_index].date()
+        days[row[id_index]] = day
+        sale_rows.append(row + (day,) + sum((found.get(row[id_index], empty) for found, empty in related), ()))
+
+    line_fields = [f.attname for f in SaleItem._meta.concrete_fields]
+    sale_index = line_fields.index('sale_id')
+    line_rows = [
+        row + (days[row[sale_index]],)
+        for row in SaleItem.objects.filter(sale_id__in=ids).order_by('id').values_list(*line_fields)
+    ]
+    return _frame(_sale_columns(), sale_rows), _frame(_line_columns(), line_rows)
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_frame(frame, path, fmt):
+    if fmt == 'parquet':
+        frame.to_parquet(path, index=False, compression='zstd')
+    else:
+        frame.to_csv(path, index=False, compression='gzip')
+    return _file_sha256(path)
+
+
+@lru_cache(maxsize=8)
+def _read_file(path, fmt, kind, mtime_ns):
+    if fmt == 'parquet':
+        if pyarrow is None:
+            raise ArchiveError("Reading Parquet archives needs pyarrow.")
+        return pd.read_parquet(path)
+    frame = pd.read_csv(path, dtype=str, keep_default_na=False, na_values=[''])
+    for name, field in (_sale_columns() if kind == 'sales' else _line_columns()):
+        if name in frame.columns and field is not None and _is_integer(field):
+            frame[name] = pd.to_numeric(frame[name]).astype('Int64')
+    return frame
+
+
+def _path(entry, kind):
+    return os.path.join(archive_dir(), getattr(entry, f'{kind}_file'))
+
+
+def read_archive(entry, kind):
+    """The 'sales' or 'lines' DataFrame of an ArchivedMonth (cached and shared: do not modify it)."""
+    path = _path(entry, kind)
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        raise ArchiveError(f"Archive file {path} for {entry.month:%Y-%m} is missing.")
+    return _read_file(path, entry.format, kind, mtime_ns)
+
+
+def _remove(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _delete_sales(start, end):
+    """Raw-delete the sales made in [start, end) with their lines, transactions and sync keys."""
+    quote = connection.ops.quote_name
+    sale_table = quote(Sale._meta.db_table)
+    column = quote(Sale._meta.get_field('date').column)
+    where = f'{column} >= %s AND {column} < %s'
+    params = [connection.ops.adapt_datetimefield_value(start), connection.ops.adapt_datetimefield_value(end)]
+    with connection.cursor() as cursor:
+        for model in (SyncedSale, Transaction, SaleItem):
+            cursor.execute(
+                f'DELETE FROM {quote(model._meta.db_table)} WHERE {quote(model._meta.get_field("sale").column)} '
+                f'IN (SELECT {quote(Sale._meta.pk.column)} FROM {sale_table} WHERE {where})',
+                params,
+            )
+        cursor.execute(f'DELETE FROM {sale_table} WHERE {where}', params)
+
+
+def archive_month(month, fmt=None):
+    """
+    Move the sales of the local calendar month starting `month` to its
+    archive files. Returns the ArchivedMonth, or None if the month has no
+    sales in the database.
+    """
+    fmt = archive_format(fmt)
+    month = month.replace(day=1)
+    start, end = month_bounds(month)
+    written = []
+    try:
+        with transaction.atomic():
+            sales_frame, lines_frame = _month_frames(Sale.objects.filter(date__gte=start, date__lt=end))
+            if not len(sales_frame):
+                return None
+            entry = ArchivedMonth.objects.filter(month=month).first()
+            replaced = []
+            if entry is not None:
+                # Late sales join the month's existing files
+                sales_frame = pd.concat([read_archive(entry, 'sales'), sales_frame], ignore_index=True)
+                lines_frame = pd.concat([read_archive(entry, 'lines'), lines_frame], ignore_index=True)
+                replaced = [_path(entry, 'sales'), _path(entry, 'lines')]
+            else:
+                entry = ArchivedMonth(month=month)
+
+            os.makedirs(archive_dir(), exist_ok=True)
+            token = uuid.uuid4().hex[:8]
+            entry.format = fmt
+            for kind, frame in (('sales', sales_frame), ('lines', lines_frame)):
+                name = f'{kind}-{month:%Y-%m}-{token}.{ARCHIVE_FORMATS[fmt]}'
+                written.append(os.path.join(archive_dir(), name))
+                setattr(entry, f'{kind}_file', name)
+                setattr(entry, f'{kind}_sha256', _write_frame(frame, written[-1], fmt))
+            entry.sales = len(sales_frame)
+            entry.lines = len(lines_frame)
+            entry.total = sum((Decimal(value) for value in _values(sales_frame, 'total')), Decimal('0'))
+            entry.archived_at = timezone.now()
+
+            _delete_sales(start, end)
+            entry.save()
+            if connection.vendor != 'sqlite':
+                bump_version('sale')
+            transaction.on_commit(lambda: _remove(replaced))
+    except BaseException:
+        _remove(written)
+        raise
+    return entry
+
+
+def archive_sales(older_than_days=None, fmt=None, progress=None):
+    """
+    Archive every month that ended more than `older_than_days` (default
+    SALES_ARCHIVE_AFTER_DAYS) days ago, one transaction per month.
+    `progress(entry)` is called after each. Returns the ArchivedMonths.
+    """
+    if older_than_days is None:
+        older_than_days = getattr(settings, 'SALES_ARCHIVE_AFTER_DAYS', ARCHIVE_AFTER_DAYS)
+    fmt = archive_format(fmt)
+    cutoff = timezone.localdate() - timedelta(days=older_than_days)
+    first = Sale.objects.order_by('date').values_list('date', flat=True).first()
+    archived = []
+    if first is None:
+        return archived
+    month = (timezone.localtime(first) if timezone.is_aware(first) else first).date().replace(day=1)
+    while next_month(month) <= cutoff:
+        entry = archive_month(month, fmt)
+        if entry is not None:
+            archived.append(entry)
+            if progress:
+                progress(entry)
+        month = next_month(month)
+    return archived
+
+
+def _archived(kind, first, last):
+    columns = [name for name, _ in (_sale_columns() if kind == 'sales' else _line_columns())]
+    frames = []
+    for entry in ArchivedMonth.objects.filter(month__gte=first.replace(day=1), month__lte=last):
+        frame = read_archive(entry, kind)
+        frames.append(frame[(frame['day'] >= first.isoformat()) & (frame['day'] <= last.isoformat())])
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+def archived_sales(first, last=None):
+    """Archived sales made on the local dates first..last (default: first only), as a DataFrame."""
+    return _archived('sales', first, last or first)
+
+
+def archived_lines(first, last=None):
+    """
+    Archived sale lines of the local dates first..last (default: first
+    only): the SaleItem columns plus `day` (YYYY-MM-DD). Empty when none of
+    those months are archived.
+    """
+    return _archived('lines', first, last or first)
+
+
+def line_rows(frame):
+    """(product_id, product_name, day, quantity, price, line_total) for each line of an archived lines frame."""
+    return [
+        (None if product_id is None else int(product_id), name, date.fromisoformat(day), int(quantity),
+         Decimal(price), Decimal(line_total))
+        for product_id, name, day, quantity, price, line_total in zip(*(
+            _values(frame, column) for column in ('product_id', 'product_name', 'day', 'quantity', 'price', 'line_total')
+        ))
+    ]
+
+
+def archived_rollup_rows(first, last):
+    """
+    Rollup rows for the archived sales on the local dates first..last, shaped
+    like rollups.aggregate_partition()'s: ([(product_id, product_name, day,
+    quantity, revenue)], [(day, total)]).
+    """
+    units = OrderedDict()
+    for product_id, name, day, quantity, _price, line_total in line_rows(archived_lines(first, last)):
+        row = units.setdefault((product_id, name if product_id is None else '', day), [product_id, name, day, 0, Decimal('0')])
+        row[3] += quantity
+        row[4] += line_total
+    days = OrderedDict()
+    sales = archived_sales(first, last)
+    for day, total in zip(_values(sales, 'day'), _values(sales, 'total')):
+        day = date.fromisoformat(day)
+        days[day] = days.get(day, Decimal('0')) + Decimal(total)
+    return [tuple(row) for row in units.values()], list(days.items())
+
+
+def sale_lines(first, last):
+    """
+    Every sale line of the local dates first..last, live and archived, as a
+    DataFrame (day, product_id, product_name, quantity, price, line_total)
+    ordered by day, for forecasting features that need lines rather than the
+    per-day rollups.
+    """
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(first, time.min), tz)
+    end = timezone.make_aware(datetime.combine(last + timedelta(days=1), time.min), tz)
+    rows = [
+        (timezone.localtime(sold_at).date(), product_id, name, quantity, price, line_total)
+        for sold_at, product_id, name, quantity, price, line_total in SaleItem.objects.filter(
+            sale_id__in=Sale.objects.filter(date__gte=start, date__lt=end).values('id')
+        ).values_list('sale__date', 'product_id', 'product_name', 'quantity', 'price', 'line_total')
+    ]
+    rows += [
+        (day, product_id, name, quantity, price, line_total)
+        for product_id, name, day, quantity, price, line_total in line_rows(archived_lines(first, last))
+    ]
+    frame = pd.DataFrame(rows, columns=['day', 'product_id', 'product_name', 'quantity', 'price', 'line_total'])
+    return frame.sort_values('day', kind='stable', ignore_index=True)
+
+
+def _decode(field, value):
+    if value is None:
+        return '' if not field.null and isinstance(field, (models.CharField, models.TextField)) else None
+    return field.to_python(value)
+
+
+def _restore_rows(cursor, model, frame, prefix=''):
+    """Insert a model's rows from archived columns `prefix` + attname (the sale's `id` for its sale_id)."""
+    fields, columns = [], []
+    for field in model._meta.concrete_fields:
+        name = 'id' if prefix and field.attname == 'sale_id' else prefix + field.attname
+        if name in frame.columns:
+            values = [_decode(field, value) for value in _values(frame, name)]
+        else:
+            # Field added to the model after the month was archived
+            values = [field.get_default()] * len(frame)
+        fields.append(field.attname)
+        columns.append([field.get_db_prep_save(value, connection) for value in values])
+    insert_rows(cursor, model, fields, columns)
+
+
+def restore_month(month, keep_files=False):
+    """
+    Put an archived month's sales back into the database, ids included, and
+    forget the archive (its files are removed unless `keep_files`). The
+    rollups already count these sales. Returns (sales, lines) restored.
+    """
+    month = month.replace(day=1)
+    entry = ArchivedMonth.objects.filter(month=month).first()
+    if entry is None:
+        raise ArchiveError(f"{month:%Y-%m} is not archived.")
+    for kind in ('sales', 'lines'):
+        path = _path(entry, kind)
+        if not os.path.exists(path) or _file_sha256(path) != getattr(entry, f'{kind}_sha256'):
+            raise ArchiveError(f"Archive file {path} is missing or does not match its checksum.")
+    sales, lines = read_archive(entry, 'sales'), read_archive(entry, 'lines')
+    paths = [_path(entry, 'sales'), _path(entry, 'lines')]
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            _restore_rows(cursor, Sale, sales)
+            for prefix, model in (('transaction.', Transaction), ('sync.', SyncedSale)):
+                _restore_rows(cursor, model, sales[sales[f'{prefix}id'].notna()], prefix)
+            _restore_rows(cursor, SaleItem, lines)
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Sale, SaleItem, Transaction, SyncedSale]):
+                cursor.execute(sql)
+            entry.delete()
+            if connection.vendor != 'sqlite':
+                bump_version('sale')
+            if not keep_files:
+                transaction.on_commit(lambda: _remove(paths))
+    except IntegrityError as exc:
+        raise ArchiveError(f"Cannot restore {month:%Y-%m}: {exc}") from exc
+    return len(sales), len(lines)
@@ -0,0 +1,249 @@
+"""
+Process-local SKU snapshot for scanner-driven checkout.
+
+Each worker keeps {sku: item} in memory (id, name, price, stock, color_hex,
+thumbnail URL) so a scan is a dictionary lookup instead of a query. The
+snapshot carries a version: the highest ItemChange id it has seen. At most
+once every CATALOG_SYNC_INTERVAL seconds a lookup reads the latest version
+(one primary-key lookup) and, when it moved, reloads only the items changed
+since then. A full reload happens on first use, when the feed was pruned
+past the snapshot's version, or when more than CATALOG_DELTA_LIMIT items
+changed at once (e.g. after a large import). Reads never write: old feed
+rows are removed by prune_catalog_changes() from a periodic command.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import Item, ItemChange
+from .thumbnails import THUMBNAIL_WIDTHS, derivative_name
+
+CATALOG_SYNC_INTERVAL = 1.0
+CATALOG_DELTA_LIMIT = 5000
+CATALOG_LOAD_CHUNK_SIZE = 2000
+# Feed rows older than this are pruned; snapshots that old reload in full
+CHANGE_FEED_RETENTION = timedelta(days=2)
+SCAN_MAX_CODES = 500
+
+SNAPSHOT_FIELDS = ('id', 'sku', 'name', 'price', 'stock', 'color_hex', 'image', 'image_digest')
+CHANGE_TRIGGERS = ('Inventory_item_change_ai', 'Inventory_item_change_au', 'Inventory_item_change_ad')
+
+# Same statements as migration 0009, used to repair the feed when a later
+# table rebuild (SQLite ALTER emulation) drops the triggers
+_TRIGGER_SQL = [
+    """CREATE TRIGGER IF NOT EXISTS Inventory_item_change_ai AFTER INSERT ON Inventory_item BEGIN
+        INSERT INTO Inventory_itemchange(item_id, deleted, changed_at)
+        VALUES (new.id, 0, strftime('%Y-%m-%d %H:%M:%f', 'now'));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS Inventory_item_change_au AFTER UPDATE ON Inventory_item
+    WHEN old.sku IS NOT new.sku OR old.name IS NOT new.name OR old.price IS NOT new.price
+        OR old.stock IS NOT new.stock OR old.color_hex IS NOT new.color_hex
+        OR old.image IS NOT new.image OR old.image_digest IS NOT new.image_digest
+    BEGIN
+        INSERT INTO Inventory_itemchange(item_id, deleted, changed_at)
+        VALUES (new.id, 0, strftime('%Y-%m-%d %H:%M:%f', 'now'));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS Inventory_item_change_ad AFTER DELETE ON Inventory_item BEGIN
+        INSERT INTO Inventory_itemchange(item_id, deleted, changed_at)
+        VALUES (old.id, 1, strftime('%Y-%m-%d %H:%M:%f', 'now'));
+    END""",
+]
+
+_lock = threading.Lock()
+_state = {'version': None, 'modified': None, 'checked_at': None, 'by_id': {}, 'by_sku': {}, 'by_key': {}}
+
+
+def uses_change_triggers():
+    return connection.vendor == 'sqlite'
+
+
+def ensure_change_triggers():
+    """Recreate missing change-feed triggers. Returns True if any were missing."""
+    if not uses_change_triggers():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (%s, %s, %s)",
+            list(CHANGE_TRIGGERS),
+        )
+        if cursor.fetchone()[0] == len(CHANGE_TRIGGERS):
+            return False
+        for sql in _TRIGGER_SQL:
+            cursor.execute(sql)
+    return True
+
+
+def record_item_change(item_id, deleted=False):
+    """Feed entry for backends without the triggers (called from signals.py)."""
+    if not uses_change_triggers():
+        ItemChange.objects.create(item_id=item_id, deleted=deleted)
+
+
+def latest_version():
+    """(highest change id, its time); (0, None) before the first change."""
+    return ItemChange.objects.order_by('-id').values_list('id', 'changed_at').first() or (0, None)
+
+
+def _entry(row):
+    media_url = getattr(settings, 'MEDIA_URL', '/media/')
+    return {
+        'id': row['id'],
+        'sku': row['sku'],
+        'name': row['name'],
+        'price': str(row['price']),
+        'stock': row['stock'],
+        'color_hex': row['color_hex'],
+        'thumbnail_url': (
+            f"{media_url}{derivative_name(row['image'], row['image_digest'], THUMBNAIL_WIDTHS[0], 'webp')}"
+            if row['image'] and row['image_digest']
+            else (f"{media_url}{row['image']}" if row['image'] else None)
+        ),
+    }
+
+
+def _drop(item_id):
+    old = _state['by_id'].pop(item_id, None)
+    if old and old['sku']:
+        if _state['by_sku'].get(old['sku']) is old:
+            del _state['by_sku'][old['sku']]
+        if _state['by_key'].get(old['sku'].casefold()) is old:
+            del _state['by_key'][old['sku'].casefold()]
+
+
+def _put(entry):
+    _drop(entry['id'])
+    _state['by_id'][entry['id']] = entry
+    if entry['sku']:
+        _state['by_sku'][entry['sku']] = entry
+        _state['by_key'].setdefault(entry['sku'].casefold(), entry)
+
+
+def _full_load(version):
+    _state.update({'by_id': {}, 'by_sku': {}, 'by_key': {}})
+    for row in Item.objects.order_by('id').values(*SNAPSHOT_FIELDS).iterator(chunk_size=CATALOG_LOAD_CHUNK_SIZE):
+        _put(_entry(row))
+    _state['version'] = version
+    return len(_state['by_id'])
+
+
+def prune_catalog_changes(retention=CHANGE_FEED_RETENTION):
+    """
+    Delete feed rows older than `retention`, keeping the newest so the
+    version never drops. Runs from `manage.py prune_catalog_changes` (and
+    nightly with snapshot_stock), never on the read path. Returns the rows deleted.
+    """
+    newest = ItemChange.objects.order_by('-id').values_list('id', flat=True).first()
+    if newest is None:
+        return 0
+    return ItemChange.objects.filter(changed_at__lt=timezone.now() - retention, id__lt=newest).delete()[0]
+
+
+def changed_item_ids(version, latest):
+    """Distinct item ids changed in (version, latest], or None if the feed no longer covers it."""
+    oldest = ItemChange.objects.aggregate(oldest=Min('id'))['oldest']
+    if oldest is None or oldest > version + 1:
+        return None
+    ids = set(
+        ItemChange.objects.filter(id__gt=version, id__lte=latest)
+        .values_list('item_id', flat=True).distinct()[:CATALOG_DELTA_LIMIT + 1]
+    )
+    return None if len(ids) > CATALOG_DELTA_LIMIT else ids
+
+
+def _apply_delta(item_ids, latest):
+    found = set()
+    for row in Item.objects.filter(id__in=list(item_ids)).values(*SNAPSHOT_FIELDS):
+        _put(_entry(row))
+        found.add(row['id'])
+    for item_id in item_ids - found:
+        _drop(item_id)
+    _state['version'] = latest
+    return len(item_ids)
+
+
+def sync_catalog(force=False):
+    """
+    Bring this process's snapshot up to date. Returns the number of items
+    (re)loaded: 0 when nothing changed or the last check was too recent.
+    """
+    with _lock:
+        now = time.monotonic()
+        version = _state['version']
+        if not force and version is not None and now - _state['checked_at'] < CATALOG_SYNC_INTERVAL:
+            return 0
+        latest, _state['modified'] = latest_version()
+        _state['checked_at'] = now
+        if version is not None and latest == version:
+            return 0
+        if version is None or latest < version:
+            # First use, or the database went back in time (restore, rollback)
+            return _full_load(latest)
+        item_ids = changed_item_ids(version, latest)
+        if item_ids is None:
+            return _full_load(latest)
+        return _apply_delta(item_ids, latest)
+
+
+def mark_catalog_stale():
+    """Make the next lookup in this process check the version (local writes)."""
+    with _lock:
+        _state['checked_at'] = float('-inf')
+
+
+def reset_catalog():
+    """Drop the snapshot; the next lookup reloads everything."""
+    with _lock:
+        _state.update({'version': None, 'modified': None, 'checked_at': None, 'by_id': {}, 'by_sku': {}, 'by_key': {}})
+
+
+def catalog_version():
+    sync_catalog()
+    return _state['version']
+
+
+def catalog_modified():
+    """Time of the change the snapshot is at (None before any change)."""
+    sync_catalog()
+    return _state['modified']
+
+
+def lookup_codes(codes):
+    """
+    Resolve scanned codes against the snapshot. Exact SKU matches win; a
+    code typed in a different case falls back to a case-insensitive match.
+    Returns (version, {code: item dict or None}).
+    """
+    sync_catalog()
+    with _lock:
+        by_sku, by_key = _state['by_sku'], _state['by_key']
+        found = {}
+        for code in codes:
+            key = str(code).strip()
+            found[code] = by_sku.get(key) or by_key.get(key.casefold())
+        return _state['version'], found
+
+
+def catalog_changes(since=None):
+    """
+    Delta for clients that cache the catalogue themselves. Returns
+    (version, items changed since `since`, ids removed since then, reset);
+    reset is True (and every item is returned) when `since` is missing or
+    too old for the feed.
+    """
+    sync_catalog()
+    version = _state['version']
+    item_ids = None
+    if since is not None and since <= version:
+        item_ids = set() if since == version else changed_item_ids(since, version)
+    with _lock:
+        by_id = _state['by_id']
+        if item_ids is None:
+            return version, list(by_id.values()), [], True
+        items = [by_id[item_id] for item_id in sorted(item_ids) if item_id in by_id]
+        removed = sorted(item_id for item_id in item_ids if item_id not in by_id)
+    return version, items, removed, False
@@ -0,0 +1,88 @@
+"""
+Per-process cache of the Category table.
+
+Category dropdowns and filters read names and ids from memory instead of
+running SELECT DISTINCT over Item. Saving or deleting a Category clears
+this process's cache (see signals.py); other processes pick the change up
+within CATEGORY_CACHE_TTL seconds.
+"""
+import threading
+import time
+
+from django.db import IntegrityError, transaction
+
+UNCATEGORIZED = 'Uncategorized'
+CATEGORY_CACHE_TTL = 60
+
+_lock = threading.Lock()
+_cache = {'loaded_at': None, 'names': [], 'by_key': {}}
+
+
+def normalize_category_name(name):
+    """Collapse whitespace; blank names become 'Uncategorized'."""
+    name = ' '.join(str(name or '').split())[:100]
+    return name or UNCATEGORIZED
+
+
+def category_key(name):
+    """Case-insensitive identity used to dedupe category names."""
+    return normalize_category_name(name).casefold()
+
+
+def _snapshot():
+    from .models import Category
+
+    with _lock:
+        loaded_at = _cache['loaded_at']
+        if loaded_at is None or time.monotonic() - loaded_at > CATEGORY_CACHE_TTL:
+            rows = list(Category.objects.order_by('name').values_list('id', 'name'))
+            _cache.update({
+                'loaded_at': time.monotonic(),
+                'names': [name for _, name in rows],
+                'by_key': {name.casefold(): (category_id, name) for category_id, name in rows},
+            })
+        return _cache
+
+
+def invalidate_category_cache():
+    """Force the next read to reload categories from the database."""
+    with _lock:
+        _cache['loaded_at'] = None
+
+
+def category_names():
+    """Sorted category names for dropdowns (no query while the cache is warm)."""
+    return list(_snapshot()['names'])
+
+
+def category_id(name):
+    """Id of the category called `name` (case-insensitive), or None."""
+    found = _snapshot()['by_key'].get(category_key(name))
+    return found[0] if found else None
+
+
+def resolve_category(name):
+    """
+    Return the Category for `name`, matching case-insensitively and creating
+    it on first use.
+    """
+    from .models import Category
+
+    name = normalize_category_name(name)
+    found = _snapshot()['by_key'].get(name.casefold())
+    if found:
+        # Confirm by primary key: the cache may hold a row from a rolled-back transaction
+        category = Category.objects.filter(pk=found[0]).first()
+        if category is not None:
+            return category
+
+    category = Category.objects.filter(name__iexact=name).first()
+    if category is None:
+        try:
+            with transaction.atomic():
+                category = Category.objects.create(name=name)
+        except IntegrityError:
+            # Another request created it first
+            category = Category.objects.get(name__iexact=name)
+    invalidate_category_cache()
+    return category
@@ -0,0 +1,151 @@
+"""
+Cascade delete for products, including their sales history.
+
+Every model that points at Item with on_delete=CASCADE (POS SaleItem,
+ForecastResult, RestockLog, ItemDemandStats, ...) is cleared in primary-key
+ranges of DELETE_BATCH_SIZE rows, so no single statement touches an
+unbounded number of rows.
+
+- Small histories are removed in one transaction together with the item.
+- Histories above BACKGROUND_DELETE_THRESHOLD sales rows become a
+  ProductDeletionJob run in a background thread: each batch commits on its
+  own so other terminals' writes interleave, progress is stored on the job,
+  and the final sweep plus the item row are deleted in one transaction.
+  A failed or interrupted job can be resumed with `manage.py run_deletion_jobs`.
+"""
+import threading
+
+from django.db import close_old_connections, connection, models, transaction
+from django.utils import timezone
+
+from .models import Item, ProductDeletionJob
+
+DELETE_BATCH_SIZE = 1000
+BACKGROUND_DELETE_THRESHOLD = 20000
+
+try:
+    from POS.models import SaleItem
+except ImportError:
+    SaleItem = None
+
+
+def _cascade_relations():
+    """(model, field name) for every relation deleted along with an Item."""
+    return [
+        (rel.related_model, rel.field.name)
+        for rel in Item._meta.related_objects
+        if rel.on_delete is models.CASCADE
+    ]
+
+
+def related_sales_count(item_id):
+    """Number of sale lines recorded for the item (one indexed count)."""
+    if SaleItem is None:
+        return 0
+    return SaleItem.objects.filter(product_id=item_id).count()
+
+
+def count_related_rows(item_id):
+    """Rows in every cascading table that reference the item."""
+    return sum(
+        model._base_manager.filter(**{field: item_id}).count()
+        for model, field in _cascade_relations()
+    )
+
+
+def _delete_batch(model, field, item_id, batch_size):
+    """Deletes up to `batch_size` of the item's rows in `model`, lowest primary keys first."""
+    rows = model._base_manager.filter(**{field: item_id})
+    boundary = rows.order_by('pk').values_list('pk', flat=True)[batch_size - 1:batch_size].first()
+    if boundary is not None:
+        rows = rows.filter(pk__lte=boundary)
+    deleted, _ = rows.delete()
+    return deleted
+
+
+def _iter_batches(item_id, batch_size):
+    """Yields (model, deleted) for successive batches until no related rows remain."""
+    for model, field in _cascade_relations():
+        while True:
+            deleted = _delete_batch(model, field, item_id, batch_size)
+            if not deleted:
+                break
+            yield model, deleted
+
+
+def delete_item_cascade(item_id, batch_size=DELETE_BATCH_SIZE):
+    """
+    Deletes the item and all related rows in a single transaction.
+    Returns the number of related rows removed.
+    """
+    with transaction.atomic():
+        removed = sum(deleted for _, deleted in _iter_batches(item_id, batch_size))
+        Item.objects.filter(pk=item_id).delete()
+    return removed
+
+
+# ==================== BACKGROUND JOBS ====================
+def run_deletion_job(job_id, batch_size=DELETE_BATCH_SIZE):
+    """
+    Runs (or resumes) a deletion job. Each batch and its progress update
+    commit together; the last sweep and the item delete share one
+    transaction, so the item only disappears once its history is gone.
+    """
+    job = ProductDeletionJob.objects.get(pk=job_id)
+    if job.status == 'done':
+        return job
+    job.status = 'running'
+    job.error = ''
+    job.save(update_fields=['status', 'error', 'updated_at'])
+
+    try:
+        batches = _iter_batches(job.item_id, batch_size)
+        while True:
+            with transaction.atomic():
+                deleted = next(batches, None)
+                if deleted is None:
+                    break
+                job.deleted_rows += deleted[1]
+                job.save(update_fields=['deleted_rows', 'updated_at'])
+        with transaction.atomic():
+            job.deleted_rows += delete_item_cascade(job.item_id, batch_size)
+            job.status = 'done'
+            job.finished_at = timezone.now()
+            job.save(update_fields=['deleted_rows', 'status', 'finished_at', 'updated_at'])
+    except Exception as e:
+        print(f"Error in product deletion job {job.id}: {e}")
+        job.status = 'failed'
+        job.error = str(e)
+        job.save(update_fields=['status', 'error', 'updated_at'])
+    return job
+
+
+def _run_in_thread(job_id):
+    close_old_connections()
+    try:
+        run_deletion_job(job_id)
+    finally:
+        connection.close()
+
+
+def _launch_job(job_id):
+    threading.Thread(target=_run_in_thread, args=(job_id,), daemon=True, name=f"delete-product-{job_id}").start()
+
+
+def start_deletion_job(item, user=None):
+    """
+    Queues a background deletion for `item` (reusing an unfinished job for
+    the same item) and starts it once the surrounding transaction commits.
+    """
+    job = ProductDeletionJob.objects.filter(item_id=item.id).exclude(status='done').first()
+    if job is None:
+        job = ProductDeletionJob.objects.create(
+            item_id=item.id,
+            item_name=item.name,
+            item_sku=item.sku,
+            total_rows=count_related_rows(item.id),
+            requested_by=user if user is not None and user.is_authenticated else None,
+        )
+    if job.status != 'running':
+        transaction.on_commit(lambda: _launch_job(job.id))
+    return job
@@ -0,0 +1,129 @@
+"""
+Streaming report exports shared by the Inventory and Sales_forecast apps.
+
+Reports are described as a list of ReportSheet objects whose rows are plain
+iterables (ideally generators over `queryset.iterator()` / `values_list`), so
+no report is ever materialized in memory:
+
+- XLSX uses openpyxl's write-only mode, which spools rows to disk as they are
+  appended; the finished file is then streamed back in fixed-size chunks.
+- CSV skips spreadsheet encoding entirely and streams each row as soon as it
+  is produced.
+"""
+import csv
+import tempfile
+from dataclasses import dataclass, field
+
+from django.http import StreamingHttpResponse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CSV_CONTENT_TYPE = 'text/csv'
+STREAM_CHUNK_SIZE = 64 * 1024
+QUERYSET_CHUNK_SIZE = 2000
+
+
+@dataclass
+class ReportSheet:
+    """One worksheet (or CSV section) of a report."""
+    title: str
+    rows: object
+    header: list = None
+    bold_header: bool = False
+    column_widths: list = field(default_factory=list)
+
+
+class _Echo:
+    """File-like object whose write() just returns the value, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _iter_file(handle, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield a file's contents in chunks and close it when done."""
+    try:
+        while True:
+            chunk = handle.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        handle.close()
+
+
+def _attachment(response, filename):
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def write_xlsx(sheets, handle):
+    """Write sheets to a binary file handle with an openpyxl write-only workbook."""
+    wb = Workbook(write_only=True)
+    for sheet in sheets:
+        ws = wb.create_sheet(title=sheet.title[:31])
+        for idx, width in enumerate(sheet.column_widths, start=1):
+            ws.column_dimensions[get_column_letter(idx)].width = width
+        if sheet.header:
+            if sheet.bold_header:
+                header_cells = []
+                for value in sheet.header:
+                    cell = WriteOnlyCell(ws, value=value)
+                    cell.font = Font(bold=True)
+                    header_cells.append(cell)
+                ws.append(header_cells)
+            else:
+                ws.append(list(sheet.header))
+        for row in sheet.rows:
+            ws.append(list(row))
+    wb.save(handle)
+
+
+def stream_xlsx_response(filename, sheets):
+    """
+    Build the workbook in a temporary file (rows never accumulate in memory)
+    and return a StreamingHttpResponse that sends it in chunks.
+    """
+    handle = tempfile.TemporaryFile()
+    try:
+        write_xlsx(sheets, handle)
+        handle.seek(0)
+    except Exception:
+        handle.close()
+        raise
+    response = StreamingHttpResponse(_iter_file(handle), content_type=XLSX_CONTENT_TYPE)
+    return _attachment(response, filename)
+
+
+def iter_csv(sheets):
+    """Yield CSV-encoded lines for every sheet; sections are separated by a blank line."""
+    writer = csv.writer(_Echo())
+    multiple = len(sheets) > 1
+    for index, sheet in enumerate(sheets):
+        if multiple:
+            if index:
+                yield writer.writerow([])
+            yield writer.writerow([sheet.title])
+        if sheet.header:
+            yield writer.writerow(sheet.header)
+        for row in sheet.rows:
+            yield writer.writerow(row)
+
+
+def stream_csv_response(filename, sheets):
+    """Return a StreamingHttpResponse that emits CSV rows as they are produced."""
+    response = StreamingHttpResponse(iter_csv(sheets), content_type=CSV_CONTENT_TYPE)
+    return _attachment(response, filename)
+
+
+def stream_report(request, basename, sheets):
+    """
+    Dispatch to the CSV or XLSX writer based on `?format=csv` (XLSX by default).
+    `basename` is the filename without extension.
+    """
+    if request.GET.get('format', '').lower() == 'csv':
+        return stream_csv_response(f"{basename}.csv", sheets)
+    return stream_xlsx_response(f"{basename}.xlsx", sheets)
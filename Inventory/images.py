@@ -0,0 +1,144 @@
+"""
+Cached catalogue of server-side inventory images (MEDIA_ROOT/inventory_images).
+
+The directory is scanned once and kept in a per-process cache. Each request
+only stats the directory itself: when its mtime changes (a file was added,
+removed or renamed) the listing is refreshed, re-reading metadata only for
+files whose size or mtime changed. Views that upload or delete images call
+invalidate_image_catalogue() so the next read rescans even on filesystems
+with coarse mtime resolution.
+"""
+import hashlib
+import os
+import threading
+
+from django.conf import settings
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from .thumbnails import is_derivative_name
+
+IMAGES_SUBDIR = 'inventory_images'
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp')
+HASH_CHUNK_SIZE = 64 * 1024
+
+_lock = threading.Lock()
+_catalogue = {'dir': None, 'mtime_ns': None, 'entries': [], 'by_name': {}}
+
+
+def _images_dir():
+    media_root = getattr(settings, 'MEDIA_ROOT', None)
+    return os.path.join(media_root, IMAGES_SUBDIR) if media_root else None
+
+
+def _content_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _dimensions(path):
+    """Read width/height from the image header (no full decode)."""
+    if Image is None:
+        return None, None
+    try:
+        with Image.open(path) as img:
+            return img.size
+    except Exception:
+        return None, None
+
+
+def _describe(entry, images_dir, media_url, previous):
+    """Build the catalogue record for one directory entry, reusing unchanged metadata."""
+    stat = entry.stat()
+    cached = previous.get(entry.name)
+    if cached and cached['size'] == stat.st_size and cached['_mtime_ns'] == stat.st_mtime_ns:
+        return cached
+
+    width, height = _dimensions(entry.path)
+    return {
+        'name': entry.name,
+        'path': f"{IMAGES_SUBDIR}/{entry.name}",
+        'url': f"{media_url.rstrip('/')}/{IMAGES_SUBDIR}/{entry.name}",
+        'size': stat.st_size,
+        'width': width,
+        'height': height,
+        'hash': _content_hash(entry.path),
+        '_mtime_ns': stat.st_mtime_ns,
+    }
+
+
+def _scan(images_dir, previous):
+    media_url = getattr(settings, 'MEDIA_URL', '/media/')
+    entries = []
+    with os.scandir(images_dir) as it:
+        for entry in it:
+            # Thumbnails live next to their originals but are not pickable images
+            if entry.is_file() and not entry.name.startswith('.') and not is_derivative_name(entry.name):
+                entries.append(_describe(entry, images_dir, media_url, previous))
+    entries.sort(key=lambda e: e['name'])
+    return entries
+
+
+def get_image_catalogue():
+    """
+    Return the list of image records (name, path, url, size, width, height, hash),
+    sorted by name. Costs a single directory stat when nothing has changed.
+    """
+    images_dir = _images_dir()
+    if not images_dir:
+        return []
+    try:
+        mtime_ns = os.stat(images_dir).st_mtime_ns
+    except OSError:
+        return []
+
+    with _lock:
+        if _catalogue['dir'] == images_dir and _catalogue['mtime_ns'] == mtime_ns:
+            return _catalogue['entries']
+        previous = _catalogue['by_name'] if _catalogue['dir'] == images_dir else {}
+        entries = _scan(images_dir, previous)
+        _catalogue.update({
+            'dir': images_dir,
+            'mtime_ns': mtime_ns,
+            'entries': entries,
+            'by_name': {e['name']: e for e in entries},
+        })
+        return entries
+
+
+def invalidate_image_catalogue():
+    """Force the next get_image_catalogue() call to rescan the directory."""
+    with _lock:
+        _catalogue['mtime_ns'] = None
+
+
+def image_exists(relative_path):
+    """True when `relative_path` (e.g. 'inventory_images/foo.jpg') is in the catalogue."""
+    if not relative_path or not relative_path.startswith(f"{IMAGES_SUBDIR}/"):
+        return False
+    name = relative_path[len(IMAGES_SUBDIR) + 1:]
+    get_image_catalogue()
+    return name in _catalogue['by_name']
+
+
+def search_images(query='', offset=0, limit=48, extensions=IMAGE_EXTENSIONS):
+    """
+    Case-insensitive substring search over image names.
+    Returns (page_of_public_records, total_matches).
+    """
+    query = (query or '').strip().lower()
+    matches = [
+        e for e in get_image_catalogue()
+        if e['name'].lower().endswith(extensions) and (not query or query in e['name'].lower())
+    ]
+    page = [
+        {k: v for k, v in e.items() if not k.startswith('_')}
+        for e in matches[offset:offset + limit]
+    ]
+    return page, len(matches)
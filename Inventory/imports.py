@@ -0,0 +1,259 @@
+"""
+Streaming product import (CSV or XLSX) with upsert-by-SKU semantics.
+
+Rows are parsed lazily (csv.reader over the upload, or openpyxl's
+read-only worksheet iterator), validated one by one and written in chunks
+with a single INSERT ... ON CONFLICT(sku) DO UPDATE per chunk, so imports of
+100k+ rows run in constant memory. Invalid rows are skipped and reported
+with their row number; valid rows in the same chunk are still imported.
+
+Column headers are case-insensitive and accept the names used by the
+inventory export ('Product Name', 'Price', 'Stock Quantity', ...), so an
+exported sheet can be edited and imported back.
+"""
+import csv
+import io
+import re
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from itertools import zip_longest
+
+from django.db import transaction
+
+from .categories import UNCATEGORIZED, resolve_category
+from .ledger import record_movements
+from .models import Item
+
+IMPORT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+REQUIRED_COLUMNS = ('sku', 'name', 'price')
+COLUMN_ALIASES = {
+    'product name': 'name',
+    'name': 'name',
+    'sku': 'sku',
+    'price': 'price',
+    'selling price': 'price',
+    'category': 'category',
+    'stock': 'stock',
+    'stock quantity': 'stock',
+    'min stock level': 'min_stock_level',
+    'minimum stock level': 'min_stock_level',
+    'min_stock_level': 'min_stock_level',
+    'color': 'color_hex',
+    'color_hex': 'color_hex',
+    'background color': 'color_hex',
+}
+COLOR_HEX_RE = re.compile(r'^#[0-9a-fA-F]{6}$')
+
+
+class ImportFormatError(ValueError):
+    """The file cannot be imported at all (unknown type or missing columns)."""
+
+
+@dataclass
+class ImportResult:
+    """Summary of one import run."""
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    skipped: int = 0
+    # one dict per rejected row: row, sku, message (capped at MAX_REPORTED_ERRORS)
+    errors: list = field(default_factory=list)
+    seconds: float = 0.0
+
+    def add_error(self, row, sku, message):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row, 'sku': sku, 'message': message})
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+# ==================== PARSING ====================
+def _normalize_header(header):
+    columns = [COLUMN_ALIASES.get(str(name or '').strip().lower()) for name in header]
+    missing = [name for name in REQUIRED_COLUMNS if name not in columns]
+    if missing:
+        raise ImportFormatError(f"Missing required column(s): {', '.join(missing)}.")
+    return columns
+
+
+def _iter_csv(handle):
+    text = io.TextIOWrapper(handle, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text)
+    try:
+        columns = _normalize_header(next(reader))
+    except StopIteration:
+        return
+    for row_number, values in enumerate(reader, start=2):
+        if any(values):
+            yield row_number, dict(zip_longest(columns, values))
+
+
+def _iter_xlsx(handle):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(handle, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        try:
+            columns = _normalize_header(next(rows))
+        except StopIteration:
+            return
+        for row_number, values in enumerate(rows, start=2):
+            if any(value not in (None, '') for value in values):
+                yield row_number, dict(zip_longest(columns, values))
+    finally:
+        wb.close()
+
+
+def iter_import_rows(handle, filename):
+    """Yield (row_number, {column: raw value}) from a binary CSV or XLSX file."""
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return _iter_csv(handle)
+    if name.endswith(('.xlsx', '.xlsm')):
+        return _iter_xlsx(handle)
+    raise ImportFormatError("Unsupported file type; upload a .csv or .xlsx file.")
+
+
+# ==================== VALIDATION ====================
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        # Spreadsheets store numeric SKUs as floats
+        value = int(value)
+    return str(value).strip()
+
+
+def _whole_number(value, label):
+    text = _text(value)
+    try:
+        number = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"{label} must be a whole number.")
+    if number != number.to_integral_value() or number < 0:
+        raise ValueError(f"{label} must be a whole number of 0 or more.")
+    return int(number)
+
+
+def validate_import_row(raw, columns):
+    """
+    Turn one raw row into Item field values. `columns` are the columns
+    present in the file; absent columns and blank optional cells are left out
+    so updates keep the item's current value. Raises ValueError with a
+    readable message.
+    """
+    sku = _text(raw.get('sku'))
+    name = _text(raw.get('name'))
+    if not sku:
+        raise ValueError("SKU is required.")
+    if len(sku) > Item._meta.get_field('sku').max_length:
+        raise ValueError("SKU is too long.")
+    if not name:
+        raise ValueError("Product name is required.")
+    if len(name) > Item._meta.get_field('name').max_length:
+        raise ValueError("Product name is too long.")
+    try:
+        price = Decimal(_text(raw.get('price')).replace(',', '').lstrip('₱'))
+    except InvalidOperation:
+        raise ValueError("Price must be a number.")
+    if price < 0 or price >= Decimal('1e8'):
+        raise ValueError("Price is out of range.")
+
+    values = {'sku': sku, 'name': name, 'price': price.quantize(Decimal('0.01'))}
+    if 'category' in columns:
+        values['category'] = _text(raw.get('category'))[:100] or UNCATEGORIZED
+    if 'stock' in columns and _text(raw.get('stock')):
+        values['stock'] = _whole_number(raw.get('stock'), "Stock")
+    if 'min_stock_level' in columns and _text(raw.get('min_stock_level')):
+        values['min_stock_level'] = _whole_number(raw.get('min_stock_level'), "Min stock level")
+    if 'color_hex' in columns and _text(raw.get('color_hex')):
+        color = _text(raw.get('color_hex'))
+        if not COLOR_HEX_RE.match(color):
+            raise ValueError("Color must look like #aabbcc.")
+        values['color_hex'] = color.lower()
+    return values
+
+
+# ==================== WRITING ====================
+def _upsert_chunk(values_by_sku, result, reference=''):
+    """INSERT ... ON CONFLICT(sku) DO UPDATE for one chunk of validated rows."""
+    if not values_by_sku:
+        return
+    # Rows that left an optional cell blank must not overwrite that field,
+    # so rows are grouped by the set of fields they provide
+    categories = {}
+    groups = {}
+    for values in values_by_sku.values():
+        name = values.get('category', UNCATEGORIZED)
+        if name not in categories:
+            categories[name] = resolve_category(name)
+        item = Item(**values)
+        # Without a category column these only apply to new items, since
+        # category is then not in update_fields
+        item.category = categories[name].name
+        item.category_ref = categories[name]
+        fields = set(values)
+        if 'category' in values:
+            fields.add('category_ref')
+        groups.setdefault(frozenset(fields), []).append(item)
+    with transaction.atomic():
+        existing = dict(Item.objects.filter(sku__in=list(values_by_sku)).values_list('sku', 'stock'))
+        # Stock set by the file is recorded in the ledger as the difference
+        stock_changes = {}
+        for sku, values in values_by_sku.items():
+            if 'stock' in values and values['stock'] != existing.get(sku, 0):
+                stock_changes[sku] = values['stock'] - existing.get(sku, 0)
+        for fields, items in groups.items():
+            Item.objects.bulk_create(
+                items,
+                update_conflicts=True,
+                unique_fields=['sku'],
+                update_fields=sorted(fields - {'sku'}),
+            )
+        if stock_changes:
+            ids = dict(Item.objects.filter(sku__in=list(stock_changes)).values_list('sku', 'id'))
+            record_movements('import', {ids[sku]: change for sku, change in stock_changes.items()}, reference)
+    result.updated += len(existing)
+    result.created += len(values_by_sku) - len(existing)
+
+
+def import_products(handle, filename, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    """
+    Stream-import products from a CSV/XLSX file object.
+
+    Each chunk is upserted by SKU (a repeated SKU inside one chunk keeps the
+    last row). `progress(result)` is called after every chunk. Raises
+    ImportFormatError when the file itself is unusable.
+    """
+    result = ImportResult()
+    reference = f"import:{filename or ''}"[:100]
+    started = time.perf_counter()
+    columns = None
+    chunk = {}
+    for row_number, raw in iter_import_rows(handle, filename):
+        if columns is None:
+            columns = set(raw)
+        result.rows += 1
+        try:
+            values = validate_import_row(raw, columns)
+        except ValueError as e:
+            result.add_error(row_number, _text(raw.get('sku')), str(e))
+            continue
+        chunk[values['sku']] = values
+        if len(chunk) >= chunk_size:
+            _upsert_chunk(chunk, result, reference)
+            chunk = {}
+            result.seconds = time.perf_counter() - started
+            if progress:
+                progress(result)
+    _upsert_chunk(chunk, result, reference)
+    result.seconds = time.perf_counter() - started
+    if progress:
+        progress(result)
+    return result
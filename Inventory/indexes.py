@@ -0,0 +1,47 @@
+"""
+Indexes on the POS tables for the hot sales queries.
+
+The POS models declare no indexes beyond primary and foreign keys, so date
+filters on sales scanned whole tables. These match the query shapes:
+
+- POS_sale (date): sales by time range (rollup rebuilds, the day's sale
+  details, which reach POS_saleitem through its sale_id index)
+- POS_transaction (date): transactions by time range
+- POS_saleitemunit (date, product_id): rollups by date range, optionally
+  per product (dashboard top sellers, demand stats); (product_id, date) is
+  the unique index from migration 0014
+
+ForecastResult's (run, product, date) index is declared on the model.
+Migration 0015 creates these; ensure_pos_indexes() recreates any that a
+SQLite table rebuild in a later POS migration drops (called on post_migrate).
+"""
+from django.db import connection
+
+# name -> (table, columns); same as migration 0015
+POS_INDEXES = {
+    'POS_sale_date_idx': ('POS_sale', ('date',)),
+    'POS_transaction_date_idx': ('POS_transaction', ('date',)),
+    'POS_saleitemunit_date_product_idx': ('POS_saleitemunit', ('date', 'product_id')),
+}
+
+
+def index_sql(name, table, columns):
+    quote = connection.ops.quote_name
+    return f"CREATE INDEX {quote(name)} ON {quote(table)} ({', '.join(quote(column) for column in columns)})"
+
+
+def ensure_pos_indexes():
+    """Create missing POS indexes. Returns the names created."""
+    created = []
+    with connection.cursor() as cursor:
+        tables = set(connection.introspection.table_names(cursor))
+        present = {}
+        for name, (table, columns) in POS_INDEXES.items():
+            if table not in tables:
+                continue
+            if table not in present:
+                present[table] = set(connection.introspection.get_constraints(cursor, table))
+            if name not in present[table]:
+                cursor.execute(index_sql(name, table, columns))
+                created.append(name)
+    return created
@@ -0,0 +1,160 @@
+"""
+Stock ledger queries: stock on a date, daily snapshots and reconciliation.
+
+StockMovement rows are the history; StockSnapshot rows hold an item's
+closing stock for each day it moved. Stock at the end of a date is the
+latest snapshot on or before it plus the movements after that snapshot's
+day, so a query reads one snapshot and at most the days not yet
+snapshotted (`manage.py snapshot_stock` runs nightly).
+"""
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from .models import Item, StockMovement, StockSnapshot
+
+SNAPSHOT_BATCH_SIZE = 1000
+
+
+def record_movements(kind, quantities, reference='', user=None):
+    """Append one movement per {item_id: signed quantity}; zero quantities are skipped."""
+    movements = [
+        StockMovement(item_id=item_id, kind=kind, quantity=quantity, reference=reference[:100], user=user)
+        for item_id, quantity in quantities.items() if quantity
+    ]
+    StockMovement.objects.bulk_create(movements, batch_size=SNAPSHOT_BATCH_SIZE)
+    return len(movements)
+
+
+def day_start(day):
+    """Start of `day` in the current time zone (movements are bucketed by local day)."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _last_snapshot_date():
+    return StockSnapshot.objects.order_by('-date').values_list('date', flat=True).first()
+
+
+def stock_on_date(item_id, day):
+    """Closing stock of an item on `day`: one snapshot lookup plus the movements after it."""
+    snapshot = (
+        StockSnapshot.objects.filter(item_id=item_id, date__lte=day)
+        .order_by('-date').values_list('date', 'stock').first()
+    )
+    movements = StockMovement.objects.filter(item_id=item_id, created_at__lt=day_start(day + timedelta(days=1)))
+    base = 0
+    if snapshot is not None:
+        snapshot_date, base = snapshot
+        movements = movements.filter(created_at__gte=day_start(snapshot_date + timedelta(days=1)))
+    return base + (movements.aggregate(total=Sum('quantity'))['total'] or 0)
+
+
+def _latest_snapshots(before=None, item_ids=None):
+    """{item_id: stock} from each item's latest snapshot (before `before`, if given)."""
+    snapshots = StockSnapshot.objects.all()
+    if before is not None:
+        snapshots = snapshots.filter(date__lt=before)
+    latest_date = snapshots.filter(item_id=OuterRef('item_id')).order_by('-date').values('date')[:1]
+    rows = snapshots.filter(date=Subquery(latest_date))
+    if item_ids is not None:
+        rows = rows.filter(item_id__in=item_ids)
+    return dict(rows.values_list('item_id', 'stock'))
+
+
+def _movement_totals(start=None, end=None):
+    movements = StockMovement.objects.all()
+    if start is not None:
+        movements = movements.filter(created_at__gte=start)
+    if end is not None:
+        movements = movements.filter(created_at__lt=end)
+    return dict(movements.values('item_id').annotate(total=Sum('quantity')).values_list('item_id', 'total'))
+
+
+def _take_snapshot(day):
+    """
+    Write closing snapshots for every item that moved on `day`, carried
+    forward from each item's previous snapshot. Days must be snapshotted in
+    order (see take_snapshots). Returns the rows written.
+    """
+    moved = _movement_totals(day_start(day), day_start(day + timedelta(days=1)))
+    if not moved:
+        return 0
+    previous = _latest_snapshots(before=day, item_ids=list(moved))
+    with transaction.atomic():
+        StockSnapshot.objects.filter(date=day).delete()
+        StockSnapshot.objects.bulk_create(
+            [StockSnapshot(item_id=item_id, date=day, stock=previous.get(item_id, 0) + total)
+             for item_id, total in moved.items()],
+            batch_size=SNAPSHOT_BATCH_SIZE,
+        )
+    return len(moved)
+
+
+def take_snapshots(through=None):
+    """
+    Snapshot every complete day after the last snapshot, up to `through`
+    (default yesterday). Returns {day: rows written} for days with movements.
+    """
+    today = timezone.localdate()
+    through = min(through or today - timedelta(days=1), today - timedelta(days=1))
+    last = _last_snapshot_date()
+    if last is None:
+        first = StockMovement.objects.order_by('created_at').values_list('created_at', flat=True).first()
+        if first is None:
+            return {}
+        day = timezone.localtime(first).date()
+    else:
+        day = last + timedelta(days=1)
+    written = {}
+    while day <= through:
+        rows = _take_snapshot(day)
+        if rows:
+            written[day] = rows
+        day += timedelta(days=1)
+    return written
+
+
+def ledger_balances():
+    """{item_id: stock according to the ledger}: latest snapshots plus later movements."""
+    last = _last_snapshot_date()
+    balances = _latest_snapshots()
+    since = day_start(last + timedelta(days=1)) if last else None
+    for item_id, total in _movement_totals(start=since).items():
+        balances[item_id] = balances.get(item_id, 0) + total
+    return balances
+
+
+@dataclass
+class StockMismatch:
+    item_id: int
+    name: str
+    stock: int
+    ledger: int
+
+    @property
+    def difference(self):
+        return self.stock - self.ledger
+
+
+def reconcile_stock(fix=False, user=None):
+    """
+    Compare every Item.stock with the ledger using grouped queries rather
+    than a replay per item. With fix=True, a 'correction' movement per
+    mismatch brings the ledger in line with Item.stock. Returns the list of
+    StockMismatch.
+    """
+    with transaction.atomic():
+        balances = ledger_balances()
+        mismatches = [
+            StockMismatch(item_id, name, stock, balances.get(item_id, 0))
+            for item_id, name, stock in Item.objects.order_by('id').values_list('id', 'name', 'stock').iterator()
+            if stock != balances.get(item_id, 0)
+        ]
+        if fix and mismatches:
+            record_movements(
+                'correction', {m.item_id: m.difference for m in mismatches}, reference='reconcile_stock', user=user,
+            )
+    return mismatches
@@ -0,0 +1,263 @@
+"""
+Live stock and sales updates over Server-Sent Events.
+
+One LiveHub per process polls the change feeds every LIVE_POLL_INTERVAL
+seconds while at least one client is connected: ItemChange (see
+catalog.py) for stock, and new POS Sale rows for sales. Each batch is
+encoded once and handed to every subscriber. The number of feed queries
+therefore does not grow with the number of connected terminals, and an
+idle stream only wakes for its heartbeat.
+
+Events (the SSE id is "<item version>-<last sale id>"):
+
+    event: stock    data: [[item_id, stock], ...]
+    event: removed  data: [item_id, ...]
+    event: sale     data: [{"id": 12, "total": "125.00", "date": "..."}, ...]
+    event: reset    data: {}   (the client missed too much; refetch once)
+
+Reconnecting clients send Last-Event-ID and get the changes they missed
+before the live batches. Under ASGI (POSwithSalesForecast/asgi.py) a
+stream is an asyncio task. Under WSGI each stream holds a worker thread, so
+it ends after WSGI_STREAM_SECONDS and the browser reconnects.
+"""
+import asyncio
+import itertools
+import json
+import queue
+import threading
+import time
+
+from django.db import close_old_connections, connection
+
+from .catalog import changed_item_ids
+from .models import Item, ItemChange
+
+try:
+    from POS.models import Sale
+except ImportError:
+    Sale = None
+
+LIVE_POLL_INTERVAL = 1.0
+LIVE_HEARTBEAT = 15
+LIVE_RETRY_MS = 3000
+# Batches buffered per client; a client this far behind is disconnected and
+# catches up from its Last-Event-ID when it reconnects
+LIVE_QUEUE_SIZE = 100
+LIVE_SALES_LIMIT = 200
+WSGI_STREAM_SECONDS = 55
+
+HEARTBEAT = b': ping\n\n'
+
+
+def parse_cursor(value):
+    """'<item version>-<sale id>' -> (int, int), or None if missing or malformed."""
+    try:
+        version, sale_id = str(value).split('-')
+        return int(version), int(sale_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def _event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data, separators=(',', ':'))}\n"
+
+
+def encode_events(cursor, stock=(), removed=(), sales=(), reset=False):
+    """One SSE message block for a batch (empty bytes if there is nothing to send)."""
+    lines = []
+    if reset:
+        lines.append(_event('reset', {}))
+    if stock:
+        lines.append(_event('stock', stock))
+    if removed:
+        lines.append(_event('removed', removed))
+    if sales:
+        lines.append(_event('sale', sales))
+    if not lines:
+        return b''
+    # One id line per message: it applies to every event above it
+    return (''.join(f"{line}id: {cursor[0]}-{cursor[1]}\n\n" for line in lines)).encode()
+
+
+def _latest_cursor():
+    version = ItemChange.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    sale_id = (Sale.objects.order_by('-id').values_list('id', flat=True).first() or 0) if Sale is not None else 0
+    return version, sale_id
+
+
+def _sales_between(after, upto=None):
+    """
+    The oldest LIVE_SALES_LIMIT sales after `after` (up to `upto`), and the id
+    of the last one returned; the rest follow from that id on the next read.
+    """
+    if Sale is None:
+        return [], after
+    sales = Sale.objects.filter(id__gt=after)
+    if upto is not None:
+        sales = sales.filter(id__lte=upto)
+    rows = list(sales.order_by('id').values('id', 'total', 'date')[:LIVE_SALES_LIMIT])
+    last = rows[-1]['id'] if rows else after
+    return [{'id': row['id'], 'total': str(row['total']), 'date': row['date'].isoformat()} for row in rows], last
+
+
+def _stock_changes(version, latest):
+    """([[item_id, stock], ...], [removed ids], reset) for item changes in (version, latest]."""
+    if version >= latest:
+        # Nothing new, or the client is ahead of this process (it saw another worker)
+        return [], [], False
+    item_ids = changed_item_ids(version, latest)
+    if item_ids is None:
+        return [], [], True
+    found = dict(Item.objects.filter(id__in=list(item_ids)).values_list('id', 'stock'))
+    stock = sorted([item_id, value] for item_id, value in found.items())
+    removed = sorted(item_id for item_id in item_ids if item_id not in found)
+    return stock, removed, False
+
+
+def changes_between(since, upto):
+    """
+    Encoded events for the changes in (since, upto]. `since` too old for the
+    feed, or more than LIVE_SALES_LIMIT missed sales, gives a reset event.
+    """
+    stock, removed, reset = _stock_changes(since[0], upto[0])
+    sales = []
+    if since[1] < upto[1]:
+        sales, last = _sales_between(since[1], upto[1])
+        if last < upto[1]:
+            # More missed sales than one batch holds: have the client reload instead
+            sales, reset = [], True
+    return encode_events(upto, stock, removed, sales, reset)
+
+
+class LiveHub:
+    """Shared feed poller with push delivery to every connected stream."""
+
+    def __init__(self, interval=LIVE_POLL_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._ids = itertools.count()
+        self._thread = None
+        self.cursor = None
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self, deliver, since=None):
+        """
+        Register `deliver(chunk)` for future batches and start polling if
+        needed. Returns (token, catch-up bytes for `since`).
+        """
+        with self._lock:
+            if self.cursor is None:
+                self.cursor = _latest_cursor()
+            cursor = self.cursor
+            token = next(self._ids)
+            self._subscribers[token] = deliver
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name='live-hub')
+                self._thread.start()
+        # Batches after `cursor` arrive through deliver(); fill the gap before it
+        catch_up = changes_between(since, cursor) if since is not None and since != cursor else b''
+        return token, catch_up
+
+    def unsubscribe(self, token):
+        with self._lock:
+            self._subscribers.pop(token, None)
+
+    def poll(self):
+        """Read the feeds once and deliver anything new. Returns the chunk sent."""
+        since = self.cursor
+        version = ItemChange.objects.order_by('-id').values_list('id', flat=True).first() or since[0]
+        stock, removed, reset = _stock_changes(since[0], version)
+        sales, sale_id = _sales_between(since[1])
+        upto = (version, sale_id)
+        chunk = encode_events(upto, stock, removed, sales, reset)
+        self.publish(chunk, upto)
+        return chunk
+
+    def publish(self, chunk, cursor=None):
+        """Hand an encoded batch to every subscriber, moving the cursor to `cursor` if given."""
+        with self._lock:
+            if cursor is not None:
+                self.cursor = cursor
+            if chunk:
+                for deliver in list(self._subscribers.values()):
+                    deliver(chunk)
+
+    def _run(self):
+        close_old_connections()
+        try:
+            while True:
+                time.sleep(self.interval)
+                with self._lock:
+                    if not self._subscribers:
+                        # Idle: forget the cursor so the next client starts fresh
+                        self._thread = None
+                        self.cursor = None
+                        return
+                try:
+                    self.poll()
+                except Exception as e:
+                    print(f"Error polling live updates: {e}")
+        finally:
+            connection.close()
+
+
+hub = LiveHub()
+
+
+def _offer(q, chunk):
+    """Queue a chunk for one client; a full queue ends that client's stream."""
+    try:
+        q.put_nowait(chunk)
+    except (asyncio.QueueFull, queue.Full):
+        while not q.empty():
+            q.get_nowait()
+        q.put_nowait(None)
+
+
+async def async_event_stream(since=None, live_hub=None):
+    """SSE body for ASGI servers: one asyncio queue per client, no thread."""
+    from asgiref.sync import sync_to_async
+
+    live_hub = live_hub or hub
+    loop = asyncio.get_running_loop()
+    q = asyncio.Queue(LIVE_QUEUE_SIZE)
+    token, catch_up = await sync_to_async(live_hub.subscribe)(
+        lambda chunk: loop.call_soon_threadsafe(_offer, q, chunk), since
+    )
+    try:
+        yield f"retry: {LIVE_RETRY_MS}\n\n".encode() + catch_up
+        while True:
+            try:
+                chunk = await asyncio.wait_for(q.get(), LIVE_HEARTBEAT)
+            except asyncio.TimeoutError:
+                chunk = HEARTBEAT
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        live_hub.unsubscribe(token)
+
+
+def sync_event_stream(since=None, live_hub=None, duration=None):
+    """SSE body for WSGI servers; ends after `duration` so the worker thread is released."""
+    live_hub = live_hub or hub
+    duration = WSGI_STREAM_SECONDS if duration is None else duration
+    q = queue.Queue(LIVE_QUEUE_SIZE)
+    token, catch_up = live_hub.subscribe(lambda chunk: _offer(q, chunk), since)
+    deadline = time.monotonic() + duration
+    try:
+        yield f"retry: {LIVE_RETRY_MS}\n\n".encode() + catch_up
+        while time.monotonic() < deadline:
+            try:
+                chunk = q.get(timeout=min(LIVE_HEARTBEAT, max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                chunk = HEARTBEAT
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        live_hub.unsubscribe(token)
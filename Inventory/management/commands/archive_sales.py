@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from Inventory.archive import ARCHIVE_AFTER_DAYS, ARCHIVE_FORMATS, ArchiveError, Sale, archive_dir, archive_sales
+
+
+class Command(BaseCommand):
+    help = (
+        "Move sales older than --older-than-days out of the database into monthly compressed files "
+        "(Parquet with pyarrow, else gzip CSV). The rollups stay; restore_sales_archive puts a month back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int,
+                            default=getattr(settings, 'SALES_ARCHIVE_AFTER_DAYS', ARCHIVE_AFTER_DAYS),
+                            help='Archive months that ended more than this many days ago')
+        parser.add_argument('--format', choices=sorted(ARCHIVE_FORMATS),
+                            help='File format (default SALES_ARCHIVE_FORMAT)')
+        parser.add_argument('--vacuum', action='store_true', help='VACUUM the SQLite database afterwards')
+
+    def handle(self, *args, **options):
+        if Sale is None:
+            raise CommandError('POS models are not available.')
+        if options['older_than_days'] < 0:
+            raise CommandError('--older-than-days cannot be negative.')
+
+        def progress(entry):
+            self.stdout.write(f'{entry.month:%Y-%m}: {entry.sales} sale(s), {entry.lines} line(s) -> {entry.sales_file}')
+
+        try:
+            archived = archive_sales(options['older_than_days'], options['format'], progress)
+        except ArchiveError as exc:
+            raise CommandError(str(exc))
+        if not archived:
+            self.stdout.write('No sales old enough to archive.')
+            return
+        if options['vacuum'] and connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {len(archived)} month(s), {sum(entry.sales for entry in archived)} sale(s) to {archive_dir()}.'
+        ))
@@ -0,0 +1,83 @@
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from Inventory.checkout import checkout
+from Inventory.models import Item
+
+try:
+    from POS.models import Sale, SaleItem
+except ImportError:
+    Sale = SaleItem = None
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Time checkouts of 1, 10 and 50 line carts through the checkout service and "
+        "through per-line saves, on throwaway products. Nothing is kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1,10,50', help='Comma-separated cart sizes')
+        parser.add_argument('--runs', type=int, default=30, help='Checkouts timed per cart size')
+        parser.add_argument('--no-legacy', action='store_true', help='Skip the per-line save comparison')
+
+    def handle(self, *args, **options):
+        if Sale is None:
+            raise CommandError('POS models are not available.')
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('--sizes must be comma-separated whole numbers.')
+        if options['runs'] < 1 or not sizes or min(sizes) < 1:
+            raise CommandError('--runs and every size must be positive.')
+
+        self.stdout.write(f"{'cart':>5} {'path':<10} {'queries':>8} {'median ms':>10} {'p95 ms':>8} {'mean ms':>8}")
+        try:
+            with transaction.atomic():
+                products = Item.objects.bulk_create([
+                    Item(name=f'Benchmark item {index}', category='Benchmark', price=Decimal('10.00'), stock=10 ** 6)
+                    for index in range(max(sizes))
+                ])
+                ids = [product.id for product in products]
+                for size in sizes:
+                    lines = [{'product_id': product_id, 'quantity': 1} for product_id in ids[:size]]
+                    self._report(size, 'service', lambda: checkout(lines, amount_given='1000000'), options['runs'])
+                    if not options['no_legacy']:
+                        self._report(size, 'per-line', lambda: self._legacy(products[:size]), options['runs'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _report(self, size, path, run_once, runs):
+        with CaptureQueriesContext(connection) as queries:
+            run_once()
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            run_once()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f"{size:>5} {path:<10} {len(queries):>8} {statistics.median(timings):>10.2f} "
+            f"{p95:>8.2f} {statistics.mean(timings):>8.2f}"
+        )
+
+    def _legacy(self, products):
+        # The pattern generate_dummy_transactions used: each SaleItem.save() re-aggregates the sale
+        sale = Sale()
+        sale.save()
+        for product in products:
+            SaleItem(sale=sale, product=product, product_name=product.name, quantity=1, price=product.price).save()
+        sale.update_totals()
+        sale.amount_given = sale.total
+        sale.save()
@@ -0,0 +1,58 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+
+from django.core.management.base import BaseCommand
+
+from Inventory.models import Item
+from Inventory.thumbnails import THUMBNAIL_WIDTHS, generate_derivatives
+
+
+def _generate(path, widths, force):
+    # Runs in a worker process: plain paths in, (path, digest, count) out
+    digest, written = generate_derivatives(path, widths=widths, force=force)
+    return path, digest, len(written)
+
+
+class Command(BaseCommand):
+    help = "Backfill WebP/JPEG thumbnails for existing product images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes (default: CPU count)')
+        parser.add_argument('--force', action='store_true', help='Rewrite thumbnails that already exist')
+        parser.add_argument('--widths', type=int, nargs='+', default=list(THUMBNAIL_WIDTHS), help='Widths to generate')
+
+    def handle(self, *args, **options):
+        storage = Item._meta.get_field('image').storage
+        widths = tuple(options['widths'])
+        force = options['force']
+
+        # Several items may share one picked image; process each file once
+        items_by_path = {}
+        for item_id, name in Item.objects.exclude(image='').exclude(image__isnull=True).values_list('id', 'image'):
+            path = storage.path(name)
+            if os.path.exists(path):
+                items_by_path.setdefault(path, []).append(item_id)
+            else:
+                self.stderr.write(f'Missing image for item {item_id}: {name}')
+
+        if not items_by_path:
+            self.stdout.write('No images to process.')
+            return
+
+        written_total = 0
+        failed = 0
+        with ProcessPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            futures = {pool.submit(_generate, path, widths, force): path for path in items_by_path}
+            for future in as_completed(futures):
+                try:
+                    path, digest, written = future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'Error generating thumbnails for {futures[future]}: {e}')
+                    continue
+                written_total += written
+                Item.objects.filter(id__in=items_by_path[path]).update(image_digest=digest)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {len(items_by_path) - failed} image(s), wrote {written_total} thumbnail(s), {failed} failed.'
+        ))
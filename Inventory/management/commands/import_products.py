@@ -0,0 +1,49 @@
+import csv
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Inventory.imports import IMPORT_CHUNK_SIZE, ImportFormatError, import_products
+
+
+class Command(BaseCommand):
+    help = "Import (upsert by SKU) products from a CSV or XLSX file, reporting progress and throughput."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file to import')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, help=f'Rows per upsert batch (default {IMPORT_CHUNK_SIZE})')
+        parser.add_argument('--errors', help='Write rejected rows to this CSV file')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'File not found: {path}')
+
+        def progress(result):
+            self.stdout.write(
+                f'{result.rows:,} rows read, {result.created:,} created, {result.updated:,} updated, '
+                f'{result.skipped:,} skipped ({result.rows_per_second:,.0f} rows/s)'
+            )
+
+        try:
+            with open(path, 'rb') as handle:
+                result = import_products(handle, path, chunk_size=max(1, options['chunk_size']), progress=progress)
+        except ImportFormatError as e:
+            raise CommandError(str(e))
+
+        if options['errors'] and result.errors:
+            with open(options['errors'], 'w', newline='', encoding='utf-8') as fh:
+                writer = csv.DictWriter(fh, fieldnames=['row', 'sku', 'message'])
+                writer.writeheader()
+                writer.writerows(result.errors)
+            self.stdout.write(f'Wrote {len(result.errors)} rejected row(s) to {options["errors"]}')
+        elif result.errors:
+            for error in result.errors[:20]:
+                self.stderr.write(f"Row {error['row']} ({error['sku'] or 'no SKU'}): {error['message']}")
+            if result.skipped > 20:
+                self.stderr.write(f'... {result.skipped - 20} more; use --errors to save them all')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.created + result.updated:,} product(s) from {result.rows:,} rows '
+            f'in {result.seconds:.1f}s ({result.rows_per_second:,.0f} rows/s).'
+        ))
@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Inventory.live import LiveHub, async_event_stream, encode_events
+
+LOAD_TEST_ITEMS = 100
+
+
+class Command(BaseCommand):
+    help = (
+        "Connect many in-process SSE clients to a live hub, publish synthetic stock changes "
+        "while they listen, and report the CPU time the streams cost. Nothing is written."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=200)
+        parser.add_argument('--seconds', type=float, default=10.0)
+        parser.add_argument('--changes', type=int, default=10, help='Stock changes per second')
+        parser.add_argument('--interval', type=float, default=1.0, help='Hub poll interval in seconds')
+
+    def handle(self, *args, **options):
+        if options['clients'] < 1 or options['seconds'] <= 0 or options['changes'] < 0:
+            raise CommandError('--clients and --seconds must be positive and --changes not negative.')
+        result = asyncio.run(self._run(**options))
+        self.stdout.write(
+            f"{result['clients']} client(s), {result['changes']} change(s), "
+            f"{result['events']} batch(es) delivered in {result['wall']:.1f}s"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"CPU {result['cpu']:.2f}s ({result['cpu'] / result['wall']:.1%} of one core), "
+            f"{result['polls']} feed poll(s)"
+        ))
+
+    async def _run(self, clients, seconds, changes, interval, **options):
+        hub = LiveHub(interval=interval)
+        polls = 0
+        poll = hub.poll
+        # item id -> stock of the synthetic changes since the last poll
+        pending = {}
+
+        def counted_poll():
+            nonlocal polls
+            polls += 1
+            # The feeds are still read each interval; the stock changes are
+            # synthetic so the run never touches stock, movements or the feed
+            chunk = poll()
+            stock = []
+            while pending:
+                stock.append(list(pending.popitem()))
+            if stock:
+                hub.publish(encode_events(hub.cursor, sorted(stock)))
+            return chunk
+
+        hub.poll = counted_poll
+        received = [0] * clients
+
+        async def client(index):
+            stream = async_event_stream(live_hub=hub)
+            try:
+                async for chunk in stream:
+                    if chunk.startswith(b'event:'):
+                        received[index] += 1
+            finally:
+                await stream.aclose()
+
+        tasks = [asyncio.create_task(client(index)) for index in range(clients)]
+        made = 0
+        wall, cpu = time.monotonic(), time.process_time()
+        deadline = wall + seconds
+        while time.monotonic() < deadline:
+            if changes:
+                pending[made % LOAD_TEST_ITEMS + 1] = made
+                made += 1
+                await asyncio.sleep(1 / changes)
+            else:
+                await asyncio.sleep(min(1.0, deadline - time.monotonic()))
+        # Let the last batch reach the clients before stopping them
+        await asyncio.sleep(interval * 1.5)
+        wall, cpu = time.monotonic() - wall, time.process_time() - cpu
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return {
+            'clients': clients, 'changes': made, 'events': sum(received),
+            'wall': wall, 'cpu': cpu, 'polls': polls,
+        }
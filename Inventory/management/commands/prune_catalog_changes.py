@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Inventory.catalog import CHANGE_FEED_RETENTION, prune_catalog_changes
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete item change-feed rows older than the retention period. Snapshots and live "
+        "clients further behind reload in full. snapshot_stock runs this nightly too."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=CHANGE_FEED_RETENTION.total_seconds() / 3600,
+                            help='Keep feed rows newer than this many hours')
+
+    def handle(self, *args, **options):
+        if options['hours'] < 0:
+            raise CommandError('--hours cannot be negative.')
+        deleted = prune_catalog_changes(timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f'Pruned {deleted} change-feed row(s).'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from Inventory.ledger import reconcile_stock
+
+
+class Command(BaseCommand):
+    help = "Check every item's stock against the stock movement ledger."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Record correction movements so the ledger matches Item.stock')
+        parser.add_argument('--show', type=int, default=50, help='Mismatches to list (default 50)')
+
+    def handle(self, *args, **options):
+        mismatches = reconcile_stock(fix=options['fix'])
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('Stock matches the ledger for every item.'))
+            return
+        for m in mismatches[:max(0, options['show'])]:
+            self.stdout.write(f'{m.item_id} {m.name}: stock {m.stock}, ledger {m.ledger} ({m.difference:+d})')
+        if len(mismatches) > options['show']:
+            self.stdout.write(f'... and {len(mismatches) - options["show"]} more')
+        if options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'Recorded {len(mismatches)} correction movement(s).'))
+        else:
+            self.stderr.write(f'{len(mismatches)} item(s) differ from the ledger; rerun with --fix to record corrections.')
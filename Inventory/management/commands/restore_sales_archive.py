@@ -0,0 +1,38 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Inventory.archive import ArchiveError, restore_month
+from Inventory.models import ArchivedMonth
+
+
+class Command(BaseCommand):
+    help = "Put archived months of sales back into the database (see archive_sales)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', action='append', default=[], help='Month to restore, YYYY-MM (repeatable)')
+        parser.add_argument('--all', action='store_true', help='Restore every archived month')
+        parser.add_argument('--keep-files', action='store_true', help='Leave the archive files in place')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            months = list(ArchivedMonth.objects.values_list('month', flat=True))
+        elif options['month']:
+            try:
+                months = [datetime.strptime(value, '%Y-%m').date() for value in options['month']]
+            except ValueError:
+                raise CommandError('--month must be a month in YYYY-MM format.')
+        else:
+            raise CommandError('Pass --month YYYY-MM or --all.')
+        if not months:
+            self.stdout.write('No archived months.')
+            return
+        restored = 0
+        for month in months:
+            try:
+                sales, lines = restore_month(month, keep_files=options['keep_files'])
+            except ArchiveError as exc:
+                raise CommandError(str(exc))
+            restored += sales
+            self.stdout.write(f'{month:%Y-%m}: {sales} sale(s), {lines} line(s)')
+        self.stdout.write(self.style.SUCCESS(f'Restored {len(months)} month(s), {restored} sale(s).'))
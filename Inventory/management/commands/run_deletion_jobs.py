@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from Inventory.deletion import DELETE_BATCH_SIZE, run_deletion_job
+from Inventory.models import ProductDeletionJob
+
+
+class Command(BaseCommand):
+    help = "Run or resume unfinished background product deletions (e.g. after a server restart)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DELETE_BATCH_SIZE, help=f'Rows per delete batch (default {DELETE_BATCH_SIZE})')
+
+    def handle(self, *args, **options):
+        jobs = list(ProductDeletionJob.objects.exclude(status='done').order_by('created_at').values_list('id', flat=True))
+        if not jobs:
+            self.stdout.write('No unfinished deletion jobs.')
+            return
+        for job_id in jobs:
+            job = run_deletion_job(job_id, batch_size=max(1, options['batch_size']))
+            line = f'Job {job.id} ({job.item_name}): {job.status}, {job.deleted_rows} rows deleted'
+            if job.status == 'done':
+                self.stdout.write(self.style.SUCCESS(line))
+            else:
+                self.stderr.write(f'{line} - {job.error}')
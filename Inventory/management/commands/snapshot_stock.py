@@ -0,0 +1,37 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from Inventory.catalog import prune_catalog_changes
+from Inventory.ledger import take_snapshots
+from Inventory.valuation import snapshot_valuation
+
+
+class Command(BaseCommand):
+    help = (
+        "Write daily closing-stock snapshots for every complete day not yet snapshotted, "
+        "record the current stock value per category as yesterday's close, and prune the item "
+        "change feed (run nightly, after midnight)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--through', help='Last day to snapshot, YYYY-MM-DD (default yesterday)')
+
+    def handle(self, *args, **options):
+        through = None
+        if options['through']:
+            try:
+                through = date.fromisoformat(options['through'])
+            except ValueError:
+                raise CommandError('--through must be a date in YYYY-MM-DD format.')
+        written = take_snapshots(through)
+        categories = snapshot_valuation(timezone.localdate() - timedelta(days=1))
+        self.stdout.write(f'Valuation: {categories} category row(s)')
+        self.stdout.write(f'Change feed: {prune_catalog_changes()} row(s) pruned')
+        if not written:
+            self.stdout.write('Snapshots are up to date.')
+            return
+        for day, rows in written.items():
+            self.stdout.write(f'{day}: {rows} item(s)')
+        self.stdout.write(self.style.SUCCESS(f'Snapshotted {len(written)} day(s), {sum(written.values())} row(s).'))
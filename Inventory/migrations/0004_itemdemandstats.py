@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-16 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Inventory', '0003_item_min_stock_level'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemDemandStats',
+            fields=[
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='demand_stats', serialize=False, to='Inventory.item')),
+                ('window_date', models.DateField(db_index=True, verbose_name='Window End Date')),
+                ('sold_7d', models.PositiveIntegerField(default=0, verbose_name='Units Sold (7 days)')),
+                ('sold_30d', models.PositiveIntegerField(default=0, verbose_name='Units Sold (30 days)')),
+                ('sales_days_30d', models.PositiveSmallIntegerField(default=0, verbose_name='Sales Days (30 days)')),
+                ('dynamic_min_level', models.IntegerField(blank=True, null=True, verbose_name='Dynamic Minimum Stock Level')),
+                ('last_restock_at', models.DateTimeField(blank=True, null=True, verbose_name='Last Restocked')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Item Demand Stats',
+                'verbose_name_plural': 'Item Demand Stats',
+            },
+        ),
+    ]
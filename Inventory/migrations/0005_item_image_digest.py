@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Inventory', '0004_itemdemandstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='image_digest',
+            field=models.CharField(blank=True, default='', editable=False, max_length=12),
+        ),
+    ]
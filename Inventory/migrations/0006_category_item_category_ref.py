@@ -0,0 +1,65 @@
+# Generated by Django 5.2.6 on 2026-10-17 11:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _normalize(raw):
+    return ' '.join((raw or '').split())[:100] or 'Uncategorized'
+
+
+def link_categories(apps, schema_editor):
+    """
+    Create one Category per distinct category string (ignoring case and
+    extra whitespace), named after its most common spelling, then link every
+    item to it and normalize the item's label.
+    """
+    Category = apps.get_model('Inventory', 'Category')
+    Item = apps.get_model('Inventory', 'Item')
+
+    groups = {}
+    for raw, count in Item.objects.values_list('category').annotate(n=models.Count('id')):
+        groups.setdefault(_normalize(raw).casefold(), {})[raw] = count
+
+    for raws in groups.values():
+        spellings = {}
+        for raw, count in raws.items():
+            spellings[_normalize(raw)] = spellings.get(_normalize(raw), 0) + count
+        name = max(sorted(spellings), key=lambda spelling: spellings[spelling])
+        category = Category.objects.create(name=name)
+        Item.objects.filter(category__in=[raw for raw in raws if raw is not None]).update(category=name, category_ref=category)
+        if None in raws:
+            Item.objects.filter(category__isnull=True).update(category=name, category_ref=category)
+
+
+def unlink_categories(apps, schema_editor):
+    Item = apps.get_model('Inventory', 'Item')
+    Item.objects.update(category_ref=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Inventory', '0005_item_image_digest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Category Name')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Categories',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='category_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='items', to='Inventory.category', verbose_name='Category Link'),
+        ),
+        migrations.RunPython(link_categories, unlink_categories),
+    ]
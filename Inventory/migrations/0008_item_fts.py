@@ -0,0 +1,70 @@
+# Generated by Django 5.2.6 on 2026-10-17 12:30
+
+from django.db import migrations
+
+# External-content FTS5 index over Item name/SKU/category. Triggers keep it in
+# sync with every write path (ORM saves, bulk_create, queryset.update and raw
+# SQL), and only changes to the indexed columns touch the index.
+FTS_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS Inventory_item_fts USING fts5(
+        name, sku, category,
+        content='Inventory_item', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS Inventory_item_fts_ai AFTER INSERT ON Inventory_item BEGIN
+        INSERT INTO Inventory_item_fts(rowid, name, sku, category)
+        VALUES (new.id, new.name, coalesce(new.sku, ''), new.category);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS Inventory_item_fts_ad AFTER DELETE ON Inventory_item BEGIN
+        INSERT INTO Inventory_item_fts(Inventory_item_fts, rowid, name, sku, category)
+        VALUES ('delete', old.id, old.name, coalesce(old.sku, ''), old.category);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS Inventory_item_fts_au AFTER UPDATE OF name, sku, category ON Inventory_item BEGIN
+        INSERT INTO Inventory_item_fts(Inventory_item_fts, rowid, name, sku, category)
+        VALUES ('delete', old.id, old.name, coalesce(old.sku, ''), old.category);
+        INSERT INTO Inventory_item_fts(rowid, name, sku, category)
+        VALUES (new.id, new.name, coalesce(new.sku, ''), new.category);
+    END
+    """,
+    "INSERT INTO Inventory_item_fts(Inventory_item_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS Inventory_item_fts_au",
+    "DROP TRIGGER IF EXISTS Inventory_item_fts_ad",
+    "DROP TRIGGER IF EXISTS Inventory_item_fts_ai",
+    "DROP TABLE IF EXISTS Inventory_item_fts",
+]
+
+
+def create_fts(apps, schema_editor):
+    # Other backends use the LIKE fallback in Inventory/search.py
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in FTS_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Inventory', '0007_productdeletionjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.6 on 2026-10-17 14:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+# Every write to Inventory_item appends to the change feed, whatever path it
+# takes (ORM save, bulk upsert, F() stock update or raw SQL). Updates that
+# leave the snapshot columns unchanged are skipped.
+TRIGGER_SQL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS Inventory_item_change_ai AFTER INSERT ON Inventory_item BEGIN
+        INSERT INTO Inventory_itemchange(item_id, deleted, changed_at)
+        VALUES (new.id, 0, strftime('%Y-%m-%d %H:%M:%f', 'now'));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS Inventory_item_change_au AFTER UPDATE ON Inventory_item
+    WHEN old.sku IS NOT new.sku OR old.name IS NOT new.name OR old.price IS NOT new.price
+        OR old.stock IS NOT new.stock OR old.color_hex IS NOT new.color_hex
+        OR old.image IS NOT new.image OR old.image_digest IS NOT new.image_digest
+    BEGIN
+        INSERT INTO Inventory_itemchange(item_id, deleted, changed_at)
+        VALUES (new.id, 0, strftime('%Y-%m-%d %H:%M:%f', 'now'));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS Inventory_item_change_ad AFTER DELETE ON Inventory_item BEGIN
+        INSERT INTO Inventory_itemchange(item_id, deleted, changed_at)
+        VALUES (old.id, 1, strftime('%Y-%m-%d %H:%M:%f', 'now'));
+    END
+    """,
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS Inventory_item_change_ad",
+    "DROP TRIGGER IF EXISTS Inventory_item_change_au",
+    "DROP TRIGGER IF EXISTS Inventory_item_change_ai",
+]
+
+
+def create_triggers(apps, schema_editor):
+    # Other backends record ORM saves and deletes through signals (signals.py)
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in TRIGGER_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Inventory', '0008_item_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_id', models.PositiveBigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('changed_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
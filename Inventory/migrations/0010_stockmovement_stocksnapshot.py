@@ -0,0 +1,58 @@
+# Generated by Django 5.2.6 on 2026-10-17 14:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def opening_balances(apps, schema_editor):
+    """Start the ledger with each item's current stock."""
+    Item = apps.get_model('Inventory', 'Item')
+    StockMovement = apps.get_model('Inventory', 'StockMovement')
+    batch = []
+    for item_id, stock in Item.objects.exclude(stock=0).values_list('id', 'stock').iterator(chunk_size=2000):
+        batch.append(StockMovement(item_id=item_id, kind='opening', quantity=stock, reference='ledger start'))
+        if len(batch) >= 2000:
+            StockMovement.objects.bulk_create(batch)
+            batch = []
+    StockMovement.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Inventory', '0009_itemchange'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('opening', 'Opening balance'), ('sale', 'Sale'), ('restock', 'Restock'), ('adjustment', 'Manual adjustment'), ('import', 'Import'), ('correction', 'Reconciliation correction')], max_length=12)),
+                ('quantity', models.IntegerField(verbose_name='Quantity Change')),
+                ('reference', models.CharField(blank=True, default='', max_length=100)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='Inventory.item')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['item', 'created_at'], name='Inventory_s_item_id_0eb240_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('stock', models.IntegerField()),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='Inventory.item')),
+            ],
+            options={
+                'unique_together': {('item', 'date')},
+            },
+        ),
+        migrations.RunPython(opening_balances, migrations.RunPython.noop),
+    ]
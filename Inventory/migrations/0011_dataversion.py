@@ -0,0 +1,59 @@
+# Generated by Django 5.2.6 on 2026-10-17 15:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+VERSIONED_TABLES = {
+    'item': ('Inventory_item',),
+    'sale': ('POS_sale', 'POS_saleitem', 'POS_saleitemunit', 'POS_dailysalesrecord'),
+    'forecast': ('Sales_forecast_forecastrun', 'Sales_forecast_forecastresult'),
+}
+OPERATIONS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def create_counters(apps, schema_editor):
+    DataVersion = apps.get_model('Inventory', 'DataVersion')
+    DataVersion.objects.bulk_create([DataVersion(name=name) for name in VERSIONED_TABLES])
+    # Other backends bump the counters through signals (signals.py)
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name, tables in VERSIONED_TABLES.items():
+        bump = (
+            "UPDATE Inventory_dataversion SET version = version + 1, "
+            f"updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE name = '{name}';"
+        )
+        for table in tables:
+            for op in OPERATIONS:
+                schema_editor.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {table}_version_{op[0].lower()} AFTER {op} ON {table} BEGIN {bump} END"
+                )
+
+
+def drop_counters(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for tables in VERSIONED_TABLES.values():
+        for table in tables:
+            for op in OPERATIONS:
+                schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}_version_{op[0].lower()}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Inventory', '0010_stockmovement_stocksnapshot'),
+        ('POS', '0006_alter_dailysalesrecord_date_alter_saleitem_product'),
+        ('Sales_forecast', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('name', models.CharField(max_length=20, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(create_counters, drop_counters),
+    ]
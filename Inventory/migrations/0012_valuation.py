@@ -0,0 +1,125 @@
+# Generated by Django 5.2.6 on 2026-10-17 16:30
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, Sum
+
+
+NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+ADD_NEW = f"""INSERT INTO Inventory_categoryvaluation(category, item_count, units, value, updated_at)
+        VALUES (new.category, 1, new.stock, round(new.stock * new.price, 2), {NOW})
+        ON CONFLICT(category) DO UPDATE SET item_count = item_count + 1, units = units + excluded.units,
+            value = round(value + excluded.value, 2), updated_at = excluded.updated_at;"""
+REMOVE_OLD = f"""UPDATE Inventory_categoryvaluation SET item_count = item_count - 1, units = units - old.stock,
+            value = round(value - old.stock * old.price, 2), updated_at = {NOW}
+        WHERE category = old.category;
+        DELETE FROM Inventory_categoryvaluation WHERE category = old.category AND item_count <= 0;"""
+RAISE_LAST_SOLD = """UPDATE Inventory_item SET last_sold_date = new.date
+        WHERE id = new.product_id AND (last_sold_date IS NULL OR last_sold_date < new.date);"""
+
+# Category totals follow every write to Inventory_item; last_sold_date
+# follows every write to the SaleItemUnit rollup
+TRIGGER_SQL = [
+    f"""CREATE TRIGGER IF NOT EXISTS Inventory_item_value_ai AFTER INSERT ON Inventory_item BEGIN
+        {ADD_NEW}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS Inventory_item_value_ad AFTER DELETE ON Inventory_item BEGIN
+        {REMOVE_OLD}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS Inventory_item_value_au AFTER UPDATE OF stock, price, category ON Inventory_item
+    WHEN old.stock IS NOT new.stock OR old.price IS NOT new.price OR old.category IS NOT new.category
+    BEGIN
+        {REMOVE_OLD}
+        {ADD_NEW}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS POS_saleitemunit_last_sold_ai AFTER INSERT ON POS_saleitemunit
+    WHEN new.product_id IS NOT NULL AND new.total_quantity > 0 BEGIN
+        {RAISE_LAST_SOLD}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS POS_saleitemunit_last_sold_au
+    AFTER UPDATE OF product_id, total_quantity, date ON POS_saleitemunit
+    WHEN new.product_id IS NOT NULL AND new.total_quantity > 0 BEGIN
+        {RAISE_LAST_SOLD}
+    END""",
+]
+TRIGGER_NAMES = [
+    'Inventory_item_value_ai', 'Inventory_item_value_ad', 'Inventory_item_value_au',
+    'POS_saleitemunit_last_sold_ai', 'POS_saleitemunit_last_sold_au',
+]
+
+
+def backfill_valuation(apps, schema_editor):
+    Item = apps.get_model('Inventory', 'Item')
+    CategoryValuation = apps.get_model('Inventory', 'CategoryValuation')
+    SaleItemUnit = apps.get_model('POS', 'SaleItemUnit')
+    value = ExpressionWrapper(F('stock') * F('price'), output_field=DecimalField(max_digits=16, decimal_places=2))
+    CategoryValuation.objects.bulk_create([
+        CategoryValuation(
+            category=row['category'], item_count=row['item_count'],
+            units=row['units'] or 0, value=round(row['value'] or 0, 2),
+        )
+        for row in Item.objects.values('category').annotate(
+            item_count=Count('id'), units=Sum('stock'), value=Sum(value),
+        ).order_by('category')
+    ])
+    last_sold = (
+        SaleItemUnit.objects.filter(product_id__isnull=False, total_quantity__gt=0)
+        .values('product_id').annotate(last=Max('date')).values_list('product_id', 'last')
+    )
+    by_date = {}
+    for product_id, day in last_sold:
+        by_date.setdefault(day, []).append(product_id)
+    for day, product_ids in by_date.items():
+        Item.objects.filter(id__in=product_ids).update(last_sold_date=day)
+    # Other backends aggregate Item on read (see Inventory/valuation.py)
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in TRIGGER_SQL:
+            schema_editor.execute(sql)
+
+
+def drop_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name in TRIGGER_NAMES:
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Inventory', '0011_dataversion'),
+        ('POS', '0006_alter_dailysalesrecord_date_alter_saleitem_product'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryValuation',
+            fields=[
+                ('category', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('item_count', models.IntegerField(default=0)),
+                ('units', models.BigIntegerField(default=0)),
+                ('value', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='last_sold_date',
+            field=models.DateField(blank=True, db_index=True, null=True, verbose_name='Last Sold'),
+        ),
+        migrations.CreateModel(
+            name='ValuationSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('category', models.CharField(max_length=100)),
+                ('item_count', models.IntegerField(default=0)),
+                ('units', models.BigIntegerField(default=0)),
+                ('value', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+            options={
+                'unique_together': {('date', 'category')},
+            },
+        ),
+        migrations.RunPython(backfill_valuation, drop_triggers),
+    ]
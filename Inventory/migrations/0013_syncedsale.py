@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-17 17:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Inventory', '0012_valuation'),
+        ('POS', '0006_alter_dailysalesrecord_date_alter_saleitem_product'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncedSale',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('client_id', models.UUIDField(unique=True)),
+                ('terminal', models.CharField(blank=True, default='', max_length=50)),
+                ('synced_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('sale', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sync_record', to='POS.sale')),
+            ],
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:30
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+# One SaleItemUnit row per product (or, without one, per name) per day, so
+# Inventory/rollups.py can apply sales with INSERT ... ON CONFLICT DO UPDATE
+INDEX_SQL = {
+    'POS_saleitemunit_product_day_uniq':
+        'CREATE UNIQUE INDEX IF NOT EXISTS "POS_saleitemunit_product_day_uniq" '
+        'ON "POS_saleitemunit" ("product_id", "date")',
+    'POS_saleitemunit_name_day_uniq':
+        'CREATE UNIQUE INDEX IF NOT EXISTS "POS_saleitemunit_name_day_uniq" '
+        'ON "POS_saleitemunit" ("product_name", "date") WHERE "product_id" IS NULL',
+}
+UPSERT_VENDORS = ('sqlite', 'postgresql')
+
+
+def merge_and_index(apps, schema_editor):
+    if schema_editor.connection.vendor not in UPSERT_VENDORS:
+        return
+    SaleItemUnit = apps.get_model('POS', 'SaleItemUnit')
+    for key, rows in (('product_id', SaleItemUnit.objects.filter(product_id__isnull=False)),
+                      ('product_name', SaleItemUnit.objects.filter(product_id__isnull=True))):
+        groups = (
+            rows.values(key, 'date')
+            .annotate(rows=Count('id'), keep=Min('id'), quantity=Sum('total_quantity'), revenue=Sum('total_revenue'))
+            .filter(rows__gt=1)
+        )
+        for group in groups:
+            rows.filter(id=group['keep']).update(total_quantity=group['quantity'], total_revenue=group['revenue'])
+            rows.filter(**{key: group[key]}, date=group['date']).exclude(id=group['keep']).delete()
+    for sql in INDEX_SQL.values():
+        schema_editor.execute(sql)
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor not in UPSERT_VENDORS:
+        return
+    for name in INDEX_SQL:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Inventory', '0013_syncedsale'),
+        ('POS', '0006_alter_dailysalesrecord_date_alter_saleitem_product'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='kind',
+            field=models.CharField(choices=[('opening', 'Opening balance'), ('sale', 'Sale'), ('restock', 'Restock'), ('adjustment', 'Manual adjustment'), ('import', 'Import'), ('correction', 'Reconciliation correction'), ('return', 'Sale return or void')], max_length=12),
+        ),
+        migrations.RunPython(merge_and_index, drop_indexes),
+    ]
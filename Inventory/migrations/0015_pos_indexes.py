@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:30
+
+from django.db import migrations
+
+
+# Hot query shapes on the POS tables (see Inventory/indexes.py)
+POS_INDEXES = {
+    'POS_sale_date_idx': ('POS_sale', ('date',)),
+    'POS_transaction_date_idx': ('POS_transaction', ('date',)),
+    'POS_saleitemunit_date_product_idx': ('POS_saleitemunit', ('date', 'product_id')),
+}
+
+
+def create_indexes(apps, schema_editor):
+    quote = schema_editor.quote_name
+    for name, (table, columns) in POS_INDEXES.items():
+        schema_editor.execute(
+            f"CREATE INDEX {quote(name)} ON {quote(table)} ({', '.join(quote(column) for column in columns)})"
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    for name, (table, _) in POS_INDEXES.items():
+        schema_editor.execute(schema_editor.sql_delete_index % {
+            'table': schema_editor.quote_name(table), 'name': schema_editor.quote_name(name),
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Inventory', '0014_rollup_unique_day'),
+        ('POS', '0006_alter_dailysalesrecord_date_alter_saleitem_product'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
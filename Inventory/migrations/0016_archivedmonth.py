@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-17 21:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Inventory', '0015_pos_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True, verbose_name='First Day of Month')),
+                ('format', models.CharField(choices=[('parquet', 'Parquet'), ('csv', 'Gzip CSV')], max_length=10)),
+                ('sales_file', models.CharField(max_length=255)),
+                ('lines_file', models.CharField(max_length=255)),
+                ('sales_sha256', models.CharField(max_length=64)),
+                ('lines_sha256', models.CharField(max_length=64)),
+                ('sales', models.PositiveIntegerField(default=0)),
+                ('lines', models.PositiveIntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['month'],
+            },
+        ),
+    ]
@@ -1,4 +1,23 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+
+class Category(models.Model):
+    """
+    A product category. Item.category keeps the display name for templates
+    and exports; Item.category_ref is the indexed link used for filtering
+    and rollups.
+    """
+    name = models.CharField(max_length=100, unique=True, verbose_name="Category Name")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['name']
+        verbose_name_plural = "Categories"
+
+    def __str__(self):
+        return self.name
 
 
 class Item(models.Model):
@@ -22,6 +41,14 @@ class Item(models.Model):
     # Pricing and Category
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Selling Price")
     category = models.CharField(max_length=100, verbose_name="Category")
+    category_ref = models.ForeignKey(
+        Category,
+        on_delete=models.PROTECT,
+        blank=True,
+        null=True,
+        related_name="items",
+        verbose_name="Category Link"
+    )
 
     # Image Upload (stored inside MEDIA_ROOT/inventory_images/)
     image = models.ImageField(
@@ -30,6 +57,8 @@ class Item(models.Model):
         null=True,
         verbose_name="Product Image"
     )
+    # Content hash of the image, used to name its thumbnails (see thumbnails.py)
+    image_digest = models.CharField(max_length=12, blank=True, default='', editable=False)
 
     # Background Color Selection (Stores the hex code)
     color_hex = models.CharField(
@@ -42,24 +71,71 @@ class Item(models.Model):
     stock = models.IntegerField(default=0, verbose_name="Stock Quantity")
     min_stock_level = models.IntegerField(default=10, verbose_name="Minimum Stock Level")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Date Added")
+    # Latest day with recorded sales, kept current from SaleItemUnit (see valuation.py)
+    last_sold_date = models.DateField(blank=True, null=True, db_index=True, verbose_name="Last Sold")
+
+    def save(self, *args, **kwargs):
+        """Link the category name to its Category row (created on first use)."""
+        from .categories import resolve_category
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'category' in update_fields:
+            category = resolve_category(self.category)
+            self.category = category.name
+            if self.category_ref_id != category.id:
+                self.category_ref = category
+                if update_fields is not None and 'category_ref' not in update_fields:
+                    kwargs['update_fields'] = list(update_fields) + ['category_ref']
+        super().save(*args, **kwargs)
 
     def __str__(self):
         """A descriptive string representation for admin and debugging."""
         return f"{self.name} (SKU: {self.sku or 'N/A'}) - ₱{self.price}"
 
     # ✅ Added: Method for reducing stock when sold in POS
-    def reduce_stock(self, quantity):
-        """Safely reduce stock when a sale occurs."""
-        if quantity > self.stock:
-            raise ValueError(f"Not enough stock for {self.name}")
-        self.stock -= quantity
-        self.save()
+    def reduce_stock(self, quantity, reference=''):
+        """
+        Safely reduce stock when a sale occurs. The check and decrement run as
+        one conditional UPDATE, so concurrent sales cannot oversell.
+        Raises InsufficientStock (a ValueError) when not enough is left.
+        """
+        from .stock import decrement_stock
+        self.stock = decrement_stock(self.pk, quantity, reference=reference)
 
     # ✅ Added: Method for restocking items
-    def restock(self, quantity):
-        """Increase stock when new items are added."""
-        self.stock += quantity
-        self.save()
+    def restock(self, quantity, reference=''):
+        """Increase stock when new items are added (atomic, writes only `stock`)."""
+        from .stock import increment_stock
+        self.stock = increment_stock(self.pk, quantity, reference=reference)
+
+
+class ItemChange(models.Model):
+    """
+    Change feed for Item rows, one row per insert, update or delete. On
+    SQLite it is written by triggers (migration 0009), so stock updates,
+    bulk upserts and raw SQL are all recorded. The highest id is the
+    catalogue version used by the SKU snapshot in catalog.py.
+    """
+    item_id = models.PositiveBigIntegerField()
+    deleted = models.BooleanField(default=False)
+    changed_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"#{self.id}: item {self.item_id} {'deleted' if self.deleted else 'changed'}"
+
+
+class DataVersion(models.Model):
+    """
+    Change counter for a group of tables ('item', 'sale', 'forecast'),
+    bumped by triggers on every insert, update or delete. Drives the ETag
+    and Last-Modified headers of polled JSON endpoints (see versions.py).
+    """
+    name = models.CharField(max_length=20, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
 
 
 # ✅ Optional: Restock Log Model
@@ -74,9 +150,201 @@ class RestockLog(models.Model):
     note = models.CharField(max_length=200, blank=True, null=True, verbose_name="Note")
 
     def save(self, *args, **kwargs):
-        """Save log and automatically update the item's stock."""
-        super().save(*args, **kwargs)
-        self.item.restock(self.quantity_added)
+        """Save log and, for a new log, atomically add its quantity to the item's stock."""
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                self.item.restock(self.quantity_added, reference=f"restock-log:{self.pk}")
 
     def __str__(self):
         return f"Restocked {self.item.name} (+{self.quantity_added}) on {self.date.strftime('%Y-%m-%d')}"
+
+
+class StockMovement(models.Model):
+    """
+    Append-only stock ledger: one signed quantity per change to Item.stock
+    (sale, restock, manual edit, import, ...). Written by the functions in
+    stock.py in the same transaction as the stock update; see ledger.py for
+    stock-on-date queries and reconciliation.
+    """
+    KIND_CHOICES = [
+        ('opening', 'Opening balance'),
+        ('sale', 'Sale'),
+        ('restock', 'Restock'),
+        ('adjustment', 'Manual adjustment'),
+        ('import', 'Import'),
+        ('correction', 'Reconciliation correction'),
+        ('return', 'Sale return or void'),
+    ]
+
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name="movements")
+    kind = models.CharField(max_length=12, choices=KIND_CHOICES)
+    quantity = models.IntegerField(verbose_name="Quantity Change")
+    reference = models.CharField(max_length=100, blank=True, default='')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['item', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.item_id}: {self.quantity:+d} ({self.kind}) at {self.created_at:%Y-%m-%d %H:%M}"
+
+
+class StockSnapshot(models.Model):
+    """
+    Closing stock of an item at the end of a day. Written only for days on
+    which the item moved, so the latest snapshot on or before a date is the
+    item's closing stock for that date.
+    """
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name="stock_snapshots")
+    date = models.DateField()
+    stock = models.IntegerField()
+
+    class Meta:
+        unique_together = [('item', 'date')]
+
+    def __str__(self):
+        return f"{self.item_id} on {self.date}: {self.stock}"
+
+
+class SyncedSale(models.Model):
+    """
+    Idempotency key of a sale uploaded by an offline-capable terminal (see
+    sale_sync.py). A retried upload with the same client_id maps to the
+    sale created the first time instead of creating it again.
+    """
+    client_id = models.UUIDField(unique=True)
+    sale = models.OneToOneField('POS.Sale', on_delete=models.CASCADE, related_name='sync_record')
+    terminal = models.CharField(max_length=50, blank=True, default='')
+    synced_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.client_id} -> sale {self.sale_id}"
+
+
+class CategoryValuation(models.Model):
+    """
+    Running stock value (stock x price) per category. Maintained by database
+    triggers on Inventory_item (see valuation.py), so every write path
+    updates it and reports read one row per category.
+    """
+    category = models.CharField(max_length=100, primary_key=True)
+    item_count = models.IntegerField(default=0)
+    units = models.BigIntegerField(default=0)
+    value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.category}: {self.units} units, ₱{self.value}"
+
+
+class ValuationSnapshot(models.Model):
+    """Closing stock value of a category on a day (written nightly by snapshot_stock)."""
+    date = models.DateField()
+    category = models.CharField(max_length=100)
+    item_count = models.IntegerField(default=0)
+    units = models.BigIntegerField(default=0)
+    value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = [('date', 'category')]
+
+    def __str__(self):
+        return f"{self.category} on {self.date}: ₱{self.value}"
+
+
+class ItemDemandStats(models.Model):
+    """
+    Materialized rolling sales statistics for an Item.
+    Kept up to date incrementally from POS sales so low-stock thresholds
+    can be read with a single indexed lookup instead of re-aggregating
+    SaleItemUnit on every page view.
+    """
+    item = models.OneToOneField(
+        Item,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="demand_stats"
+    )
+    window_date = models.DateField(db_index=True, verbose_name="Window End Date")
+    sold_7d = models.PositiveIntegerField(default=0, verbose_name="Units Sold (7 days)")
+    sold_30d = models.PositiveIntegerField(default=0, verbose_name="Units Sold (30 days)")
+    sales_days_30d = models.PositiveSmallIntegerField(default=0, verbose_name="Sales Days (30 days)")
+    dynamic_min_level = models.IntegerField(blank=True, null=True, verbose_name="Dynamic Minimum Stock Level")
+    last_restock_at = models.DateTimeField(blank=True, null=True, verbose_name="Last Restocked")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Item Demand Stats"
+        verbose_name_plural = "Item Demand Stats"
+
+    def __str__(self):
+        return f"{self.item_id}: {self.sold_30d} sold / {self.sales_days_30d} days (min {self.dynamic_min_level})"
+
+
+class ProductDeletionJob(models.Model):
+    """
+    Background cascade delete of a product with a large sales history.
+    Stores the item id (not a foreign key) so the job outlives the item.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    item_id = models.PositiveBigIntegerField(db_index=True)
+    item_name = models.CharField(max_length=200)
+    item_sku = models.CharField(max_length=50, blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    total_rows = models.PositiveIntegerField(default=0, verbose_name="Related Rows")
+    deleted_rows = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Delete {self.item_name} ({self.status}, {self.deleted_rows}/{self.total_rows})"
+
+    @property
+    def progress(self):
+        if self.status == 'done':
+            return 1.0
+        return min(1.0, self.deleted_rows / self.total_rows) if self.total_rows else 0.0
+
+
+class ArchivedMonth(models.Model):
+    """
+    A calendar month of sales moved to cold storage (see archive.py). Its
+    Sale, SaleItem and Transaction rows live in the two files below, relative
+    to SALES_ARCHIVE_DIR; the rollups for the month stay in the database.
+    """
+    FORMAT_CHOICES = [
+        ('parquet', 'Parquet'),
+        ('csv', 'Gzip CSV'),
+    ]
+
+    month = models.DateField(unique=True, verbose_name="First Day of Month")
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    sales_file = models.CharField(max_length=255)
+    lines_file = models.CharField(max_length=255)
+    sales_sha256 = models.CharField(max_length=64)
+    lines_sha256 = models.CharField(max_length=64)
+    sales = models.PositiveIntegerField(default=0)
+    lines = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['month']
+
+    def __str__(self):
+        return f"{self.month:%Y-%m}: {self.sales} sales, {self.lines} lines ({self.format})"
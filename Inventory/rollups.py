@@ -0,0 +1,418 @@
+"""
+Incremental writes to the POS sales rollups.
+
+SaleItemUnit holds units and revenue per product per day and
+DailySalesRecord the sales total per day. Callers pass the lines of one or
+many committed sales (checkout, offline terminal sync, generators) and each
+touched rollup row gets its delta in one statement:
+
+    INSERT ... ON CONFLICT (product_id, date) DO UPDATE
+        SET total_quantity = total_quantity + excluded.total_quantity, ...
+
+so a checkout costs rollup work proportional to its lines, however many
+sales the day already has. Voids and refunds pass negative deltas; those
+go through a plain UPDATE (a missing row has nothing to subtract) that
+never takes units below zero.
+
+The upserts need one SaleItemUnit row per (product_id, date), and per
+(product_name, date) for lines without a product. Migration 0014 merges
+existing duplicates and adds the unique indexes; ensure_rollup_indexes()
+puts them back if a POS table rebuild drops them. Backends without ON
+CONFLICT read the touched rows and write them back in bulk. Demand stats
+for the touched products are rebuilt once at the end, since none of these
+writes go through the SaleItemUnit signals.
+
+rebuild_rollups() recomputes both tables from Sale/SaleItem when they have
+drifted (e.g. after raw-SQL deletes): the date range is split into
+partitions, each aggregated with one GROUP BY per table (in a process pool
+when workers > 1) plus the lines of any archived months (archive.py), and
+each partition's rows are swapped in its own transaction
+(`manage.py rebuild_sales_rollups`). Partitions that reach today, and all
+of them when aggregating inline, are aggregated inside that transaction so
+sales made during the rebuild are not lost.
+"""
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connection, connections, transaction
+from django.db.models import Case, CharField, Count, F, Max, Min, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ArchivedMonth
+from .utils import rebuild_item_demand_stats
+from .valuation import rebuild_valuation, record_last_sold
+
+try:
+    from POS.models import DailySalesRecord, Sale, SaleItem, SaleItemUnit
+except ImportError:
+    DailySalesRecord = Sale = SaleItem = SaleItemUnit = None
+
+ROLLUP_BATCH_SIZE = 500
+REBUILD_PARTITION_DAYS = 31
+UPSERT_VENDORS = ('sqlite', 'postgresql')
+
+# Same statements as migration 0014
+UNIT_INDEXES = {
+    'POS_saleitemunit_product_day_uniq':
+        'CREATE UNIQUE INDEX IF NOT EXISTS "POS_saleitemunit_product_day_uniq" '
+        'ON "POS_saleitemunit" ("product_id", "date")',
+    'POS_saleitemunit_name_day_uniq':
+        'CREATE UNIQUE INDEX IF NOT EXISTS "POS_saleitemunit_name_day_uniq" '
+        'ON "POS_saleitemunit" ("product_name", "date") WHERE "product_id" IS NULL',
+}
+
+
+def sale_day(value):
+    """Local calendar day a sale timestamp is reported under."""
+    if hasattr(value, 'hour'):
+        return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    return value
+
+
+@dataclass
+class SalesRollup:
+    """
+    Per-(product, day) units and revenue, and per-day totals, for one batch.
+    Negative amounts (voids, refunds) are subtracted.
+    """
+    # (product_id, day) -> [product_name, quantity, revenue]
+    units: dict = field(default_factory=OrderedDict)
+    # (product_name, day) -> [product_name, quantity, revenue], for lines without a product
+    named: dict = field(default_factory=OrderedDict)
+    # day -> total sales
+    days: dict = field(default_factory=OrderedDict)
+
+    def add_line(self, product_id, product_name, day, quantity, revenue):
+        rows, key = (self.units, (product_id, day)) if product_id else (self.named, (product_name, day))
+        entry = rows.setdefault(key, [product_name, 0, Decimal('0')])
+        entry[1] += quantity
+        entry[2] += Decimal(revenue)
+
+    def add_sale(self, day, total):
+        self.days[day] = self.days.get(day, Decimal('0')) + Decimal(total)
+
+    def __bool__(self):
+        return bool(self.units or self.named or self.days)
+
+
+def merge_duplicate_units(model=None):
+    """
+    Fold SaleItemUnit rows that share a product (or, without one, a name)
+    and a date into the oldest of them. Returns the number of rows removed.
+    """
+    model = model or SaleItemUnit
+    removed = 0
+    for key, rows in (('product_id', model.objects.filter(product_id__isnull=False)),
+                      ('product_name', model.objects.filter(product_id__isnull=True))):
+        groups = (
+            rows.values(key, 'date')
+            .annotate(rows=Count('id'), keep=Min('id'), quantity=Sum('total_quantity'), revenue=Sum('total_revenue'))
+            .filter(rows__gt=1)
+        )
+        for group in groups:
+            rows.filter(id=group['keep']).update(total_quantity=group['quantity'], total_revenue=group['revenue'])
+            removed += rows.filter(**{key: group[key]}, date=group['date']).exclude(id=group['keep']).delete()[0]
+    return removed
+
+
+def ensure_rollup_indexes():
+    """Merge duplicate rollup rows and recreate missing unique indexes. Returns True if any were missing."""
+    if SaleItemUnit is None or not uses_rollup_upserts():
+        return False
+    table = SaleItemUnit._meta.db_table
+    with connection.cursor() as cursor:
+        if table not in connection.introspection.table_names(cursor):
+            return False
+        present = set(connection.introspection.get_constraints(cursor, table))
+        missing = [sql for name, sql in UNIT_INDEXES.items() if name not in present]
+        if not missing:
+            return False
+        with transaction.atomic():
+            merge_duplicate_units()
+            for sql in missing:
+                cursor.execute(sql)
+    return True
+
+
+def uses_rollup_upserts():
+    return connection.vendor in UPSERT_VENDORS
+
+
+def _chunks(rows, width):
+    # Stay under the backend's bound-parameter limit
+    size = min(ROLLUP_BATCH_SIZE, max(1, (connection.features.max_query_params or 999) // width))
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def _upsert_unit_rows(cursor, rows, product_key):
+    """Upsert one dict of SalesRollup rows; product_key says whether it is keyed by product_id or name."""
+    table = connection.ops.quote_name(SaleItemUnit._meta.db_table)
+    greatest = 'max' if connection.vendor == 'sqlite' else 'GREATEST'
+    if product_key:
+        target, match = '(product_id, date)', 'product_id = %s'
+    else:
+        target, match = '(product_name, date) WHERE product_id IS NULL', 'product_id IS NULL AND product_name = %s'
+    adds, subtracts = [], []
+    for (key, day), (name, quantity, revenue) in rows.items():
+        day = connection.ops.adapt_datefield_value(day)
+        if quantity >= 0 and revenue >= 0:
+            adds.append((key if product_key else None, name, day, quantity, revenue))
+        else:
+            subtracts.append((quantity, revenue, key, day))
+    for chunk in _chunks(adds, 5):
+        cursor.execute(
+            f'INSERT INTO {table} (product_id, product_name, date, total_quantity, total_revenue) '
+            f'VALUES {", ".join(["(%s, %s, %s, %s, %s)"] * len(chunk))} '
+            f'ON CONFLICT {target} DO UPDATE SET '
+            f'total_quantity = {table}.total_quantity + excluded.total_quantity, '
+            f'total_revenue = round({table}.total_revenue + excluded.total_revenue, 2)',
+            [value for row in chunk for value in row],
+        )
+    if subtracts:
+        # A row that is not there has nothing to subtract
+        cursor.executemany(
+            f'UPDATE {table} SET total_quantity = {greatest}(0, total_quantity + %s), '
+            f'total_revenue = round(total_revenue + %s, 2) WHERE {match} AND date = %s',
+            subtracts,
+        )
+
+
+def _upsert_days(cursor, days):
+    table = connection.ops.quote_name(DailySalesRecord._meta.db_table)
+    adds, subtracts = [], []
+    for day, total in days.items():
+        (adds if total >= 0 else subtracts).append((connection.ops.adapt_datefield_value(day), total))
+    for chunk in _chunks(adds, 2):
+        cursor.execute(
+            f'INSERT INTO {table} (date, total_sales) VALUES {", ".join(["(%s, %s)"] * len(chunk))} '
+            f'ON CONFLICT (date) DO UPDATE SET total_sales = round({table}.total_sales + excluded.total_sales, 2)',
+            [value for row in chunk for value in row],
+        )
+    if subtracts:
+        cursor.executemany(
+            f'UPDATE {table} SET total_sales = round(total_sales + %s, 2) WHERE date = %s',
+            [(total, day) for day, total in subtracts],
+        )
+
+
+def _apply_units(units, product_key):
+    # Read-modify-write for backends without ON CONFLICT
+    key = 'product_id' if product_key else 'product_name'
+    rows = SaleItemUnit.objects.filter(product_id__isnull=not product_key)
+    existing = {
+        (getattr(row, key), row.date): row
+        for row in rows.filter(**{f'{key}__in': {k for k, _ in units}}, date__in={day for _, day in units})
+    }
+    changed, created = [], []
+    for (value, day), (name, quantity, revenue) in units.items():
+        row = existing.get((value, day))
+        if row is None:
+            if quantity >= 0 and revenue >= 0:
+                created.append(SaleItemUnit(
+                    product_id=value if product_key else None, product_name=name, date=day,
+                    total_quantity=quantity, total_revenue=revenue,
+                ))
+        else:
+            row.total_quantity = max(0, row.total_quantity + quantity)
+            row.total_revenue += revenue
+            changed.append(row)
+    SaleItemUnit.objects.bulk_update(changed, ['total_quantity', 'total_revenue'], batch_size=ROLLUP_BATCH_SIZE)
+    SaleItemUnit.objects.bulk_create(created, batch_size=ROLLUP_BATCH_SIZE)
+
+
+def _apply_days(days):
+    existing = {row.date: row for row in DailySalesRecord.objects.filter(date__in=list(days))}
+    changed, created = [], []
+    for day, total in days.items():
+        row = existing.get(day)
+        if row is None:
+            if total >= 0:
+                created.append(DailySalesRecord(date=day, total_sales=total))
+        else:
+            row.total_sales += total
+            changed.append(row)
+    DailySalesRecord.objects.bulk_update(changed, ['total_sales'], batch_size=ROLLUP_BATCH_SIZE)
+    DailySalesRecord.objects.bulk_create(created, batch_size=ROLLUP_BATCH_SIZE)
+
+
+def apply_rollup(rollup):
+    """Add a batch's lines and sale totals (negative for voids and refunds) to the rollup tables."""
+    if SaleItemUnit is None or not rollup:
+        return
+    with transaction.atomic():
+        if uses_rollup_upserts():
+            with connection.cursor() as cursor:
+                for rows, product_key in ((rollup.units, True), (rollup.named, False)):
+                    if rows:
+                        _upsert_unit_rows(cursor, rows, product_key)
+                if rollup.days:
+                    _upsert_days(cursor, rollup.days)
+        else:
+            for rows, product_key in ((rollup.units, True), (rollup.named, False)):
+                if rows:
+                    _apply_units(rows, product_key)
+            if rollup.days:
+                _apply_days(rollup.days)
+        product_ids = {product_id for product_id, _ in rollup.units}
+        if product_ids:
+            rebuild_item_demand_stats(product_ids=product_ids)
+            for (product_id, day), (_, quantity, _) in rollup.units.items():
+                if quantity > 0:
+                    record_last_sold(product_id, day)
+
+
+def rollup_partitions(start, end, days=REBUILD_PARTITION_DAYS):
+    """Split the local dates start..end (inclusive) into (first, last) ranges of at most `days` days."""
+    partitions = []
+    while start <= end:
+        last = min(end, start + timedelta(days=days - 1))
+        partitions.append((start, last))
+        start = last + timedelta(days=1)
+    return partitions
+
+
+def _local_bounds(first, last):
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(first, time.min), tz),
+        timezone.make_aware(datetime.combine(last + timedelta(days=1), time.min), tz),
+    )
+
+
+def aggregate_partition(first, last):
+    """
+    Rollup rows for sales made on the local dates first..last, one GROUP BY
+    per table: ([(product_id, product_name, day, quantity, revenue)], [(day, total)]).
+    """
+    start, end = _local_bounds(first, last)
+    sales = Sale.objects.filter(date__gte=start, date__lt=end)
+    lines = (
+        # Drive from the partition's sales so lines are found through the sale_id index
+        SaleItem.objects.filter(sale_id__in=sales.values('id'))
+        # Lines without a product are kept apart by name
+        .annotate(
+            day=TruncDate('sale__date'),
+            name_key=Case(When(product_id__isnull=True, then=F('product_name')), default=Value(''), output_field=CharField()),
+        )
+        .values('product_id', 'name_key', 'day')
+        .annotate(name=Max('product_name'), quantity=Sum('quantity'), revenue=Sum('line_total'))
+        .values_list('product_id', 'name', 'day', 'quantity', 'revenue')
+    )
+    days = (
+        sales.annotate(day=TruncDate('date')).values('day').annotate(total=Sum('total'))
+        .values_list('day', 'total')
+    )
+    # Archived months keep their rollups; imported here since archive.py
+    # imports synthetic.py, which imports this module
+    from .archive import archived_rollup_rows
+    archived_units, archived_days = archived_rollup_rows(first, last)
+    if not archived_units and not archived_days:
+        return list(lines), list(days)
+    return _merge_rows(list(lines) + archived_units, 3), _merge_rows(list(days) + archived_days, 1)
+
+
+def _merge_rows(rows, key_length):
+    """Sum the trailing amounts of rows whose leading `key_length` values match (None counts as 0)."""
+    merged = OrderedDict()
+    for row in rows:
+        key = row[:key_length]
+        if key_length == 3 and key[0] is not None:
+            # Lines with a product are grouped by product, whatever the name
+            key = (key[0], None, key[2])
+        if key in merged:
+            merged[key] = merged[key][:key_length] + tuple(
+                (total or 0) + (amount or 0) for total, amount in zip(merged[key][key_length:], row[key_length:])
+            )
+        else:
+            merged[key] = tuple(row)
+    return list(merged.values())
+
+
+def replace_partition(first, last, units=None, days=None):
+    """
+    Swap the rollup rows dated first..last for freshly aggregated ones in one
+    transaction. Without `units` and `days` the partition is aggregated in
+    that transaction too, so a sale committed meanwhile cannot fall between
+    the read and the swap (the IMMEDIATE transaction holds the write lock
+    from the start). Returns (units, days).
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        if units is None:
+            units, days = aggregate_partition(first, last)
+        # Raw deletes: the per-row SaleItemUnit signals would rebuild demand stats once per row
+        for model in (SaleItemUnit, DailySalesRecord):
+            cursor.execute(
+                f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)} WHERE date >= %s AND date <= %s',
+                [connection.ops.adapt_datefield_value(first), connection.ops.adapt_datefield_value(last)],
+            )
+        SaleItemUnit.objects.bulk_create([
+            SaleItemUnit(product_id=product_id, product_name=name, date=day, total_quantity=quantity or 0,
+                         total_revenue=revenue or 0)
+            for product_id, name, day, quantity, revenue in units
+        ], batch_size=ROLLUP_BATCH_SIZE)
+        DailySalesRecord.objects.bulk_create([
+            DailySalesRecord(date=day, total_sales=total or 0) for day, total in days
+        ], batch_size=ROLLUP_BATCH_SIZE)
+    return units, days
+
+
+def _init_worker():
+    import django
+    django.setup()
+    # Never reuse a connection inherited from the parent process
+    connections.close_all()
+
+
+def rebuild_rollups(since=None, until=None, partition_days=REBUILD_PARTITION_DAYS, workers=1, progress=None):
+    """
+    Recompute SaleItemUnit and DailySalesRecord from the sales on the local
+    dates since..until (defaults: the earliest sale, archived month or rollup
+    row, today).
+    `progress(first, last, units, days)` is called after each partition is
+    swapped in. Returns (partitions, unit rows, day rows).
+    """
+    until = until or timezone.localdate()
+    if since is None:
+        firsts = [
+            sale_day(Sale.objects.order_by('date').values_list('date', flat=True).first()),
+            SaleItemUnit.objects.order_by('date').values_list('date', flat=True).first(),
+            DailySalesRecord.objects.order_by('date').values_list('date', flat=True).first(),
+            ArchivedMonth.objects.order_by('month').values_list('month', flat=True).first(),
+        ]
+        firsts = [day for day in firsts if day is not None]
+        if not firsts:
+            return 0, 0, 0
+        since = min(firsts)
+    partitions = rollup_partitions(since, until, partition_days)
+    totals = [0, 0]
+
+    def swap(partition, result=(None, None)):
+        units, days = replace_partition(*partition, *result)
+        totals[0] += len(units)
+        totals[1] += len(days)
+        if progress:
+            progress(*partition, len(units), len(days))
+
+    # Partitions reaching today still take sales, so they are always
+    # aggregated inside their swap transaction
+    today = timezone.localdate()
+    closed = [partition for partition in partitions if partition[1] < today]
+    if workers > 1 and len(closed) > 1:
+        # Forked workers must not share the parent's open connection
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = {partition: pool.submit(aggregate_partition, *partition) for partition in closed}
+            for partition in partitions:
+                swap(partition, futures[partition].result() if partition in futures else (None, None))
+    else:
+        for partition in partitions:
+            swap(partition)
+
+    rebuild_item_demand_stats()
+    rebuild_valuation()
+    return len(partitions), totals[0], totals[1]
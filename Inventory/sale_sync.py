@@ -0,0 +1,139 @@
+"""
+Batched, idempotent upload of sales rung up offline.
+
+A terminal that lost its uplink queues sales locally, each with a
+client-generated UUID, and uploads the queue in one request when it
+reconnects. The whole batch commits in one transaction:
+
+- client ids already on file (SyncedSale) come back as duplicates with
+  their original sale id, so a retried upload never double-counts
+- the remaining sales are checked against stock in memory, in upload
+  order; a sale whose cart no longer fits is rejected and stays queued
+- accepted sales are written with bulk_create (Sale, SaleItem,
+  Transaction, SyncedSale), stock is decremented with one batched
+  conditional UPDATE, and the sales rollups are updated once
+
+Every sale gets a status (created / duplicate / rejected) so the terminal
+knows which entries it can drop from its queue.
+"""
+import uuid
+from collections import OrderedDict
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .checkout import CheckoutError, load_products, price_sale, write_sales
+from .models import SyncedSale
+from .stock import InsufficientStock
+
+try:
+    from POS.models import Sale
+except ImportError:
+    Sale = None
+
+SALE_SYNC_MAX_SALES = 500
+
+
+class SaleSyncError(ValueError):
+    """A batch that cannot be processed at all (as opposed to one bad sale)."""
+
+
+def _parse_sale(raw, items):
+    """Validate and price one uploaded sale against the load_products map."""
+    if not isinstance(raw, dict):
+        raise CheckoutError("Each sale must be an object.")
+    date = raw.get('date')
+    sold_at = parse_datetime(date) if isinstance(date, str) else None
+    if sold_at is None:
+        raise CheckoutError("date must be an ISO 8601 timestamp.")
+    if timezone.is_naive(sold_at):
+        sold_at = timezone.make_aware(sold_at)
+    # A price the terminal charged offline wins over today's price
+    return price_sale(
+        raw.get('items'), items, raw.get('discount'), raw.get('amount_given'),
+        raw.get('payment_method') or 'Cash', sold_at,
+    )
+
+
+def _client_id(raw):
+    try:
+        return uuid.UUID(str(raw.get('client_id')))
+    except (AttributeError, ValueError):
+        return None
+
+
+def sync_sales(sales, terminal='', user=None):
+    """
+    Ingest a batch of offline sales. Returns one dict per uploaded sale, in
+    order: client_id, status ('created', 'duplicate' or 'rejected'),
+    sale_id (created and duplicate) and message (rejected).
+    """
+    if Sale is None:
+        raise SaleSyncError("POS models are not available.")
+    if not isinstance(sales, list):
+        raise SaleSyncError("sales must be a list.")
+    if len(sales) > SALE_SYNC_MAX_SALES:
+        raise SaleSyncError(f"At most {SALE_SYNC_MAX_SALES} sales per upload.")
+
+    results = [None] * len(sales)
+    client_ids = [_client_id(raw) for raw in sales]
+    product_ids = {
+        line.get('product_id')
+        for raw in sales if isinstance(raw, dict) and isinstance(raw.get('items'), list)
+        for line in raw['items'] if isinstance(line, dict) and isinstance(line.get('product_id'), int)
+    }
+
+    with transaction.atomic():
+        known = dict(
+            SyncedSale.objects.filter(client_id__in=[c for c in client_ids if c]).values_list('client_id', 'sale_id')
+        )
+        items = load_products(product_ids, lock=True)
+        remaining = {item_id: stock for item_id, (_, _, stock) in items.items()}
+        accepted = OrderedDict()
+        repeats = []
+        for index, (raw, client_id) in enumerate(zip(sales, client_ids)):
+            if client_id is None:
+                results[index] = {'client_id': raw.get('client_id') if isinstance(raw, dict) else None,
+                                  'status': 'rejected', 'message': 'client_id must be a UUID.'}
+                continue
+            if client_id in known:
+                results[index] = {'client_id': str(client_id), 'status': 'duplicate', 'sale_id': known[client_id]}
+                continue
+            if client_id in accepted:
+                # Listed twice in the same upload; the first copy wins
+                repeats.append((index, client_id))
+                continue
+            try:
+                sale = _parse_sale(raw, items)
+                needed = sale.quantities()
+                short = [items[p][0] for p, quantity in needed.items() if remaining[p] < quantity]
+                if short:
+                    raise CheckoutError(f"Not enough stock for {', '.join(short)}.")
+            except CheckoutError as e:
+                results[index] = {'client_id': str(client_id), 'status': 'rejected', 'message': str(e)}
+                continue
+            for product_id, quantity in needed.items():
+                remaining[product_id] -= quantity
+            accepted[client_id] = (index, sale)
+
+        if accepted:
+            _write_sales(accepted, results, terminal, user)
+    for index, client_id in repeats:
+        results[index] = {**results[accepted[client_id][0]], 'status': 'duplicate'}
+    return results
+
+
+def _write_sales(accepted, results, terminal, user):
+    try:
+        sales = write_sales(
+            [sale for _, sale in accepted.values()], reference=f"sale sync {terminal}".strip(), user=user,
+        )
+    except InsufficientStock:
+        # Stock was read under lock above, so this only happens if the lock was not honoured
+        raise SaleSyncError("Stock changed during the upload; retry it.")
+    keys = []
+    for (client_id, (index, _)), sale in zip(accepted.items(), sales):
+        keys.append(SyncedSale(client_id=client_id, sale=sale, terminal=terminal[:50]))
+        results[index] = {'client_id': str(client_id), 'status': 'created', 'sale_id': sale.pk}
+    SyncedSale.objects.bulk_create(keys, batch_size=500)
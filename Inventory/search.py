@@ -0,0 +1,128 @@
+"""
+Product search by partial name, SKU or category.
+
+On SQLite the Inventory_item_fts FTS5 table (migration 0008) answers ranked
+prefix queries from its index; its triggers keep it in sync with every write
+to Inventory_item. Other backends, or a database without the index, fall
+back to AND-ed icontains filters.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import Item
+
+SEARCH_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+FTS_TABLE = 'Inventory_item_fts'
+FTS_TRIGGERS = ('Inventory_item_fts_ai', 'Inventory_item_fts_ad', 'Inventory_item_fts_au')
+# bm25 column weights: name, sku, category
+FTS_WEIGHTS = (10.0, 5.0, 1.0)
+MAX_TERMS = 8
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+# Same statements as migration 0008, used to repair the index when a later
+# table rebuild (SQLite ALTER emulation) drops the triggers
+_FTS_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, sku, category,
+        content='Inventory_item', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS Inventory_item_fts_ai AFTER INSERT ON Inventory_item BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, sku, category)
+        VALUES (new.id, new.name, coalesce(new.sku, ''), new.category);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS Inventory_item_fts_ad AFTER DELETE ON Inventory_item BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, sku, category)
+        VALUES ('delete', old.id, old.name, coalesce(old.sku, ''), old.category);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS Inventory_item_fts_au AFTER UPDATE OF name, sku, category ON Inventory_item BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, sku, category)
+        VALUES ('delete', old.id, old.name, coalesce(old.sku, ''), old.category);
+        INSERT INTO {FTS_TABLE}(rowid, name, sku, category)
+        VALUES (new.id, new.name, coalesce(new.sku, ''), new.category);
+    END""",
+]
+
+
+def search_terms(query):
+    """Word tokens of the query (the same split the FTS tokenizer uses)."""
+    return _TERM_RE.findall((query or '').lower())[:MAX_TERMS]
+
+
+def fts_available():
+    """True when the FTS5 index and its triggers exist on this database."""
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE name IN (%s, %s, %s, %s)",
+            [FTS_TABLE, *FTS_TRIGGERS],
+        )
+        return cursor.fetchone()[0] == 1 + len(FTS_TRIGGERS)
+
+
+def ensure_fts_index():
+    """Recreate missing FTS objects and rebuild the index if anything was missing."""
+    if connection.vendor != 'sqlite' or fts_available():
+        return False
+    with connection.cursor() as cursor:
+        for sql in _FTS_SQL:
+            cursor.execute(sql)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def _fts_ids(terms, limit):
+    """
+    Ids of the best matches. FTS5's rank column (bm25 with FTS_WEIGHTS)
+    orders the whole match set inside the FTS module, keeping only the top
+    `limit`, so the best hit is found however many rows match.
+    """
+    # Every term must match; each is a quoted prefix query ("soa"*)
+    match = ' AND '.join(f'"{term}"*' for term in terms)
+    weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rank MATCH %s "
+            f"ORDER BY rank, rowid LIMIT %s",
+            [match, f'bm25({weights})', limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _like_queryset(query, terms):
+    condition = Q()
+    for term in terms:
+        condition &= Q(name__icontains=term) | Q(sku__icontains=term) | Q(category__icontains=term)
+    return (
+        Item.objects.filter(condition)
+        .annotate(search_rank=Case(
+            When(sku__iexact=query, then=Value(0)),
+            When(name__istartswith=terms[0], then=Value(1)),
+            default=Value(2),
+            output_field=IntegerField(),
+        ))
+        .order_by('search_rank', 'name', 'id')
+    )
+
+
+def search_items(query, limit=SEARCH_LIMIT, fields=('id', 'sku', 'name', 'category', 'price', 'stock')):
+    """
+    Ranked prefix search over name, SKU and category. Every word in `query`
+    must match the start of a word in one of those columns. Returns a list of
+    dicts with `fields`, best match first.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+    limit = max(1, min(int(limit), SEARCH_MAX_LIMIT))
+
+    if fts_available():
+        ids = _fts_ids(terms, limit)
+        rows = {row['id']: row for row in Item.objects.filter(id__in=ids).values(*fields)}
+        return [rows[item_id] for item_id in ids if item_id in rows]
+    return list(_like_queryset(query.strip(), terms).values(*fields)[:limit])
@@ -0,0 +1,196 @@
+import os
+
+from django.db import connection, transaction
+from django.db.models.signals import post_init, post_save, post_delete, post_migrate
+from django.dispatch import receiver
+
+from .catalog import ensure_change_triggers, mark_catalog_stale, record_item_change
+from .categories import invalidate_category_cache
+from .indexes import ensure_pos_indexes
+from .ledger import record_movements
+from .models import Category, Item, RestockLog
+from .rollups import ensure_rollup_indexes
+from .search import ensure_fts_index
+from .thumbnails import generate_derivatives, remove_derivatives
+from .valuation import ensure_valuation_triggers, record_last_sold
+from .versions import bump_version, ensure_version_triggers
+from .utils import (
+    SaleItemUnit,
+    apply_sale_to_demand_stats,
+    rebuild_item_demand_stats,
+    record_restock_in_demand_stats,
+)
+
+
+def _image_name(instance):
+    # Read the raw value so deferred/`only()` loads do not trigger a query
+    value = instance.__dict__.get('image')
+    return getattr(value, 'name', value) or ''
+
+
+def _remove_orphaned_thumbnails(image_name):
+    path = Item._meta.get_field('image').storage.path(image_name)
+    # Other items may share a picked server image; only clean up once it is gone
+    if not os.path.exists(path):
+        remove_derivatives(path)
+
+
+def _refresh_thumbnails(item, image_name, previous_name):
+    """Writes derivatives for the item's current image and drops orphaned ones."""
+    digest = ''
+    if image_name:
+        try:
+            digest, _ = generate_derivatives(Item._meta.get_field('image').storage.path(image_name))
+        except Exception as e:
+            print(f"Error generating thumbnails for {image_name}: {e}")
+    Item.objects.filter(pk=item.pk).update(image_digest=digest)
+    item.image_digest = digest
+
+    if previous_name and previous_name != image_name:
+        _remove_orphaned_thumbnails(previous_name)
+
+
+@receiver(post_init, sender=Item)
+def item_loaded(sender, instance, **kwargs):
+    """Remember the image as loaded so saves can tell when it changed."""
+    instance._thumbnail_source = _image_name(instance) if instance.pk else ''
+
+
+@receiver(post_save, sender=Item)
+def item_saved(sender, instance, **kwargs):
+    """Generate thumbnails after an image is uploaded, picked or replaced."""
+    if 'image' not in instance.__dict__:
+        return
+    previous = getattr(instance, '_thumbnail_source', '')
+    current = _image_name(instance)
+    if current == previous and (instance.__dict__.get('image_digest') or not current):
+        return
+    instance._thumbnail_source = current
+    transaction.on_commit(lambda: _refresh_thumbnails(instance, current, previous))
+
+
+@receiver(post_save, sender=Item)
+def item_created(sender, instance, created, raw=False, **kwargs):
+    """A new item's starting stock opens its ledger."""
+    if created and not raw and instance.stock:
+        record_movements('opening', {instance.pk: instance.stock})
+
+
+@receiver(post_save, sender=Item)
+def item_changed(sender, instance, **kwargs):
+    """Feed the SKU snapshot; this process re-checks its version once committed."""
+    record_item_change(instance.pk)
+    transaction.on_commit(mark_catalog_stale)
+
+
+@receiver(post_delete, sender=Item)
+def item_removed(sender, instance, **kwargs):
+    record_item_change(instance.pk, deleted=True)
+    transaction.on_commit(mark_catalog_stale)
+
+
+@receiver(post_delete, sender=Item)
+def item_deleted(sender, instance, **kwargs):
+    """Drop thumbnails whose original no longer exists."""
+    name = _image_name(instance)
+    if name:
+        transaction.on_commit(lambda: _remove_orphaned_thumbnails(name))
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, **kwargs):
+    """Refresh the cached list and carry renames through to item labels."""
+    invalidate_category_cache()
+    transaction.on_commit(invalidate_category_cache)
+    if not created:
+        Item.objects.filter(category_ref=instance).exclude(category=instance.name).update(category=instance.name)
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    invalidate_category_cache()
+    transaction.on_commit(invalidate_category_cache)
+
+
+@receiver(post_migrate)
+def repair_item_triggers(sender, app_config=None, using='default', **kwargs):
+    """
+    SQLite table rebuilds during migrations drop the search, change-feed,
+    counter and valuation triggers and the rollup and POS indexes; put them back.
+    """
+    if app_config is not None and app_config.label == 'Inventory':
+        ensure_fts_index()
+        ensure_change_triggers()
+        ensure_version_triggers()
+        ensure_valuation_triggers()
+        ensure_rollup_indexes()
+        ensure_pos_indexes()
+
+
+@receiver(post_save, sender=RestockLog)
+def restock_log_saved(sender, instance, created, **kwargs):
+    """Keep the item's demand stats aware of the latest restock."""
+    if created:
+        record_restock_in_demand_stats(instance.item_id, instance.date)
+
+
+if SaleItemUnit is not None:
+
+    @receiver(post_init, sender=SaleItemUnit)
+    def sale_item_unit_loaded(sender, instance, **kwargs):
+        """Remember the quantity as loaded so the next save can apply only the delta."""
+        instance._demand_stats_quantity = instance.total_quantity if instance.pk else 0
+
+    @receiver(post_save, sender=SaleItemUnit)
+    def sale_item_unit_saved(sender, instance, **kwargs):
+        """Apply each committed sale's units to the materialized demand stats."""
+        previous = getattr(instance, '_demand_stats_quantity', 0) or 0
+        current = instance.total_quantity or 0
+        apply_sale_to_demand_stats(
+            instance.product_id,
+            instance.date,
+            current - previous,
+            new_sales_day=(previous == 0 and current > 0),
+        )
+        if current > 0:
+            record_last_sold(instance.product_id, instance.date)
+        instance._demand_stats_quantity = current
+
+    @receiver(post_delete, sender=SaleItemUnit)
+    def sale_item_unit_deleted(sender, instance, **kwargs):
+        """A removed daily summary changes sales days too, so rebuild the item."""
+        if instance.product_id:
+            rebuild_item_demand_stats(product_ids=[instance.product_id])
+
+
+def _versioned_models():
+    """(counter name, model) pairs whose writes bump a DataVersion counter."""
+    models = [('item', Item)]
+    try:
+        from POS.models import DailySalesRecord, Sale, SaleItem
+        models += [('sale', Sale), ('sale', SaleItem), ('sale', DailySalesRecord)]
+    except ImportError:
+        pass
+    if SaleItemUnit is not None:
+        models.append(('sale', SaleItemUnit))
+    try:
+        from Sales_forecast.models import ForecastResult, ForecastRun
+        models += [('forecast', ForecastRun), ('forecast', ForecastResult)]
+    except ImportError:
+        pass
+    return models
+
+
+def _bump_counter(name):
+    def handler(sender, **kwargs):
+        bump_version(name)
+    return handler
+
+
+# SQLite counts every write with triggers. Elsewhere the counters follow ORM
+# saves and deletes; on SQLite no receivers are connected, which keeps
+# bulk deletes of sales history on the fast path.
+if connection.vendor != 'sqlite':
+    for _name, _model in _versioned_models():
+        post_save.connect(_bump_counter(_name), sender=_model, weak=False, dispatch_uid=f'data-version-save-{_model._meta.label}')
+        post_delete.connect(_bump_counter(_name), sender=_model, weak=False, dispatch_uid=f'data-version-delete-{_model._meta.label}')
@@ -0,0 +1,77 @@
+// Existing-image picker shared by inventory.html and edit_product.html.
+// Pages through the cached image catalogue API instead of rendering every
+// file under MEDIA_ROOT/inventory_images into the page.
+//
+// Usage: initImagePicker({ apiUrl, container, searchInput, moreButton, thumbSize, onSelect })
+
+function initImagePicker(options) {
+  const { apiUrl, container, searchInput, moreButton, thumbSize = 72, onSelect } = options;
+  let nextOffset = 0;
+  let currentQuery = '';
+  let loading = false;
+  let debounceTimer = null;
+
+  function renderThumb(img) {
+    const thumb = document.createElement('div');
+    thumb.className = 'existing-thumb';
+    thumb.style.cssText = 'cursor:pointer;border:2px solid transparent;padding:4px;border-radius:6px;';
+    thumb.dataset.path = img.path;
+    thumb.dataset.url = img.url;
+    thumb.title = img.width && img.height ? `${img.name} (${img.width}x${img.height})` : img.name;
+
+    const el = document.createElement('img');
+    el.src = img.url;
+    el.alt = img.name;
+    el.loading = 'lazy';
+    el.style.cssText = `width:${thumbSize}px;height:${thumbSize}px;object-fit:cover;border-radius:4px;display:block;`;
+    thumb.appendChild(el);
+
+    thumb.addEventListener('click', () => {
+      container.querySelectorAll('.existing-thumb').forEach(x => x.style.borderColor = 'transparent');
+      thumb.style.borderColor = '#667eea';
+      if (onSelect) onSelect(img.path, img.url);
+    });
+    return thumb;
+  }
+
+  function load(reset) {
+    if (loading || (!reset && nextOffset === null)) return;
+    if (reset) {
+      nextOffset = 0;
+      container.innerHTML = '';
+    }
+    loading = true;
+    const params = new URLSearchParams({ offset: nextOffset });
+    if (currentQuery) params.set('q', currentQuery);
+
+    fetch(`${apiUrl}?${params.toString()}`, { headers: { 'Accept': 'application/json' } })
+      .then(r => r.json())
+      .then(data => {
+        if (!data.success) throw new Error(data.message || 'Failed to load images');
+        data.results.forEach(img => container.appendChild(renderThumb(img)));
+        if (!container.children.length) {
+          container.innerHTML = '<div style="color:#6b7280;padding:8px">No existing images found.</div>';
+        }
+        nextOffset = data.next_offset;
+        if (moreButton) moreButton.style.display = nextOffset === null ? 'none' : 'inline-block';
+      })
+      .catch(() => {
+        container.innerHTML = '<div style="color:#991b1b;padding:8px">Could not load images.</div>';
+      })
+      .finally(() => { loading = false; });
+  }
+
+  if (searchInput) {
+    searchInput.addEventListener('input', () => {
+      clearTimeout(debounceTimer);
+      debounceTimer = setTimeout(() => {
+        currentQuery = searchInput.value.trim();
+        load(true);
+      }, 250);
+    });
+  }
+  if (moreButton) moreButton.addEventListener('click', (e) => { e.preventDefault(); load(false); });
+
+  load(true);
+  return { reload: () => load(true) };
+}
@@ -0,0 +1,234 @@
+"""
+Race-free stock mutations.
+
+Every change to Item.stock goes through a conditional UPDATE evaluated by the
+database, e.g.
+
+    UPDATE inventory_item SET stock = stock - 3 WHERE id = 7 AND stock >= 3
+
+so concurrent terminals selling the same SKU can never lose an update or
+drive stock negative, and only the stock column is written. Each change is
+appended to the StockMovement ledger in the same transaction.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from django.db import connection, transaction
+from django.db.models import F, IntegerField, Q
+from django.db.models.expressions import RawSQL
+
+from .ledger import record_movements
+from .models import Item, RestockLog
+
+
+class InsufficientStock(ValueError):
+    """Raised when a decrement would take an item's stock below zero."""
+
+    def __init__(self, item_id, requested, available, name=None):
+        self.item_id = item_id
+        self.requested = requested
+        self.available = available
+        super().__init__(f"Not enough stock for {name or f'item {item_id}'}")
+
+
+@dataclass
+class StockBatchResult:
+    """Outcome of a batched decrement."""
+    # item id -> stock after the update, for lines that were applied
+    applied: dict = field(default_factory=dict)
+    # one dict per failed line: item_id, requested, available
+    failed: list = field(default_factory=list)
+
+    @property
+    def ok(self):
+        return not self.failed
+
+
+def _validate_quantity(quantity):
+    if int(quantity) != quantity or quantity <= 0:
+        raise ValueError("Quantity must be a positive whole number.")
+    return int(quantity)
+
+
+def _merge_lines(lines):
+    """Sum quantities per item so a cart listing one SKU twice is checked as a whole."""
+    if isinstance(lines, dict):
+        lines = lines.items()
+    merged = OrderedDict()
+    for item_id, quantity in lines:
+        merged[item_id] = merged.get(item_id, 0) + _validate_quantity(quantity)
+    return merged
+
+
+def _current_stock(item_ids):
+    return dict(Item.objects.filter(id__in=list(item_ids)).values_list('id', 'stock'))
+
+
+def increment_stock(item_id, quantity, kind='restock', reference='', user=None):
+    """Adds `quantity` units to an item and returns its new stock."""
+    quantity = _validate_quantity(quantity)
+    with transaction.atomic():
+        if not Item.objects.filter(id=item_id).update(stock=F('stock') + quantity):
+            raise Item.DoesNotExist(f"Item {item_id} does not exist.")
+        record_movements(kind, {item_id: quantity}, reference, user)
+        return Item.objects.filter(id=item_id).values_list('stock', flat=True).get()
+
+
+def decrement_stock(item_id, quantity, kind='sale', reference='', user=None):
+    """
+    Removes `quantity` units from an item if enough are in stock and returns
+    the new stock. Raises InsufficientStock otherwise (nothing is written).
+    """
+    quantity = _validate_quantity(quantity)
+    with transaction.atomic():
+        updated = Item.objects.filter(id=item_id, stock__gte=quantity).update(stock=F('stock') - quantity)
+        if updated:
+            record_movements(kind, {item_id: -quantity}, reference, user)
+        row = Item.objects.filter(id=item_id).values_list('stock', 'name').first()
+    if row is None:
+        raise Item.DoesNotExist(f"Item {item_id} does not exist.")
+    if not updated:
+        raise InsufficientStock(item_id, quantity, row[0], name=row[1])
+    return row[0]
+
+
+def set_stock(item_id, stock, kind='adjustment', reference='', user=None):
+    """
+    Sets an item's stock to a counted value (manual edits) and records the
+    difference from the current stock. The UPDATE only applies if stock has
+    not changed since it was read, so a sale in between is never overwritten
+    without being accounted for. Returns the difference.
+    """
+    if int(stock) != stock or stock < 0:
+        raise ValueError("Stock must be a whole number of 0 or more.")
+    with transaction.atomic():
+        while True:
+            current = Item.objects.filter(id=item_id).values_list('stock', flat=True).first()
+            if current is None:
+                raise Item.DoesNotExist(f"Item {item_id} does not exist.")
+            if current == stock or Item.objects.filter(id=item_id, stock=current).update(stock=stock):
+                break
+        record_movements(kind, {item_id: stock - current}, reference, user)
+    return stock - current
+
+
+def increment_stock_batch(quantities, kind='restock', reference='', user=None):
+    """
+    Adds stock to many items with CASE updates (chunked to stay under the
+    database's parameter limit) in one transaction. Returns {item_id: new stock}.
+    """
+    quantities = {item_id: _validate_quantity(quantity) for item_id, quantity in quantities.items()}
+    if not quantities:
+        return {}
+    # Each item costs three parameters: the IN list plus the WHEN/THEN pair
+    chunk_size = max(1, (connection.features.max_query_params or 999) // 3)
+    item_ids = list(quantities)
+    with transaction.atomic():
+        for start in range(0, len(item_ids), chunk_size):
+            chunk = {item_id: quantities[item_id] for item_id in item_ids[start:start + chunk_size]}
+            Item.objects.filter(id__in=list(chunk)).update(stock=F('stock') + _delta_case(chunk))
+        new_stock = _current_stock(item_ids)
+        record_movements(kind, {item_id: quantity for item_id, quantity in quantities.items() if item_id in new_stock}, reference, user)
+        return new_stock
+
+
+def bulk_restock(lines, restocked_at=None, reference='', user=None):
+    """
+    Restocks many items at once, e.g. a whole delivery.
+
+    `lines` are (item_id, quantity, note) tuples; one RestockLog is written per
+    line with bulk_create (so RestockLog.save() does not restock each row
+    again) and quantities for the same item are summed into one increment.
+    Returns {item_id: new stock}.
+    """
+    from .utils import record_restocks_in_demand_stats
+
+    lines = [(item_id, _validate_quantity(quantity), note) for item_id, quantity, note in lines]
+    totals = OrderedDict()
+    for item_id, quantity, _ in lines:
+        totals[item_id] = totals.get(item_id, 0) + quantity
+
+    with transaction.atomic():
+        new_stock = increment_stock_batch(totals, reference=reference, user=user)
+        logs = RestockLog.objects.bulk_create(
+            [RestockLog(item_id=item_id, quantity_added=quantity, note=note or None) for item_id, quantity, note in lines],
+            batch_size=500,
+        )
+        # date is auto_now_add, so every log shares the insert time
+        record_restocks_in_demand_stats(list(totals), restocked_at or (logs[0].date if logs else None))
+    return new_stock
+
+
+class _ShortBatch(Exception):
+    """Rolls back an all-or-nothing batch that could not be fully applied."""
+
+
+def _delta_case(quantities):
+    """
+    CASE id WHEN ... THEN quantity END over a {item_id: quantity} mapping.
+    Built as RawSQL: compiling thousands of When() nodes costs far more than
+    running the statement.
+    """
+    params = []
+    for item_id, quantity in quantities.items():
+        params += [item_id, quantity]
+    column = connection.ops.quote_name('id')
+    whens = ' '.join(['WHEN %s THEN %s'] * len(quantities))
+    return RawSQL(f"CASE {column} {whens} ELSE 0 END", params, output_field=IntegerField())
+
+
+def _decrement_all(merged):
+    """One conditional UPDATE for every line; raises _ShortBatch unless all rows matched."""
+    enough = Q()
+    for item_id, quantity in merged.items():
+        enough |= Q(id=item_id, stock__gte=quantity)
+    with transaction.atomic():
+        if Item.objects.filter(enough).update(stock=F('stock') - _delta_case(merged)) != len(merged):
+            raise _ShortBatch()
+    return list(merged)
+
+
+def decrement_stock_batch(lines, allow_partial=False, kind='sale', reference='', user=None):
+    """
+    Decrements stock for a whole cart.
+
+    `lines` is a dict or iterable of (item_id, quantity) pairs; repeated items
+    are summed. By default the cart is all-or-nothing: a single conditional
+    UPDATE ... SET stock = stock - CASE id ... END covers every line, and if
+    any item is short nothing is written. With allow_partial=True each item
+    gets its own conditional UPDATE in one transaction, so lines with enough
+    stock are applied and only the short ones fail.
+
+    Returns a StockBatchResult; failed lines carry the stock available when
+    the batch ran (None for unknown items).
+    """
+    merged = _merge_lines(lines)
+    result = StockBatchResult()
+    if not merged:
+        return result
+
+    with transaction.atomic():
+        if allow_partial:
+            applied_ids = [
+                item_id for item_id, quantity in merged.items()
+                if Item.objects.filter(id=item_id, stock__gte=quantity).update(stock=F('stock') - quantity)
+            ]
+        else:
+            try:
+                applied_ids = _decrement_all(merged)
+            except _ShortBatch:
+                applied_ids = []
+        record_movements(kind, {item_id: -merged[item_id] for item_id in applied_ids}, reference, user)
+        stock = _current_stock(merged)
+
+    applied = set(applied_ids)
+    for item_id, quantity in merged.items():
+        if item_id in applied:
+            result.applied[item_id] = stock[item_id]
+        else:
+            result.failed.append({'item_id': item_id, 'requested': quantity, 'available': stock.get(item_id)})
+    if result.failed and not allow_partial:
+        # A rolled-back cart fails every line; report just the short ones when known
+        short = [line for line in result.failed if line['available'] is None or line['available'] < line['requested']]
+        result.failed = short or result.failed
+    return result
@@ -0,0 +1,219 @@
+"""
+Seeded synthetic sales history for load tests, benchmarks and forecasting.
+
+The whole dataset is drawn with NumPy from one seed, so the same options
+always produce the same sales:
+
+- store traffic: Poisson sales per day scaled by a weekday profile and an
+  annual cycle, with opening-hours peaks for the time of day
+- per-product popularity: a shuffled Zipf-like weight, with each product's
+  own seasonal amplitude and phase
+- intermittent demand: each product is on the shelf on only a share of the
+  days (some nearly always, slow movers rarely)
+- promotions: week-long windows per product that lift its demand and cut
+  its price
+
+Rows are inserted in large batches with pre-assigned ids (Sale, SaleItem,
+Transaction) inside one transaction; building model instances for
+bulk_create costs more than the inserts themselves at this volume. The
+rollups are computed from the same arrays and applied once. Stock is not
+touched: the history is a fixture, not a replay of the till.
+"""
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+import numpy as np
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Item
+from .rollups import SalesRollup, apply_rollup
+
+try:
+    from POS.models import Sale, SaleItem, Transaction
+except ImportError:
+    Sale = SaleItem = Transaction = None
+
+SYNTHETIC_BATCH_SIZE = 20000
+# Monday .. Sunday
+WEEKDAY_FACTORS = np.array([0.9, 0.85, 0.9, 1.0, 1.15, 1.35, 1.2])
+OPENING_HOURS = np.arange(8, 21)
+HOUR_WEIGHTS = np.array([2, 4, 6, 7, 8, 6, 5, 5, 6, 8, 9, 7, 4], dtype=float)
+PAYMENT_METHODS = np.array(['Cash', 'GCash', 'Card'])
+PAYMENT_WEIGHTS = np.array([0.6, 0.25, 0.15])
+PROMO_DAYS = 7
+PROMO_LIFT = 2.5
+PROMO_PRICE = 0.85
+
+
+@dataclass
+class SyntheticResult:
+    sales: int
+    lines: int
+    first_day: object
+    last_day: object
+
+
+def _product_profiles(rng, count, days):
+    """Popularity, shelf probability, seasonality and promo calendar per product."""
+    popularity = rng.permutation(1.0 / np.arange(1, count + 1) ** 1.1)
+    on_shelf = np.clip(rng.beta(0.9, 0.35, count), 0.05, 1.0)
+    amplitude = rng.uniform(0, 0.4, count)
+    phase = rng.uniform(0, 2 * np.pi, count)
+    promo = np.zeros((days, count), dtype=bool)
+    starts = rng.random((days, count)) < 1 / 90
+    for offset in range(min(PROMO_DAYS, days)):
+        promo[offset:] |= starts[:days - offset]
+    return popularity, on_shelf, amplitude, phase, promo
+
+
+def draw_sales(products, prices, first_day, days, sales_per_day=300, max_items=4, seed=0):
+    """
+    Draw `days` days of sales from `first_day` for the given product ids and
+    unit prices in cents. Returns dicts of NumPy arrays for sales (day,
+    seconds into the day, subtotal/discount/total/amount given in cents,
+    payment method) and lines (sale index, product index, quantity, unit
+    price and line total in cents), sales in time order.
+    """
+    rng = np.random.default_rng(seed)
+    count = len(products)
+    popularity, on_shelf, amplitude, phase, promo = _product_profiles(rng, count, days)
+
+    day_index = np.arange(days)
+    dates = [first_day + timedelta(days=int(d)) for d in day_index]
+    weekday = np.array([day.weekday() for day in dates])
+    year_angle = 2 * np.pi * np.array([day.timetuple().tm_yday for day in dates]) / 365.25
+    traffic = sales_per_day * WEEKDAY_FACTORS[weekday] * (1 + 0.15 * np.sin(year_angle - 1.4))
+    per_day = rng.poisson(traffic)
+
+    sale_day = np.repeat(day_index, per_day)
+    sale_count = len(sale_day)
+    seconds = rng.choice(OPENING_HOURS, sale_count, p=HOUR_WEIGHTS / HOUR_WEIGHTS.sum()) * 3600
+    seconds = seconds + rng.integers(0, 3600, sale_count)
+    order = np.lexsort((seconds, sale_day))
+    sale_day, seconds = sale_day[order], seconds[order]
+    lines_per_sale = np.minimum(1 + rng.poisson(1.2, sale_count), max_items)
+    line_sale = np.repeat(np.arange(sale_count), lines_per_sale)
+    line_day = sale_day[line_sale]
+
+    # Products for each day's lines, drawn from that day's demand weights
+    line_product = np.empty(len(line_sale), dtype=np.int64)
+    bounds = np.searchsorted(line_day, np.arange(days + 1))
+    for d in day_index:
+        start, end = bounds[d], bounds[d + 1]
+        if start == end:
+            continue
+        weights = popularity * (rng.random(count) < on_shelf)
+        weights *= 1 + amplitude * np.sin(year_angle[d] + phase)
+        weights *= np.where(promo[d], PROMO_LIFT, 1.0)
+        if not weights.any():
+            weights = popularity
+        line_product[start:end] = rng.choice(count, end - start, p=weights / weights.sum())
+
+    quantity = 1 + rng.poisson(0.5, len(line_sale))
+    on_promo = promo[line_day, line_product]
+    price = np.where(on_promo, np.round(prices[line_product] * PROMO_PRICE), prices[line_product]).astype(np.int64)
+    line_total = price * quantity
+
+    subtotal = np.bincount(line_sale, weights=line_total, minlength=sale_count).astype(np.int64)
+    discount = np.where(rng.random(sale_count) < 0.12, rng.choice([500, 1000, 2000], sale_count), 0)
+    discount = np.minimum(discount, subtotal)
+    total = subtotal - discount
+    amount_given = total + rng.choice([0, 0, 1000, 2000, 5000], sale_count)
+    payment = PAYMENT_METHODS[rng.choice(len(PAYMENT_METHODS), sale_count, p=PAYMENT_WEIGHTS)]
+    return {
+        'day': sale_day, 'seconds': seconds, 'subtotal': subtotal, 'discount': discount, 'total': total,
+        'amount_given': amount_given, 'payment_method': payment,
+    }, {
+        'sale': line_sale, 'product': line_product, 'quantity': quantity, 'price': price, 'line_total': line_total,
+    }
+
+
+def _money(cents):
+    return [f'{value // 100}.{value % 100:02d}' for value in cents.tolist()]
+
+
+def insert_rows(cursor, model, fields, columns):
+    """executemany INSERT of parallel column lists in SYNTHETIC_BATCH_SIZE batches."""
+    table = connection.ops.quote_name(model._meta.db_table)
+    names = ', '.join(connection.ops.quote_name(model._meta.get_field(name).column) for name in fields)
+    sql = f'INSERT INTO {table} ({names}) VALUES ({", ".join(["%s"] * len(fields))})'
+    rows = list(zip(*columns))
+    for start in range(0, len(rows), SYNTHETIC_BATCH_SIZE):
+        cursor.executemany(sql, rows[start:start + SYNTHETIC_BATCH_SIZE])
+
+
+def generate_sales(days=365, sales_per_day=300, max_items=4, seed=0, last_day=None):
+    """
+    Write `days` days of seeded synthetic sales ending on `last_day`
+    (default yesterday) for the current products, then update the rollups.
+    Returns a SyntheticResult.
+    """
+    catalog = list(Item.objects.order_by('id').values_list('id', 'name', 'price'))
+    if not catalog:
+        raise ValueError("Add products before generating sales.")
+    last_day = last_day or timezone.localdate() - timedelta(days=1)
+    first_day = last_day - timedelta(days=days - 1)
+    product_ids = np.array([row[0] for row in catalog])
+    names = [row[1] for row in catalog]
+    prices = np.array([int(Decimal(row[2]) * 100) for row in catalog])
+    sales, lines = draw_sales(product_ids, prices, first_day, days, sales_per_day, max_items, seed)
+
+    # Local midnight of each day in UTC, plus each sale's offset into the day
+    tz = timezone.get_current_timezone()
+    midnights = np.array([
+        np.datetime64(timezone.make_aware(datetime.combine(first_day + timedelta(days=d), time.min), tz)
+                      .astimezone(dt_timezone.utc).replace(tzinfo=None), 'us')
+        for d in range(days)
+    ])
+    stamps = midnights[sales['day']] + sales['seconds'].astype('timedelta64[s]')
+    sold_at = [
+        connection.ops.adapt_datetimefield_value(value.replace(tzinfo=dt_timezone.utc))
+        for value in stamps.astype('datetime64[us]').tolist()
+    ]
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        sale_ids = np.arange(len(sales['day'])) + (Sale.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        first_line = (SaleItem.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        first_transaction = (Transaction.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        subtotal, discount, total = _money(sales['subtotal']), _money(sales['discount']), _money(sales['total'])
+        given = _money(sales['amount_given'])
+        change = _money(sales['amount_given'] - sales['total'])
+        methods = sales['payment_method'].tolist()
+        insert_rows(cursor, Sale, ['id', 'date', 'subtotal', 'discount', 'total', 'payment_method', 'amount_given', 'change', 'created_at'],
+                [sale_ids.tolist(), sold_at, subtotal, discount, total, methods, given, change, sold_at])
+        insert_rows(cursor, SaleItem, ['id', 'sale', 'product', 'product_name', 'quantity', 'price', 'line_total'], [
+            range(first_line, first_line + len(lines['sale'])),
+            sale_ids[lines['sale']].tolist(),
+            product_ids[lines['product']].tolist(),
+            [names[index] for index in lines['product'].tolist()],
+            lines['quantity'].tolist(),
+            _money(lines['price']),
+            _money(lines['line_total']),
+        ])
+        insert_rows(cursor, Transaction, ['id', 'sale', 'date', 'payment_method', 'subtotal', 'discount', 'total', 'created_at'],
+                [range(first_transaction, first_transaction + len(sale_ids)), sale_ids.tolist(), sold_at, methods,
+                 subtotal, discount, total, sold_at])
+        for sql in connection.ops.sequence_reset_sql(no_style(), [Sale, SaleItem, Transaction]):
+            cursor.execute(sql)
+        apply_rollup(_rollup(sales, lines, product_ids, names, first_day))
+    return SyntheticResult(len(sale_ids), len(lines['sale']), first_day, last_day)
+
+
+def _rollup(sales, lines, product_ids, names, first_day):
+    """One SalesRollup for the whole dataset, grouped with NumPy."""
+    count = len(product_ids)
+    line_day = sales['day'][lines['sale']]
+    keys, inverse = np.unique(line_day * count + lines['product'], return_inverse=True)
+    quantity = np.bincount(inverse, weights=lines['quantity']).astype(np.int64)
+    revenue = np.bincount(inverse, weights=lines['line_total']).astype(np.int64)
+    rollup = SalesRollup()
+    for key, units, cents in zip(keys.tolist(), quantity.tolist(), revenue.tolist()):
+        day, product = divmod(key, count)
+        rollup.add_line(int(product_ids[product]), names[product], first_day + timedelta(days=day), units, Decimal(cents) / 100)
+    totals = np.bincount(sales['day'], weights=sales['total']).astype(np.int64)
+    for day in np.flatnonzero(np.bincount(sales['day'])).tolist():
+        rollup.add_sale(first_day + timedelta(days=day), Decimal(int(totals[day])) / 100)
+    return rollup
@@ -0,0 +1,25 @@
+from django import template
+
+from Inventory.thumbnails import thumbnail_srcset, thumbnail_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def item_thumbnail(item, width=96, ext='webp'):
+    """
+    URL of the item's smallest thumbnail at least `width` pixels wide.
+
+    Usage: <img src="{% item_thumbnail product 192 %}">
+    """
+    return thumbnail_url(item.image, item.image_digest, width, ext)
+
+
+@register.simple_tag
+def item_srcset(item, ext='webp'):
+    """
+    `srcset` listing every thumbnail width, for use with `sizes`.
+
+    Usage: <img src="{% item_thumbnail product 96 'jpg' %}" srcset="{% item_srcset product %}" sizes="96px">
+    """
+    return thumbnail_srcset(item.image, item.image_digest, ext)
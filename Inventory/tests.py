@@ -1,5 +1,63 @@
-from django.test import TestCase
-from Inventory.models import Item
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import uuid
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+
+import numpy as np
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template import Context, Template
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from openpyxl import load_workbook
+from django.utils import timezone
+
+from Account_management.models import UserLog
+from Inventory import catalog
+from Inventory.checkout import CheckoutError, checkout, refund_items, void_sale
+from Inventory.catalog import catalog_changes, ensure_change_triggers, lookup_codes, reset_catalog, sync_catalog
+from Inventory.categories import category_id, category_names, invalidate_category_cache
+from Inventory.deletion import delete_item_cascade, run_deletion_job
+from Inventory import archive
+from Inventory.archive import ArchiveError, archive_sales, archived_lines, restore_month, sale_lines
+from Inventory.models import (
+    ArchivedMonth, Category, CategoryValuation, Item, ItemChange, ItemDemandStats, ProductDeletionJob, RestockLog, StockMovement,
+    StockSnapshot, SyncedSale, ValuationSnapshot,
+)
+from Inventory import images, thumbnails
+from Inventory.imports import import_products
+from Inventory.indexes import ensure_pos_indexes
+from Inventory import live, rollups
+from Inventory.live import LiveHub, parse_cursor
+from Inventory.versions import data_versions, ensure_version_triggers
+from Inventory.valuation import (
+    category_values, dead_stock, ensure_valuation_triggers, inventory_value, rebuild_valuation, snapshot_valuation,
+)
+from Inventory.ledger import reconcile_stock, stock_on_date, take_snapshots
+from Inventory.rollups import SalesRollup, apply_rollup, ensure_rollup_indexes, rebuild_rollups, rollup_partitions
+from Inventory.sale_sync import sync_sales
+from Inventory.synthetic import draw_sales, generate_sales
+from Inventory.search import ensure_fts_index, fts_available, search_items
+from Inventory.stock import InsufficientStock, decrement_stock, decrement_stock_batch, increment_stock, set_stock
+from Inventory.utils import (
+    apply_sale_to_demand_stats, compute_dynamic_thresholds, ensure_demand_stats_current, get_dynamic_min_stock_level,
+    get_low_stock_items,
+)
+from POS.models import DailySalesRecord, Sale, SaleItem, SaleItemUnit, Transaction
 
 class ItemModelTest(TestCase):
     def test_item_creation(
@@ -35,3 +93,1704 @@ class ItemModelTest(TestCase):
         item = Item.objects.create(name="Default Test", sku="DT003", price=10.00, stock=20)
         self.assertEqual(item.min_stock_level, 10)
 
+
+
+class DynamicThresholdTests(TestCase):
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.fast = Item.objects.create(name="Fast Seller", sku="FS001", price=10.00, stock=3, min_stock_level=5)
+        self.idle = Item.objects.create(name="Idle Item", sku="II001", price=10.00, stock=3, min_stock_level=7)
+        # 20 units over 2 sales days -> 10/day * 1.5 = 15
+        SaleItemUnit.objects.create(product_name="Fast Seller", product_id=self.fast.id, total_quantity=12, total_revenue=120, date=self.today)
+        SaleItemUnit.objects.create(product_name="Fast Seller", product_id=self.fast.id, total_quantity=8, total_revenue=80, date=self.today - timedelta(days=3))
+        # Outside the 30-day window, must be ignored
+        SaleItemUnit.objects.create(product_name="Idle Item", product_id=self.idle.id, total_quantity=50, total_revenue=500, date=self.today - timedelta(days=45))
+
+    def test_compute_dynamic_thresholds_reads_materialized_stats(self):
+        """Once built, thresholds come from one freshness check and one indexed lookup."""
+        compute_dynamic_thresholds([self.fast, self.idle])
+        with self.assertNumQueries(2):
+            thresholds = compute_dynamic_thresholds([self.fast, self.idle])
+        self.assertEqual(thresholds[self.fast.id], 15)
+        self.assertEqual(thresholds[self.idle.id], 7)
+
+    def test_single_item_helper_matches_bulk(self):
+        """get_dynamic_min_stock_level agrees with the bulk engine."""
+        self.assertEqual(get_dynamic_min_stock_level(self.fast), 15)
+        self.assertEqual(get_dynamic_min_stock_level(self.idle), 7)
+
+    def test_get_low_stock_items(self):
+        """Items below their dynamic threshold are reported as low stock."""
+        low = {row['name']: row['min_level'] for row in get_low_stock_items(Item.objects.all())}
+        self.assertEqual(low, {"Fast Seller": 15, "Idle Item": 7})
+
+    def test_custom_window_aggregates_on_the_fly(self):
+        """Non-default windows bypass the materialized table."""
+        thresholds = compute_dynamic_thresholds([self.fast, self.idle], sales_period_days=60)
+        # Fast: 20 units / 2 days; Idle: 50 units / 1 day
+        self.assertEqual(thresholds, {self.fast.id: 15, self.idle.id: 75})
+
+
+class ItemDemandStatsTests(TestCase):
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.item = Item.objects.create(name="Soap", sku="SP001", price=10.00, stock=5, min_stock_level=4)
+        SaleItemUnit.objects.create(product_name="Soap", product_id=self.item.id, total_quantity=6, total_revenue=60, date=self.today - timedelta(days=10))
+        compute_dynamic_thresholds([self.item])
+
+    def test_new_sale_day_is_applied_incrementally(self):
+        """A new daily summary row updates sums, sales days and the threshold."""
+        SaleItemUnit.objects.create(product_name="Soap", product_id=self.item.id, total_quantity=4, total_revenue=40, date=self.today - timedelta(days=2))
+        stats = ItemDemandStats.objects.get(item=self.item)
+        self.assertEqual((stats.sold_7d, stats.sold_30d, stats.sales_days_30d), (4, 10, 2))
+        self.assertEqual(stats.dynamic_min_level, 7)
+
+    def test_existing_day_update_applies_only_the_delta(self):
+        """Increasing an existing daily summary adds just the difference."""
+        unit = SaleItemUnit.objects.get(product_id=self.item.id)
+        unit.total_quantity += 3
+        unit.save()
+        stats = ItemDemandStats.objects.get(item=self.item)
+        self.assertEqual((stats.sold_30d, stats.sales_days_30d), (9, 1))
+        self.assertEqual(get_dynamic_min_stock_level(self.item), 13)
+
+    def test_window_rollover_triggers_rebuild(self):
+        """Stats anchored to an older day are rebuilt on the next read."""
+        ItemDemandStats.objects.update(window_date=self.today - timedelta(days=1), sold_30d=999)
+        self.assertEqual(get_dynamic_min_stock_level(self.item), 9)
+        self.assertEqual(ItemDemandStats.objects.get(item=self.item).sold_30d, 6)
+
+    def test_restock_log_stamps_stats(self):
+        """Writing a RestockLog records the restock time on the stats row."""
+        log = RestockLog.objects.create(item=self.item, quantity_added=5)
+        self.assertEqual(ItemDemandStats.objects.get(item=self.item).last_restock_at, log.date)
+
+    def test_empty_window_is_not_rebuilt_on_every_read(self):
+        """With no sales in the window there is nothing to rebuild, however often thresholds are read."""
+        SaleItemUnit.objects.filter(product_id=self.item.id).update(date=self.today - timedelta(days=60))
+        ItemDemandStats.objects.all().delete()
+        with mock.patch('Inventory.utils.rebuild_item_demand_stats') as rebuild:
+            self.assertFalse(ensure_demand_stats_current())
+            compute_dynamic_thresholds([self.item])
+        rebuild.assert_not_called()
+        SaleItemUnit.objects.filter(product_id=self.item.id).update(date=self.today)
+        self.assertTrue(ensure_demand_stats_current())
+        self.assertEqual(ItemDemandStats.objects.get(item=self.item).sold_30d, 6)
+
+
+class ItemDemandStatsConcurrencyTests(TransactionTestCase):
+    def test_concurrent_sales_are_all_counted(self):
+        """Terminals selling the same item at once must not overwrite each other's counts."""
+        today = timezone.now().date()
+        item = Item.objects.create(name="Soap", sku="SP001", price=10.00, stock=5)
+        SaleItemUnit.objects.create(product_name="Soap", product_id=item.id, total_quantity=1, total_revenue=10, date=today)
+        ItemDemandStats.objects.filter(item=item).update(window_date=today)
+
+        def sell():
+            try:
+                for _ in range(25):
+                    apply_sale_to_demand_stats(item.id, today, 1)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=sell) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = ItemDemandStats.objects.get(item=item)
+        self.assertEqual((stats.sold_7d, stats.sold_30d), (101, 101))
+        self.assertEqual(stats.dynamic_min_level, 151)
+
+
+class InventoryItemsApiTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(username='clerk', full_name='Clerk', password='password123')
+        self.client.force_login(user)
+        self.url = reverse('inventory:items_api')
+        for i, (name, price, stock) in enumerate([
+            ("Apple", 10, 50), ("Banana", 20, 2), ("Cherry", 30, 40), ("Date", 40, 1), ("Elderberry", 50, 30),
+        ]):
+            Item.objects.create(name=name, sku=f"F{i}", price=price, category="Fruit" if i % 2 == 0 else "Other", stock=stock, min_stock_level=5)
+
+    def _all_pages(self, **params):
+        names, cursor = [], None
+        while True:
+            query = dict(params, limit=2)
+            if cursor:
+                query['cursor'] = cursor
+            data = self.client.get(self.url, query).json()
+            names += [row['name'] for row in data['results']]
+            cursor = data['next_cursor']
+            if not data['has_more']:
+                return names
+
+    def test_keyset_pages_cover_every_item_once(self):
+        """Following next_cursor walks the whole catalogue in sort order."""
+        self.assertEqual(self._all_pages(sort='name'), ["Apple", "Banana", "Cherry", "Date", "Elderberry"])
+        self.assertEqual(self._all_pages(sort='-stock'), ["Apple", "Cherry", "Elderberry", "Banana", "Date"])
+
+    def test_filters_are_applied_server_side(self):
+        """Category, price range and low-stock filters narrow the result set."""
+        self.assertEqual(self._all_pages(category="Fruit"), ["Apple", "Cherry", "Elderberry"])
+        self.assertEqual(self._all_pages(min_price="15", max_price="45"), ["Banana", "Cherry", "Date"])
+        self.assertEqual(self._all_pages(low_stock="1"), ["Banana", "Date"])
+
+    def test_invalid_parameters_are_rejected(self):
+        """Unknown sort fields and malformed cursors return 400."""
+        self.assertEqual(self.client.get(self.url, {'sort': 'price'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'cursor': 'not-a-cursor'}).status_code, 400)
+
+    def test_inventory_page_defers_rows_to_api(self):
+        """The list page renders without embedding product rows."""
+        response = self.client.get(reverse('inventory:list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, self.url)
+        self.assertNotContains(response, "Elderberry")
+
+
+class InventoryExportTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(username='clerk', full_name='Clerk', password='password123')
+        self.client.force_login(user)
+        self.url = reverse('inventory:export_inventory_to_excel')
+        Item.objects.create(name="Broom", sku="BR001", price=45.50, category="Cleaning", stock=3, min_stock_level=5)
+        Item.objects.create(name="Apron", sku="AP001", price=99.00, category="Kitchen", stock=12, min_stock_level=5)
+
+    def test_xlsx_export_is_streamed(self):
+        """The XLSX export streams a workbook with the inventory layout."""
+        response = self.client.get(self.url)
+        self.assertTrue(response.streaming)
+        self.assertIn('inventory_report_', response['Content-Disposition'])
+        ws = load_workbook(BytesIO(b''.join(response.streaming_content))).active
+        rows = list(ws.iter_rows(values_only=True))
+        self.assertEqual(ws.title, "Inventory Report")
+        self.assertEqual(rows[0], ('Product Name', 'SKU', 'Price', 'Category', 'Stock Quantity', 'Min Stock Level', 'Date Added'))
+        self.assertEqual([r[0] for r in rows[1:]], ["Apron", "Broom"])
+        self.assertEqual(rows[2][2], 45.5)
+
+    def test_csv_export(self):
+        """?format=csv streams the same rows as CSV."""
+        response = self.client.get(self.url, {'format': 'csv'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(lines[0], 'Product Name,SKU,Price,Category,Stock Quantity,Min Stock Level,Date Added')
+        self.assertTrue(lines[2].startswith('Broom,BR001,45.5,Cleaning,3,5,'))
+
+
+class ImageCatalogueTests(TestCase):
+    def setUp(self):
+        from PIL import Image
+
+        self.media_root = tempfile.mkdtemp(prefix="inventory_media_")
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.images_dir = os.path.join(self.media_root, 'inventory_images')
+        os.makedirs(self.images_dir)
+        Image.new('RGB', (40, 20), 'red').save(os.path.join(self.images_dir, 'soap_bar.png'))
+        Image.new('RGB', (10, 10), 'blue').save(os.path.join(self.images_dir, 'broom.jpg'))
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_URL='/media/')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        images.invalidate_image_catalogue()
+
+    def test_catalogue_records_metadata(self):
+        """Each record carries path, url, size, dimensions and a content hash."""
+        page, total = images.search_images()
+        self.assertEqual(total, 2)
+        soap = page[1]
+        path = os.path.join(self.images_dir, 'soap_bar.png')
+        self.assertEqual(soap['path'], 'inventory_images/soap_bar.png')
+        self.assertEqual(soap['url'], '/media/inventory_images/soap_bar.png')
+        self.assertEqual((soap['width'], soap['height']), (40, 20))
+        self.assertEqual(soap['size'], os.path.getsize(path))
+        with open(path, 'rb') as fh:
+            self.assertEqual(soap['hash'], hashlib.sha256(fh.read()).hexdigest())
+
+    def test_unchanged_directory_is_not_rescanned(self):
+        """Repeated reads hit the cache until the directory changes or is invalidated."""
+        images.get_image_catalogue()
+        with mock.patch('Inventory.images.os.scandir', wraps=os.scandir) as scandir:
+            images.get_image_catalogue()
+            self.assertEqual(scandir.call_count, 0)
+            open(os.path.join(self.images_dir, 'new.png'), 'wb').close()
+            images.invalidate_image_catalogue()
+            names = [e['name'] for e in images.get_image_catalogue()]
+            self.assertEqual(scandir.call_count, 1)
+        self.assertIn('new.png', names)
+
+    def test_images_api_search_and_pagination(self):
+        """The picker endpoint filters by name and pages with offset/limit."""
+        user = get_user_model().objects.create_user(username='clerk', full_name='Clerk', password='password123')
+        self.client.force_login(user)
+        url = reverse('inventory:images_api')
+        data = self.client.get(url, {'limit': 1}).json()
+        self.assertEqual([r['name'] for r in data['results']], ['broom.jpg'])
+        self.assertEqual((data['total'], data['next_offset']), (2, 1))
+        data = self.client.get(url, {'q': 'SOAP'}).json()
+        self.assertEqual([r['name'] for r in data['results']], ['soap_bar.png'])
+        self.assertIsNone(data['next_offset'])
+
+
+class ThumbnailPipelineTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp(prefix="inventory_media_")
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.images_dir = os.path.join(self.media_root, 'inventory_images')
+        os.makedirs(self.images_dir)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_URL='/media/')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        images.invalidate_image_catalogue()
+
+    def _upload(self, name, size, color):
+        from PIL import Image
+
+        buffer = BytesIO()
+        Image.new('RGB', size, color).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def _derivatives(self):
+        return sorted(n for n in os.listdir(self.images_dir) if thumbnails.is_derivative_name(n))
+
+    def test_upload_generates_hashed_derivatives(self):
+        """Saving an item with a new image writes WebP/JPEG thumbnails named by content hash."""
+        with self.captureOnCommitCallbacks(execute=True):
+            item = Item.objects.create(name="Soap", price=10, category="Bath", image=self._upload('soap.png', (500, 250), 'red'))
+        item.refresh_from_db()
+        digest = thumbnails.file_digest(item.image.path)
+        self.assertEqual(item.image_digest, digest)
+        expected = sorted(
+            os.path.basename(thumbnails.derivative_name(item.image.name, digest, width, ext))
+            for width in thumbnails.THUMBNAIL_WIDTHS for ext in thumbnails.THUMBNAIL_FORMATS
+        )
+        self.assertEqual(self._derivatives(), expected)
+
+        from PIL import Image
+        with Image.open(os.path.join(self.images_dir, f"soap-{digest}-192w.webp")) as img:
+            self.assertEqual(img.size, (192, 96))
+
+        # Derivatives are hidden from the existing-images picker
+        page, total = images.search_images()
+        self.assertEqual([e['name'] for e in page], ['soap.png'])
+
+    def test_replacing_image_removes_old_derivatives(self):
+        """Old thumbnails go away with the replaced original."""
+        with self.captureOnCommitCallbacks(execute=True):
+            item = Item.objects.create(name="Soap", price=10, category="Bath", image=self._upload('soap.png', (300, 300), 'red'))
+        item = Item.objects.get(pk=item.pk)
+        old_digest = item.image_digest
+
+        item.image.delete(save=False)
+        item.image = self._upload('soap_v2.png', (300, 300), 'blue')
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+
+        item.refresh_from_db()
+        self.assertNotEqual(item.image_digest, old_digest)
+        names = self._derivatives()
+        self.assertTrue(names)
+        self.assertTrue(all(item.image_digest in n for n in names))
+
+    def test_template_tag_and_api_use_thumbnails(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            item = Item.objects.create(name="Soap", sku="S1", price=10, category="Bath", image=self._upload('soap.png', (120, 80), 'red'))
+        item.refresh_from_db()
+
+        rendered = Template("{% load inventory_images %}{% item_thumbnail item 150 %}|{% item_srcset item 'jpg' %}").render(Context({'item': item}))
+        src, srcset = rendered.split('|')
+        self.assertEqual(src, f"/media/inventory_images/soap-{item.image_digest}-192w.webp")
+        self.assertIn(f"soap-{item.image_digest}-384w.jpg 384w", srcset)
+        # Small originals are never upscaled
+        from PIL import Image
+        with Image.open(os.path.join(self.images_dir, f"soap-{item.image_digest}-384w.jpg")) as img:
+            self.assertEqual(img.size, (120, 80))
+
+        user = get_user_model().objects.create_user(username='thumbs', password='pass12345')
+        self.client.force_login(user)
+        data = self.client.get(reverse('inventory:items_api')).json()
+        self.assertEqual(data['results'][0]['thumbnail_url'], f"/media/inventory_images/soap-{item.image_digest}-96w.webp")
+
+    def test_backfill_command(self):
+        """generate_thumbnails fills in derivatives and digests for existing images."""
+        from PIL import Image
+
+        Image.new('RGB', (400, 200), 'green').save(os.path.join(self.images_dir, 'broom.png'))
+        Item.objects.bulk_create([
+            Item(name="Broom", price=5, category="Home", image='inventory_images/broom.png'),
+            Item(name="Broom XL", price=6, category="Home", image='inventory_images/broom.png'),
+        ])
+        out = StringIO()
+        call_command('generate_thumbnails', '--workers', '1', stdout=out)
+
+        digests = set(Item.objects.values_list('image_digest', flat=True))
+        self.assertEqual(digests, {thumbnails.file_digest(os.path.join(self.images_dir, 'broom.png'))})
+        self.assertEqual(len(self._derivatives()), len(thumbnails.THUMBNAIL_WIDTHS) * len(thumbnails.THUMBNAIL_FORMATS))
+        self.assertIn('Processed 1 image(s)', out.getvalue())
+
+
+class StockServiceTests(TestCase):
+    def setUp(self):
+        self.soap = Item.objects.create(name="Soap", sku="S1", price=10, category="Bath", stock=5)
+        self.broom = Item.objects.create(name="Broom", sku="B1", price=50, category="Home", stock=2)
+
+    def test_decrement_is_conditional(self):
+        self.assertEqual(decrement_stock(self.soap.id, 3), 2)
+        with self.assertRaises(InsufficientStock) as ctx:
+            decrement_stock(self.soap.id, 3)
+        self.assertEqual((ctx.exception.requested, ctx.exception.available), (3, 2))
+        self.soap.refresh_from_db()
+        self.assertEqual(self.soap.stock, 2)
+
+    def test_model_methods_write_only_stock(self):
+        """reduce_stock/restock update stock in place without re-saving stale fields."""
+        stale = Item.objects.get(pk=self.soap.pk)
+        Item.objects.filter(pk=self.soap.pk).update(name="Soap Bar", stock=8)
+        stale.reduce_stock(2)
+        self.assertEqual(stale.stock, 6)
+        stale.restock(4)
+        self.assertEqual(stale.stock, 10)
+        fresh = Item.objects.get(pk=self.soap.pk)
+        self.assertEqual((fresh.name, fresh.stock), ("Soap Bar", 10))
+        with self.assertRaises(ValueError):
+            stale.reduce_stock(11)
+
+    def test_restock_log_adds_stock_once(self):
+        log = RestockLog.objects.create(item=self.broom, quantity_added=3)
+        log.note = "Supplier delivery"
+        log.save()
+        self.broom.refresh_from_db()
+        self.assertEqual(self.broom.stock, 5)
+
+    def test_cart_batch_is_all_or_nothing(self):
+        result = decrement_stock_batch([(self.soap.id, 2), (self.broom.id, 3), (self.soap.id, 1)])
+        self.assertFalse(result.ok)
+        self.assertEqual(result.applied, {})
+        self.assertEqual(result.failed, [{'item_id': self.broom.id, 'requested': 3, 'available': 2}])
+        self.assertEqual(Item.objects.get(pk=self.soap.pk).stock, 5)
+
+        with CaptureQueriesContext(connection) as ctx:
+            result = decrement_stock_batch({self.soap.id: 3, self.broom.id: 2})
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertTrue(result.ok)
+        self.assertEqual(result.applied, {self.soap.id: 2, self.broom.id: 0})
+
+    def test_cart_batch_partial(self):
+        result = decrement_stock_batch([(self.soap.id, 4), (self.broom.id, 3), (999999, 1)], allow_partial=True)
+        self.assertEqual(result.applied, {self.soap.id: 1})
+        self.assertEqual(result.failed, [
+            {'item_id': self.broom.id, 'requested': 3, 'available': 2},
+            {'item_id': 999999, 'requested': 1, 'available': None},
+        ])
+
+
+class StockConcurrencyTests(TransactionTestCase):
+    THREADS = 8
+    ATTEMPTS = 25
+
+    def _hammer(self, work):
+        errors = []
+
+        def run():
+            try:
+                for _ in range(self.ATTEMPTS):
+                    work()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_concurrent_sales_never_oversell(self):
+        """8 terminals x 25 single-unit sales against 100 units: exactly 100 succeed."""
+        item = Item.objects.create(name="Soap", sku="S1", price=10, category="Bath", stock=100)
+        sold = []
+
+        def sell():
+            try:
+                decrement_stock(item.id, 1)
+                sold.append(1)
+            except InsufficientStock:
+                pass
+
+        self._hammer(sell)
+        item.refresh_from_db()
+        self.assertEqual(len(sold), 100)
+        self.assertEqual(item.stock, 0)
+
+    def test_concurrent_carts_and_restocks_lose_no_updates(self):
+        soap = Item.objects.create(name="Soap", sku="S1", price=10, category="Bath", stock=1000)
+        broom = Item.objects.create(name="Broom", sku="B1", price=50, category="Home", stock=1000)
+
+        def cart_then_restock():
+            result = decrement_stock_batch({soap.id: 2, broom.id: 1})
+            self.assertTrue(result.ok)
+            increment_stock(broom.id, 1)
+
+        self._hammer(cart_then_restock)
+        soap.refresh_from_db()
+        broom.refresh_from_db()
+        self.assertEqual(soap.stock, 1000 - 2 * self.THREADS * self.ATTEMPTS)
+        self.assertEqual(broom.stock, 1000)
+
+
+class BulkRestockApiTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='receiver', password='pass12345')
+        self.client.force_login(self.user)
+        self.url = reverse('inventory:bulk_restock_api')
+        self.soap = Item.objects.create(name="Soap", sku="S1", price=10, category="Bath", stock=5)
+        self.broom = Item.objects.create(name="Broom", sku="B1", price=50, category="Home", stock=0)
+
+    def test_json_lines_restock_in_batch(self):
+        payload = {'note': 'PO-77', 'lines': [
+            {'sku': 'S1', 'quantity': 10},
+            {'sku': 'B1', 'quantity': 4, 'note': 'damaged box'},
+            {'sku': 'S1', 'quantity': 2},
+        ]}
+        response = self.client.post(self.url, json.dumps(payload), content_type='application/json')
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['stock'], {'S1': 17, 'B1': 4})
+        self.assertEqual(Item.objects.get(pk=self.soap.pk).stock, 17)
+        # One log per line, no double-counting from RestockLog.save()
+        self.assertEqual(sorted(RestockLog.objects.values_list('quantity_added', 'note')),
+                         [(2, 'PO-77'), (4, 'damaged box'), (10, 'PO-77')])
+        self.assertEqual(UserLog.objects.filter(action='restock').count(), 1)
+        self.assertIsNotNone(ItemDemandStats.objects.get(item=self.broom).last_restock_at)
+
+    def test_csv_upload(self):
+        upload = SimpleUploadedFile('delivery.csv', b'SKU,Quantity,Note\nS1,3,\nB1,7,pallet 2\n', content_type='text/csv')
+        data = self.client.post(self.url, {'file': upload, 'note': 'weekly'}).json()
+        self.assertEqual(data['stock'], {'S1': 8, 'B1': 7})
+        self.assertEqual(RestockLog.objects.get(item=self.soap).note, 'weekly')
+
+    def test_invalid_lines_reject_whole_delivery(self):
+        body = 'sku,quantity\nS1,3\nNOPE,1\nB1,-2\n'
+        response = self.client.post(self.url, body, content_type='text/csv')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([(e['line'], e['sku']) for e in response.json()['errors']], [(3, 'NOPE'), (4, 'B1')])
+        self.assertEqual(Item.objects.get(pk=self.soap.pk).stock, 5)
+        self.assertFalse(RestockLog.objects.exists())
+
+    def test_non_object_json_line_rejects_whole_delivery(self):
+        payload = {'lines': [{'sku': 'S1', 'quantity': 2}, ['B1', 5], {'sku': 'NOPE', 'quantity': 1}]}
+        response = self.client.post(self.url, json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([e['line'] for e in response.json()['errors']], [2, 3])
+        self.assertEqual(Item.objects.get(pk=self.soap.pk).stock, 5)
+        self.assertFalse(RestockLog.objects.exists())
+
+    def test_ten_thousand_lines_use_batched_queries(self):
+        Item.objects.bulk_create([
+            Item(name=f"Bulk {i}", sku=f"K{i:05d}", price=1, category="Bulk", stock=0) for i in range(2000)
+        ])
+        body = 'sku,quantity,note\n' + ''.join(f'K{i % 2000:05d},1,\n' for i in range(10000))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, body, content_type='text/csv')
+        self.assertTrue(response.json()['success'])
+        # SKU lookup, ~7 CASE updates and ~40 insert batches; nothing per line
+        self.assertLess(len(ctx.captured_queries), 100)
+        self.assertEqual(set(Item.objects.filter(category="Bulk").values_list('stock', flat=True)), {5})
+        self.assertEqual(RestockLog.objects.count(), 10000)
+
+
+class ProductImportTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(username='importer', password='pass12345')
+        self.client.force_login(user)
+        self.url = reverse('inventory:import_products_api')
+        Item.objects.create(name="Old Soap", sku="S1", price=9, category="Bath", stock=7, min_stock_level=4)
+
+    def test_csv_upsert_with_row_errors(self):
+        body = (
+            'SKU,Product Name,Price,Category,Stock Quantity,Min Stock Level\n'
+            'S1,Soap,12.50,Bath,,\n'
+            'B1,Broom,55,Home,3,2\n'
+            ',Nameless,1,Home,1,1\n'
+            'M1,Mop,abc,Home,1,1\n'
+            'P1,Pail,20,,2.5,\n'
+        ).encode()
+        data = self.client.post(self.url, {'file': SimpleUploadedFile('catalogue.csv', body)}).json()
+        self.assertEqual((data['rows'], data['created'], data['updated'], data['skipped']), (5, 1, 1, 3))
+        self.assertEqual([(e['row'], e['sku']) for e in data['errors']], [(4, ''), (5, 'M1'), (6, 'P1')])
+
+        soap = Item.objects.get(sku="S1")
+        # Blank optional cells keep the current values
+        self.assertEqual((soap.name, soap.price, soap.stock, soap.min_stock_level), ("Soap", Decimal('12.50'), 7, 4))
+        broom = Item.objects.get(sku="B1")
+        self.assertEqual((broom.category, broom.stock, broom.min_stock_level), ("Home", 3, 2))
+        self.assertEqual(UserLog.objects.filter(action='add').count(), 1)
+
+    def test_xlsx_import_in_chunks(self):
+        from openpyxl import Workbook
+
+        wb = Workbook()
+        ws = wb.active
+        ws.append(['sku', 'name', 'price', 'stock'])
+        for i in range(25):
+            ws.append([1000 + i, f"Item {i}", i + 0.5, i])
+        buffer = BytesIO()
+        wb.save(buffer)
+        buffer.seek(0)
+
+        chunks = []
+        result = import_products(buffer, 'catalogue.xlsx', chunk_size=10, progress=lambda r: chunks.append(r.rows))
+        self.assertEqual((result.created, result.skipped), (25, 0))
+        self.assertEqual(chunks, [10, 20, 25])
+        item = Item.objects.get(sku="1024")
+        self.assertEqual((item.price, item.stock, item.category), (Decimal('24.50'), 24, 'Uncategorized'))
+
+    def test_rejects_missing_columns_and_unknown_types(self):
+        response = self.client.post(self.url, {'file': SimpleUploadedFile('bad.csv', b'sku,price\nX,1\n')})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('name', response.json()['message'])
+        response = self.client.post(self.url, {'file': SimpleUploadedFile('bad.txt', b'x')})
+        self.assertEqual(response.status_code, 400)
+
+    def test_management_command_reports_progress(self):
+        path = os.path.join(tempfile.mkdtemp(prefix="inventory_import_"), 'big.csv')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path), ignore_errors=True)
+        with open(path, 'w', newline='') as fh:
+            fh.write('sku,name,price\n')
+            fh.writelines(f'K{i},Thing {i},{i % 50}.25\n' for i in range(2500))
+        out = StringIO()
+        call_command('import_products', path, '--chunk-size', '1000', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('1,000 rows read'))
+        self.assertIn('rows/s', lines[-1])
+        self.assertEqual(Item.objects.filter(sku__startswith='K').count(), 2500)
+
+
+class CategoryTests(TestCase):
+    def setUp(self):
+        invalidate_category_cache()
+
+    def test_items_share_deduped_categories(self):
+        soap = Item.objects.create(name="Soap", sku="S1", price=10, category="Bath")
+        towel = Item.objects.create(name="Towel", sku="T1", price=90, category="  bath ")
+        self.assertEqual(towel.category, "Bath")
+        self.assertEqual(towel.category_ref_id, soap.category_ref_id)
+        self.assertEqual(Category.objects.count(), 1)
+
+        towel.category = "Linen"
+        towel.save(update_fields=['category'])
+        towel.refresh_from_db()
+        self.assertEqual(towel.category_ref.name, "Linen")
+
+    def test_category_list_is_cached_until_changed(self):
+        Item.objects.create(name="Soap", sku="S1", price=10, category="Bath")
+        self.assertEqual(category_names(), ["Bath"])
+        with self.assertNumQueries(0):
+            self.assertEqual(category_names(), ["Bath"])
+            self.assertIsNotNone(category_id("BATH"))
+
+        Category.objects.create(name="Kitchen")
+        self.assertEqual(category_names(), ["Bath", "Kitchen"])
+
+    def test_rename_updates_item_labels(self):
+        soap = Item.objects.create(name="Soap", sku="S1", price=10, category="Bath")
+        category = soap.category_ref
+        category.name = "Bathroom"
+        category.save()
+        self.assertEqual(Item.objects.get(pk=soap.pk).category, "Bathroom")
+
+    def test_items_api_filters_by_category_link(self):
+        user = get_user_model().objects.create_user(username='cat', password='pass12345')
+        self.client.force_login(user)
+        Item.objects.create(name="Soap", sku="S1", price=10, category="Bath")
+        Item.objects.create(name="Broom", sku="B1", price=50, category="Home")
+        url = reverse('inventory:items_api')
+        self.assertEqual([r['name'] for r in self.client.get(url, {'category': 'bath'}).json()['results']], ["Soap"])
+        self.assertEqual(self.client.get(url, {'category': 'Garden'}).json()['results'], [])
+
+    def test_data_migration_dedupes_existing_strings(self):
+        from django.apps import apps as django_apps
+        migration = importlib.import_module('Inventory.migrations.0006_category_item_category_ref')
+
+        Item.objects.bulk_create([
+            Item(name="Soap", sku="S1", price=10, category="Bath"),
+            Item(name="Towel", sku="T1", price=90, category="bath "),
+            Item(name="Sponge", sku="P1", price=5, category="Bath"),
+            Item(name="Mystery", sku="M1", price=1, category=""),
+        ])
+        migration.link_categories(django_apps, None)
+
+        self.assertEqual(sorted(Category.objects.values_list('name', flat=True)), ["Bath", "Uncategorized"])
+        self.assertEqual(set(Item.objects.filter(sku__in=["S1", "T1", "P1"]).values_list('category', 'category_ref__name')), {("Bath", "Bath")})
+        self.assertEqual(Item.objects.get(sku="M1").category_ref.name, "Uncategorized")
+
+
+class ProductDeletionTests(TestCase):
+    def setUp(self):
+        self.admin = get_user_model().objects.create_user(username='boss', password='pass12345', is_staff=True)
+        self.client.force_login(self.admin)
+        self.item = Item.objects.create(name="Soap", sku="S1", price=10, category="Bath", stock=50)
+        self.other = Item.objects.create(name="Broom", sku="B1", price=50, category="Home", stock=5)
+        self.sale = Sale.objects.create()
+        for _ in range(5):
+            SaleItem.objects.create(sale=self.sale, product=self.item, product_name="Soap", quantity=1, price=10)
+        SaleItem.objects.create(sale=self.sale, product=self.other, product_name="Broom", quantity=1, price=50)
+        RestockLog.objects.create(item=self.item, quantity_added=3)
+        self.url = reverse('inventory:delete_product', args=[self.item.id])
+
+    def test_confirmation_page_shows_sales_count(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['related_sales_count'], 5)
+
+    def test_cascade_runs_in_bounded_batches(self):
+        with CaptureQueriesContext(connection) as ctx:
+            removed = delete_item_cascade(self.item.id, batch_size=2)
+        # 5 sale lines + 1 restock log + 1 demand stats row + 2 ledger movements
+        self.assertEqual(removed, 9)
+        sale_deletes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('DELETE FROM "POS_saleitem"')]
+        # Two full primary-key-range batches, then the remainder
+        self.assertEqual(sum('"POS_saleitem"."id" <=' in sql for sql in sale_deletes), 2)
+        self.assertFalse(Item.objects.filter(pk=self.item.pk).exists())
+        self.assertEqual(SaleItem.objects.filter(product=self.other).count(), 1)
+        self.assertTrue(Sale.objects.filter(pk=self.sale.pk).exists())
+
+    def test_failed_delete_leaves_product_intact(self):
+        with mock.patch('Inventory.deletion.Item.objects.filter', side_effect=RuntimeError("disk full")):
+            response = self.client.post(self.url)
+        self.assertRedirects(response, reverse('inventory:list'), fetch_redirect_response=False)
+        self.assertTrue(Item.objects.filter(pk=self.item.pk).exists())
+        self.assertEqual(SaleItem.objects.filter(product=self.item).count(), 5)
+
+    def test_post_deletes_small_history_inline(self):
+        self.client.post(self.url)
+        self.assertFalse(Item.objects.filter(pk=self.item.pk).exists())
+        self.assertFalse(SaleItem.objects.filter(product_id=self.item.id).exists())
+        self.assertEqual(UserLog.objects.filter(action='delete').count(), 1)
+
+    def test_large_history_becomes_background_job(self):
+        with mock.patch('Inventory.views.BACKGROUND_DELETE_THRESHOLD', 3), \
+                mock.patch('Inventory.deletion._launch_job') as launch, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url)
+        job = ProductDeletionJob.objects.get()
+        launch.assert_called_once_with(job.id)
+        self.assertEqual((job.status, job.total_rows), ('pending', 9))
+        self.assertTrue(Item.objects.filter(pk=self.item.pk).exists())
+
+        run_deletion_job(job.id, batch_size=2)
+        data = self.client.get(reverse('inventory:delete_job_status', args=[job.id])).json()
+        self.assertEqual((data['status'], data['deleted_rows'], data['progress']), ('done', 9, 1.0))
+        self.assertFalse(Item.objects.filter(pk=self.item.pk).exists())
+
+    def test_job_status_is_admin_only(self):
+        job = ProductDeletionJob.objects.create(item_id=self.item.id, item_name=self.item.name, total_rows=9,
+                                                requested_by=self.admin)
+        url = reverse('inventory:delete_job_status', args=[job.id])
+        self.assertEqual(self.client.get(url).json()['item_name'], "Soap")
+        # Accounts are staff by default, so that alone must not be enough
+        self.client.force_login(get_user_model().objects.create_user(username='cashier', password='pass12345'))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn(self.item.name, response.content.decode())
+        self.client.force_login(get_user_model().objects.create_superuser(username='owner', password='pass12345'))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        self.soap = Item.objects.create(name="Safeguard Soap", sku="SG-100", price=25, category="Bath")
+        self.sponge = Item.objects.create(name="Kitchen Sponge", sku="KS-200", price=15, category="Kitchen")
+        self.soda = Item.objects.create(name="Soda Can", sku="SD-300", price=30, category="Drinks")
+
+    def test_prefix_search_is_ranked(self):
+        self.assertTrue(fts_available())
+        self.assertEqual([r['name'] for r in search_items("so")], ["Safeguard Soap", "Soda Can"])
+        self.assertEqual([r['name'] for r in search_items("kitch spo")], ["Kitchen Sponge"])
+        self.assertEqual([r['sku'] for r in search_items("sg-1")], ["SG-100"])
+        # Name matches outrank category-only matches
+        Item.objects.create(name="Dish Rack", sku="DR-1", price=99, category="Kitchen")
+        self.assertEqual([r['name'] for r in search_items("kitchen")], ["Kitchen Sponge", "Dish Rack"])
+
+    def test_best_match_is_found_among_many_matches(self):
+        # Thousands of weak (category-only) matches created before the best one
+        Item.objects.bulk_create([
+            Item(name=f"Bottle {index}", sku=f"BT-{index}", price=10, category="Sodas and soaps") for index in range(2500)
+        ])
+        best = Item.objects.create(name="Sodas Variety Pack", sku="SV-1", price=120, category="Drinks")
+        self.assertEqual(search_items("sodas", limit=1)[0]['id'], best.id)
+        self.assertEqual(search_items("sv-1", limit=1)[0]['id'], best.id)
+
+    def test_index_follows_every_write_path(self):
+        Item.objects.filter(pk=self.soda.pk).update(name="Cola Can")
+        self.assertEqual(search_items("soda"), [])
+        self.assertEqual([r['id'] for r in search_items("cola")], [self.soda.id])
+        Item.objects.bulk_create([Item(name="Solar Lamp", sku="SL-1", price=500, category="Home")])
+        self.assertEqual([r['name'] for r in search_items("sol")], ["Solar Lamp"])
+        delete_item_cascade(self.soap.id)
+        self.assertEqual(search_items("safeguard"), [])
+
+    def test_like_fallback(self):
+        with mock.patch('Inventory.search.fts_available', return_value=False):
+            self.assertEqual([r['name'] for r in search_items("sg-100")], ["Safeguard Soap"])
+            # Names starting with the first term come first
+            self.assertEqual([r['name'] for r in search_items("so")], ["Soda Can", "Safeguard Soap"])
+
+    def test_repair_after_lost_triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER Inventory_item_fts_ai")
+        self.assertFalse(fts_available())
+        self.assertTrue(ensure_fts_index())
+        Item.objects.create(name="Soy Sauce", sku="SS-1", price=40, category="Pantry")
+        self.assertEqual([r['name'] for r in search_items("soy")], ["Soy Sauce"])
+
+    def test_search_api(self):
+        user = get_user_model().objects.create_user(username='cashier', password='pass12345')
+        self.client.force_login(user)
+        data = self.client.get(reverse('inventory:search_api'), {'q': 'soap'}).json()
+        self.assertEqual([(r['sku'], r['price']) for r in data['results']], [("SG-100", "25.00")])
+        self.assertEqual(self.client.get(reverse('inventory:search_api'), {'q': ''}).json()['results'], [])
+
+
+class SkuSnapshotTests(TestCase):
+    def setUp(self):
+        reset_catalog()
+        self.addCleanup(reset_catalog)
+        self.soap = Item.objects.create(name="Safeguard Soap", sku="SG-100", price=25, stock=10, category="Bath")
+        self.soda = Item.objects.create(name="Soda Can", sku="SD-300", price=30, stock=5, category="Drinks")
+
+    def test_lookups_are_served_from_memory(self):
+        version, found = lookup_codes(["SG-100", "sd-300", "NOPE"])
+        self.assertEqual(version, ItemChange.objects.latest('id').id)
+        self.assertEqual(found["SG-100"]["name"], "Safeguard Soap")
+        self.assertEqual(found["SG-100"]["price"], "25.00")
+        self.assertEqual(found["sd-300"]["id"], self.soda.id)
+        self.assertIsNone(found["NOPE"])
+        with self.assertNumQueries(0):
+            lookup_codes(["SG-100"] * 50)
+
+    def test_every_write_path_bumps_the_version(self):
+        version = catalog.catalog_version()
+        decrement_stock(self.soap.id, 3)
+        Item.objects.filter(pk=self.soda.pk).update(sku="SD-301")
+        Item.objects.bulk_create([Item(name="Solar Lamp", sku="SL-1", price=500, category="Home")])
+        self.assertEqual(ItemChange.objects.filter(id__gt=version).count(), 3)
+        # Writes that do not touch snapshot columns are not recorded
+        Item.objects.filter(pk=self.soap.pk).update(min_stock_level=4)
+        self.assertEqual(ItemChange.objects.filter(id__gt=version).count(), 3)
+
+    def test_delta_refresh_reloads_only_changed_items(self):
+        sync_catalog(force=True)
+        decrement_stock(self.soap.id, 3)
+        Item.objects.filter(pk=self.soda.pk).update(sku="SD-301")
+        self.assertEqual(sync_catalog(force=True), 2)
+        _, found = lookup_codes(["SG-100", "SD-300", "SD-301"])
+        self.assertEqual(found["SG-100"]["stock"], 7)
+        self.assertIsNone(found["SD-300"])
+        self.assertEqual(found["SD-301"]["id"], self.soda.id)
+
+        delete_item_cascade(self.soap.id)
+        self.assertEqual(sync_catalog(force=True), 1)
+        self.assertIsNone(lookup_codes(["SG-100"])[1]["SG-100"])
+        self.assertEqual(sync_catalog(force=True), 0)
+
+    def test_pruned_feed_forces_full_reload(self):
+        sync_catalog(force=True)
+        version = catalog.catalog_version()
+        Item.objects.filter(pk=self.soap.pk).update(stock=1)
+        Item.objects.filter(pk=self.soap.pk).update(stock=2)
+        ItemChange.objects.filter(id__lte=version + 1).delete()
+        self.assertEqual(sync_catalog(force=True), Item.objects.count())
+        self.assertEqual(catalog_changes(version)[3], True)
+
+    def test_feed_is_pruned_by_command_not_by_reads(self):
+        ItemChange.objects.update(changed_at=timezone.now() - timedelta(days=5))
+        Item.objects.filter(pk=self.soap.pk).update(stock=1)
+        rows = ItemChange.objects.count()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(sync_catalog(force=True), Item.objects.count())
+        self.assertFalse([q['sql'] for q in queries.captured_queries if q['sql'].startswith('DELETE')])
+        self.assertEqual(ItemChange.objects.count(), rows)
+
+        out = StringIO()
+        call_command('prune_catalog_changes', stdout=out)
+        self.assertIn(f'Pruned {rows - 1} change-feed row(s)', out.getvalue())
+        self.assertEqual(list(ItemChange.objects.values_list('item_id', flat=True)), [self.soap.id])
+        ItemChange.objects.update(changed_at=timezone.now() - timedelta(days=5))
+        call_command('prune_catalog_changes', stdout=out)
+        # The newest row stays so the version never goes back
+        self.assertEqual(ItemChange.objects.count(), 1)
+
+    def test_client_delta(self):
+        version, items, removed, reset = catalog_changes()
+        self.assertTrue(reset)
+        self.assertEqual({item['sku'] for item in items}, {"SG-100", "SD-300"})
+        Item.objects.filter(pk=self.soda.pk).update(price=35)
+        delete_item_cascade(self.soap.id)
+        sync_catalog(force=True)
+        new_version, items, removed, reset = catalog_changes(version)
+        self.assertFalse(reset)
+        self.assertEqual([(item['sku'], item['price']) for item in items], [("SD-300", "35.00")])
+        self.assertEqual(removed, [self.soap.id])
+        self.assertEqual(catalog_changes(new_version)[1:], ([], [], False))
+
+    def test_repair_after_lost_triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER Inventory_item_change_au")
+        self.assertTrue(ensure_change_triggers())
+        self.assertFalse(ensure_change_triggers())
+
+    def test_scan_api(self):
+        user = get_user_model().objects.create_user(username='cashier', password='pass12345')
+        self.client.force_login(user)
+        response = self.client.post(
+            reverse('inventory:scan_api'), json.dumps({'codes': ["SG-100", "X-1"]}), content_type='application/json'
+        )
+        data = response.json()
+        self.assertEqual(data['items']["SG-100"]['stock'], 10)
+        self.assertEqual(data['missing'], ["X-1"])
+        self.assertEqual(self.client.get(reverse('inventory:scan_api'), {'codes': 'SD-300'}).json()['items']["SD-300"]['name'], "Soda Can")
+        self.assertEqual(self.client.post(reverse('inventory:scan_api'), '{"codes": 5}', content_type='application/json').status_code, 400)
+
+        data = self.client.get(reverse('inventory:catalog_api')).json()
+        self.assertTrue(data['reset'])
+        data = self.client.get(reverse('inventory:catalog_api'), {'since': data['version']}).json()
+        self.assertEqual((data['items'], data['removed'], data['reset']), ([], [], False))
+
+
+class StockLedgerTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='keeper', password='pass12345')
+        self.soap = Item.objects.create(name="Soap", sku="S1", price=10, category="Bath", stock=10)
+        self.mop = Item.objects.create(name="Mop", sku="M1", price=80, category="Home", stock=4)
+
+    def _movements(self, item):
+        return list(StockMovement.objects.filter(item=item).order_by('id').values_list('kind', 'quantity'))
+
+    def test_every_stock_path_writes_the_ledger(self):
+        decrement_stock(self.soap.id, 3, reference='sale:1')
+        RestockLog.objects.create(item=self.soap, quantity_added=5)
+        decrement_stock_batch({self.soap.id: 2, self.mop.id: 1})
+        self.assertFalse(decrement_stock_batch({self.soap.id: 1, self.mop.id: 99}).ok)
+        self.assertEqual(set_stock(self.soap.id, 12, user=self.user), 2)
+        import_products(BytesIO(b'SKU,Name,Price,Stock\nS1,Soap,10,15\nN1,New,5,6\n'), 'delivery.csv')
+
+        self.assertEqual(self._movements(self.soap), [
+            ('opening', 10), ('sale', -3), ('restock', 5), ('sale', -2), ('adjustment', 2), ('import', 3),
+        ])
+        self.assertEqual(self._movements(self.mop), [('opening', 4), ('sale', -1)])
+        self.assertEqual(self._movements(Item.objects.get(sku="N1")), [('import', 6)])
+        self.assertEqual(StockMovement.objects.get(kind='adjustment').user, self.user)
+        self.assertEqual(reconcile_stock(), [])
+
+    def test_stock_on_date_reads_one_snapshot(self):
+        today = timezone.localdate()
+        StockMovement.objects.update(created_at=timezone.now() - timedelta(days=5))
+        decrement_stock(self.soap.id, 2)
+        decrement_stock(self.soap.id, 1)
+        StockMovement.objects.filter(kind='sale').update(created_at=timezone.now() - timedelta(days=3))
+        decrement_stock(self.soap.id, 4)
+
+        written = take_snapshots()
+        self.assertEqual(written[today - timedelta(days=5)], 2)
+        self.assertEqual(written[today - timedelta(days=3)], 1)
+        self.assertEqual(StockSnapshot.objects.get(item=self.soap, date=today - timedelta(days=3)).stock, 7)
+        self.assertEqual(take_snapshots(), {})
+
+        with self.assertNumQueries(2):
+            self.assertEqual(stock_on_date(self.soap.id, today - timedelta(days=4)), 10)
+        self.assertEqual(stock_on_date(self.soap.id, today - timedelta(days=3)), 7)
+        self.assertEqual(stock_on_date(self.soap.id, today), 3)
+        self.assertEqual(stock_on_date(self.soap.id, today - timedelta(days=9)), 0)
+        self.assertEqual(stock_on_date(self.mop.id, today - timedelta(days=1)), 4)
+        self.assertEqual(reconcile_stock(), [])
+
+    def test_reconcile_command_reports_and_fixes_drift(self):
+        Item.objects.filter(pk=self.mop.pk).update(stock=9)
+        mismatches = reconcile_stock()
+        self.assertEqual([(m.item_id, m.stock, m.ledger, m.difference) for m in mismatches], [(self.mop.id, 9, 4, 5)])
+
+        out, err = StringIO(), StringIO()
+        call_command('reconcile_stock', stdout=out, stderr=err)
+        self.assertIn('stock 9, ledger 4 (+5)', out.getvalue())
+        self.assertIn('1 item(s) differ', err.getvalue())
+        call_command('reconcile_stock', '--fix', stdout=out)
+        self.assertEqual(self._movements(self.mop)[-1], ('correction', 5))
+        self.assertEqual(reconcile_stock(), [])
+
+    def test_edit_form_records_an_adjustment(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('inventory:update_product', args=[self.mop.id]), {
+            'name': "Mop", 'category': "Home", 'price': '80', 'stock': '1', 'min_stock_level': '2',
+        })
+        self.mop.refresh_from_db()
+        self.assertEqual((self.mop.stock, self.mop.min_stock_level), (1, 2))
+        self.assertEqual(self._movements(self.mop)[-1], ('adjustment', -3))
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        reset_catalog()
+        self.addCleanup(reset_catalog)
+        self.client.force_login(get_user_model().objects.create_user(username='poller', password='pass12345'))
+        self.soap = Item.objects.create(name="Soap", sku="S1", price=10, category="Bath", stock=10)
+
+    def test_counters_follow_every_write_path(self):
+        before = data_versions('item', 'sale')
+        decrement_stock(self.soap.id, 1)
+        Item.objects.bulk_create([Item(name="Mop", sku="M1", price=80, category="Home")])
+        after = data_versions('item', 'sale')
+        self.assertEqual(after['item'][0], before['item'][0] + 2)
+        self.assertEqual(after['sale'][0], before['sale'][0])
+        Sale.objects.create()
+        self.assertEqual(data_versions('sale')['sale'][0], before['sale'][0] + 1)
+
+    def test_items_api_answers_304_until_data_changes(self):
+        url = reverse('inventory:items_api')
+        first = self.client.get(url)
+        etag = first['ETag']
+        self.assertTrue(first.has_header('Last-Modified'))
+        with self.assertNumQueries(3):
+            # session and user for login_required, then one counter read
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        Item.objects.filter(pk=self.soap.pk).update(stock=3)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_catalog_api_validators_come_from_the_snapshot(self):
+        url = reverse('inventory:catalog_api')
+        first = self.client.get(url)
+        etag = first['ETag']
+        self.assertEqual(etag, f'"catalog{first.json()["version"]}"')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        decrement_stock(self.soap.id, 2)
+        catalog.mark_catalog_stale()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['items'][0]['stock'], 8)
+
+    def test_repair_after_lost_triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER POS_sale_version_i")
+        self.assertTrue(ensure_version_triggers())
+        before = data_versions('sale')['sale'][0]
+        Sale.objects.create()
+        self.assertEqual(data_versions('sale')['sale'][0], before + 1)
+
+
+class LiveUpdatesTests(TestCase):
+    def setUp(self):
+        # A hub that never wakes on its own; the tests poll it directly
+        self.hub = LiveHub(interval=3600)
+        patcher = mock.patch.object(live, 'hub', self.hub)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.soap = Item.objects.create(name="Soap", sku="S1", price=10, category="Bath", stock=10)
+        self.mop = Item.objects.create(name="Mop", sku="M1", price=80, category="Home", stock=4)
+
+    def _subscribe(self, since=None):
+        received = []
+        token, catch_up = self.hub.subscribe(received.append, since)
+        self.addCleanup(self.hub.unsubscribe, token)
+        return received, catch_up
+
+    def test_one_poll_serves_every_subscriber(self):
+        inboxes = [self._subscribe()[0] for _ in range(200)]
+        decrement_stock(self.soap.id, 3)
+        sale = Sale.objects.create(total=Decimal('30.00'))
+        with self.assertNumQueries(5):
+            # latest change, feed bounds, changed ids, their stock, new sales
+            chunk = self.hub.poll()
+        self.assertTrue(all(inbox == [chunk] for inbox in inboxes))
+        text = chunk.decode()
+        self.assertIn(f'event: stock\ndata: [[{self.soap.id},7]]\n', text)
+        self.assertIn(f'"id":{sale.id},"total":"30.00"', text)
+        self.assertIn(f'id: {self.hub.cursor[0]}-{sale.id}', text)
+        self.assertEqual(self.hub.poll(), b'')
+        self.assertEqual(inboxes[0], [chunk])
+
+    def test_reconnect_catches_up_from_last_event_id(self):
+        self._subscribe()
+        cursor = self.hub.cursor
+        mop_id = self.mop.id
+        increment_stock(mop_id, 6)
+        self.mop.delete()
+        self.hub.poll()
+        received, catch_up = self._subscribe(since=cursor)
+        self.assertIn(f'event: removed\ndata: [{mop_id}]', catch_up.decode())
+        self.assertEqual(received, [])
+        self.assertEqual(self._subscribe(since=self.hub.cursor)[1], b'')
+
+    def test_pruned_feed_sends_reset(self):
+        increment_stock(self.soap.id, 1)
+        ItemChange.objects.all().delete()
+        increment_stock(self.soap.id, 1)
+        _, catch_up = self._subscribe(since=(1, 0))
+        self.assertIn('event: reset', catch_up.decode())
+
+    @mock.patch.object(live, 'LIVE_SALES_LIMIT', 5)
+    def test_sales_beyond_the_batch_limit_are_not_skipped(self):
+        self._subscribe()
+        cursor = self.hub.cursor
+        ids = [Sale.objects.create(total=Decimal('1.00')).id for _ in range(12)]
+        sent = []
+        for _ in range(3):
+            text = self.hub.poll().decode()
+            sent += [int(part.split(',')[0]) for part in text.split('"id":')[1:]]
+        self.assertEqual(sent, ids)
+        self.assertEqual(self.hub.cursor[1], ids[-1])
+        # A reconnecting client that missed more than one batch reloads instead
+        _, catch_up = self._subscribe(since=cursor)
+        self.assertIn('event: reset', catch_up.decode())
+        self.assertNotIn('event: sale', catch_up.decode())
+
+    def test_stream_view_resumes_from_header(self):
+        self.client.force_login(get_user_model().objects.create_user(username='terminal', password='pass12345'))
+        self._subscribe()
+        cursor = self.hub.cursor
+        decrement_stock(self.soap.id, 1)
+        self.hub.poll()
+        response = self.client.get(reverse('inventory:live_api'), HTTP_LAST_EVENT_ID=f'{cursor[0]}-{cursor[1]}')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        first = next(iter(response.streaming_content)).decode()
+        response.close()
+        self.assertTrue(first.startswith('retry: '))
+        self.assertIn(f'[[{self.soap.id},9]]', first)
+        self.assertEqual(self.hub.subscriber_count, 1)
+        self.assertIsNone(parse_cursor('garbage'))
+
+
+    def test_load_test_command_reports_cpu(self):
+        out = StringIO()
+        call_command('live_load_test', clients=20, seconds=0.2, changes=0, interval=0.05, stdout=out)
+        self.assertIn('20 client(s)', out.getvalue())
+        self.assertIn('feed poll(s)', out.getvalue())
+
+    def test_load_test_changes_write_nothing(self):
+        changes, movements = ItemChange.objects.count(), StockMovement.objects.count()
+        out = StringIO()
+        call_command('live_load_test', clients=5, seconds=0.3, changes=50, interval=0.05, stdout=out)
+        self.assertNotIn(' 0 batch(es)', out.getvalue())
+        self.assertEqual(ItemChange.objects.count(), changes)
+        self.assertEqual(StockMovement.objects.count(), movements)
+        self.assertEqual(Item.objects.get(id=self.soap.id).stock, 10)
+
+
+class ValuationTests(TestCase):
+    def setUp(self):
+        self.soap = Item.objects.create(name="Soap", sku="S1", price=Decimal('10.50'), category="Bath", stock=10)
+        self.towel = Item.objects.create(name="Towel", sku="T1", price=120, category="Bath", stock=2)
+        self.mop = Item.objects.create(name="Mop", sku="M1", price=80, category="Home", stock=4)
+
+    def _values(self):
+        return {row['category']: (row['item_count'], row['units'], row['value']) for row in category_values()}
+
+    def _assert_matches_rebuild(self):
+        expected = self._values()
+        rebuild_valuation()
+        self.assertEqual(self._values(), expected)
+
+    def test_totals_follow_every_write_path(self):
+        self.assertEqual(self._values(), {'Bath': (2, 12, Decimal('345.00')), 'Home': (1, 4, Decimal('320.00'))})
+        decrement_stock(self.soap.id, 4)
+        increment_stock(self.mop.id, 1)
+        Item.objects.filter(pk=self.towel.pk).update(price=100, category="Linen")
+        import_products(BytesIO(b'SKU,Name,Price,Stock\nN1,Broom,50.25,2\n'), 'delivery.csv')
+        self.mop.delete()
+        self.assertEqual(self._values(), {
+            'Bath': (1, 6, Decimal('63.00')), 'Linen': (1, 2, Decimal('200.00')), 'Uncategorized': (1, 2, Decimal('100.50')),
+        })
+        self.assertFalse(CategoryValuation.objects.filter(category='Home').exists())
+        self.assertEqual(inventory_value(), Decimal('363.50'))
+        self._assert_matches_rebuild()
+
+    def test_report_reads_one_row_per_category(self):
+        with self.assertNumQueries(1):
+            category_values()
+
+    def test_dead_stock_uses_last_sold_date(self):
+        today = timezone.localdate()
+        SaleItemUnit.objects.create(product_name="Soap", product_id=self.soap.id, total_quantity=2, date=today)
+        old = SaleItemUnit.objects.create(product_name="Mop", product_id=self.mop.id, total_quantity=1,
+                                          date=today - timedelta(days=90))
+        self.soap.refresh_from_db()
+        self.assertEqual(self.soap.last_sold_date, today)
+        self.assertEqual([row['name'] for row in dead_stock(60)], ["Towel", "Mop"])
+        old.date = today - timedelta(days=10)
+        old.save()
+        self.assertEqual([row['name'] for row in dead_stock(60)], ["Towel"])
+        self.assertEqual(dead_stock(60)[0]['value'], Decimal('240.00'))
+        self._assert_matches_rebuild()
+
+    def test_repair_rebuilds_lost_triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER Inventory_item_value_au")
+        decrement_stock(self.mop.id, 4)
+        self.assertTrue(ensure_valuation_triggers())
+        self.assertEqual(self._values()['Home'], (1, 0, Decimal('0.00')))
+        self.assertFalse(ensure_valuation_triggers())
+
+    def test_snapshot_and_export(self):
+        self.assertEqual(snapshot_valuation(), 2)
+        self.assertEqual(ValuationSnapshot.objects.count(), 2)
+        self.client.force_login(get_user_model().objects.create_user(username='owner', password='pass12345'))
+        response = self.client.get(reverse('inventory:export_valuation_report'), {'format': 'csv', 'days': 30})
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn('Bath,2,12,345.0', content)
+        self.assertIn('Total,3,16,665.0', content)
+        self.assertIn('No Sales in 30 Days', content)
+        self.assertIn('S1,Soap,Bath,10,10.5,105.0,Never', content)
+        workbook = load_workbook(BytesIO(b''.join(
+            self.client.get(reverse('inventory:export_valuation_report')).streaming_content
+        )))
+        self.assertEqual(workbook.sheetnames, ["Value by Category", "Daily Value", "No Sales in 60 Days"])
+        data = self.client.get(reverse('inventory:valuation_api')).json()
+        self.assertEqual(data['total_value'], '665.00')
+        self.assertEqual(len(data['dead_stock']), 3)
+
+
+class SaleSyncTests(TestCase):
+    def setUp(self):
+        self.soap = Item.objects.create(name="Soap", sku="S1", price=10, category="Bath", stock=10)
+        self.mop = Item.objects.create(name="Mop", sku="M1", price=80, category="Home", stock=2)
+        self.sold_at = timezone.localtime().replace(hour=9, minute=30, second=0, microsecond=0)
+
+    def _sale(self, *lines, **extra):
+        return {
+            'client_id': str(uuid.uuid4()),
+            'date': self.sold_at.isoformat(),
+            'items': [{'product_id': item.id, 'quantity': quantity} for item, quantity in lines],
+            **extra,
+        }
+
+    def test_batch_creates_sales_stock_and_rollups_once(self):
+        batch = [
+            self._sale((self.soap, 2), (self.mop, 1), amount_given='200'),
+            self._sale((self.soap, 3), discount='5'),
+        ]
+        results = sync_sales(batch, terminal='T1')
+        self.assertEqual([r['status'] for r in results], ['created', 'created'])
+        first = Sale.objects.get(pk=results[0]['sale_id'])
+        self.assertEqual((first.total, first.change, first.transaction.total), (Decimal('100'), Decimal('100'), Decimal('100')))
+        self.assertEqual(Sale.objects.get(pk=results[1]['sale_id']).total, Decimal('25'))
+        self.assertEqual(SaleItem.objects.count(), 3)
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.assertEqual(SyncedSale.objects.filter(terminal='T1').count(), 2)
+        self.soap.refresh_from_db()
+        self.assertEqual(self.soap.stock, 5)
+        self.assertEqual(StockMovement.objects.get(item=self.soap, kind='sale').quantity, -5)
+        unit = SaleItemUnit.objects.get(product_id=self.soap.id, date=self.sold_at.date())
+        self.assertEqual((unit.total_quantity, unit.total_revenue), (5, Decimal('50')))
+        self.assertEqual(DailySalesRecord.objects.get(date=self.sold_at.date()).total_sales, Decimal('125'))
+        self.assertEqual(ItemDemandStats.objects.get(item=self.soap).sold_7d, 5)
+
+        # A second batch for the same day adds to the existing rollup rows
+        sync_sales([self._sale((self.soap, 1))])
+        unit.refresh_from_db()
+        self.assertEqual(unit.total_quantity, 6)
+        self.assertEqual(DailySalesRecord.objects.get(date=self.sold_at.date()).total_sales, Decimal('135'))
+
+    def test_retried_upload_is_idempotent(self):
+        sale = self._sale((self.soap, 1))
+        created = sync_sales([sale, dict(sale)])
+        self.assertEqual([r['status'] for r in created], ['created', 'duplicate'])
+        self.assertEqual(created[1]['sale_id'], created[0]['sale_id'])
+        again = sync_sales([sale])
+        self.assertEqual(again, [{'client_id': sale['client_id'], 'status': 'duplicate', 'sale_id': created[0]['sale_id']}])
+        self.assertEqual(Sale.objects.count(), 1)
+        self.soap.refresh_from_db()
+        self.assertEqual(self.soap.stock, 9)
+
+    def test_sales_that_do_not_fit_are_rejected_individually(self):
+        results = sync_sales([
+            self._sale((self.mop, 2)),
+            self._sale((self.mop, 1), (self.soap, 1)),
+            self._sale((self.soap, 1)),
+            self._sale((self.soap, 1), client_id='not-a-uuid'),
+            {'client_id': str(uuid.uuid4()), 'date': self.sold_at.isoformat(), 'items': [{'product_id': 999, 'quantity': 1}]},
+        ])
+        self.assertEqual([r['status'] for r in results], ['created', 'rejected', 'created', 'rejected', 'rejected'])
+        self.assertIn('Mop', results[1]['message'])
+        self.assertEqual(Item.objects.get(pk=self.mop.pk).stock, 0)
+        self.assertEqual(Item.objects.get(pk=self.soap.pk).stock, 9)
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        def queries(count):
+            batch = [self._sale((self.soap, 1)) for _ in range(count)]
+            with CaptureQueriesContext(connection) as captured:
+                sync_sales(batch)
+            return len(captured)
+
+        Item.objects.filter(pk=self.soap.pk).update(stock=1000)
+        sync_sales([self._sale((self.soap, 1))])
+        self.assertEqual(queries(5), queries(50))
+
+    def test_api_reports_per_sale_status(self):
+        self.client.force_login(get_user_model().objects.create_user(username='cashier', password='pass12345'))
+        url = reverse('inventory:sale_sync_api')
+        body = {'terminal': 'T2', 'sales': [self._sale((self.soap, 1)), self._sale((self.mop, 5))]}
+        data = self.client.post(url, json.dumps(body), content_type='application/json').json()
+        self.assertEqual((data['created'], data['duplicate'], data['rejected']), (1, 0, 1))
+        data = self.client.post(url, json.dumps(body), content_type='application/json').json()
+        self.assertEqual((data['created'], data['duplicate'], data['rejected']), (0, 1, 1))
+        response = self.client.post(url, json.dumps({'sales': 'nope'}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(url, json.dumps([body]), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        # A server bug is not reported as a bad request
+        with mock.patch('Inventory.views.sync_sales', side_effect=AttributeError('bug')):
+            with self.assertRaises(AttributeError):
+                self.client.post(url, json.dumps(body), content_type='application/json')
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.soap = Item.objects.create(name="Soap", sku="S1", price=10, category="Bath", stock=10)
+        self.mop = Item.objects.create(name="Mop", sku="M1", price=80, category="Home", stock=2)
+
+    def test_totals_are_computed_in_memory_and_written_once(self):
+        sale = checkout(
+            [{'product_id': self.soap.id, 'quantity': 3}, {'product_id': self.mop.id, 'quantity': 1},
+             {'product_id': self.soap.id, 'quantity': 1, 'price': '9.50'}],
+            discount='9.50', amount_given='200', payment_method='GCash',
+        )
+        sale.refresh_from_db()
+        self.assertEqual((sale.subtotal, sale.discount, sale.total, sale.change), (
+            Decimal('119.50'), Decimal('9.50'), Decimal('110.00'), Decimal('90.00'),
+        ))
+        self.assertEqual(sorted(sale.items.values_list('product_name', 'quantity', 'line_total')), [
+            ('Mop', 1, Decimal('80.00')), ('Soap', 1, Decimal('9.50')), ('Soap', 3, Decimal('30.00')),
+        ])
+        self.assertEqual((sale.transaction.total, sale.transaction.payment_method), (Decimal('110.00'), 'GCash'))
+        self.assertEqual(Item.objects.get(pk=self.soap.pk).stock, 6)
+        self.assertEqual(StockMovement.objects.get(item=self.soap, kind='sale').quantity, -4)
+        day = timezone.localdate(sale.date)
+        unit = SaleItemUnit.objects.get(product_id=self.soap.id, date=day)
+        self.assertEqual((unit.total_quantity, unit.total_revenue), (4, Decimal('39.50')))
+        self.assertEqual(DailySalesRecord.objects.get(date=day).total_sales, Decimal('110.00'))
+
+    def test_nothing_is_written_when_the_cart_fails(self):
+        with self.assertRaises(InsufficientStock):
+            checkout([{'product_id': self.soap.id, 'quantity': 1}, {'product_id': self.mop.id, 'quantity': 3}])
+        with self.assertRaisesMessage(CheckoutError, 'less than the total'):
+            checkout([{'product_id': self.soap.id, 'quantity': 1}], amount_given='5')
+        with self.assertRaises(CheckoutError):
+            checkout([{'product_id': 999, 'quantity': 1}])
+        self.assertFalse(Sale.objects.exists())
+        self.assertFalse(SaleItemUnit.objects.exists())
+        self.assertEqual(Item.objects.get(pk=self.soap.pk).stock, 10)
+
+    def test_query_count_does_not_grow_with_the_cart(self):
+        products = Item.objects.bulk_create([
+            Item(name=f"Part {index}", sku=f"P{index}", price=5, category="Parts", stock=100) for index in range(50)
+        ])
+
+        def queries(size):
+            lines = [{'product_id': product.id, 'quantity': 1} for product in products[:size]]
+            with CaptureQueriesContext(connection) as captured:
+                checkout(lines)
+            return len(captured)
+
+        checkout([{'product_id': products[0].id, 'quantity': 1}])
+        self.assertEqual(queries(10), queries(50))
+
+    def test_benchmark_command_keeps_nothing(self):
+        out = StringIO()
+        call_command('benchmark_checkout', sizes='1,5', runs=2, stdout=out)
+        self.assertIn('service', out.getvalue())
+        self.assertIn('per-line', out.getvalue())
+        self.assertFalse(Sale.objects.exists())
+        self.assertFalse(Item.objects.filter(category='Benchmark').exists())
+
+
+class RollupUpsertTests(TestCase):
+    def setUp(self):
+        self.soap = Item.objects.create(name="Soap", sku="S1", price=10, category="Bath", stock=20)
+        self.mop = Item.objects.create(name="Mop", sku="M1", price=80, category="Home", stock=5)
+        self.today = timezone.localdate()
+
+    def _rollup(self, *lines, total=None):
+        rollup = SalesRollup()
+        for product_id, name, quantity, revenue in lines:
+            rollup.add_line(product_id, name, self.today, quantity, revenue)
+        rollup.add_sale(self.today, total if total is not None else sum(line[3] for line in lines))
+        return rollup
+
+    def test_deltas_land_on_one_row_per_product_and_day(self):
+        apply_rollup(self._rollup((self.soap.id, 'Soap', 2, Decimal('20')), (None, 'Loose nails', 3, Decimal('4.50'))))
+        apply_rollup(self._rollup((self.soap.id, 'Soap', 1, Decimal('10')), (None, 'Loose nails', 1, Decimal('1.50'))))
+        unit = SaleItemUnit.objects.get(product_id=self.soap.id, date=self.today)
+        self.assertEqual((unit.total_quantity, unit.total_revenue), (3, Decimal('30')))
+        loose = SaleItemUnit.objects.get(product_id=None, product_name='Loose nails', date=self.today)
+        self.assertEqual((loose.total_quantity, loose.total_revenue), (4, Decimal('6')))
+        self.assertEqual(DailySalesRecord.objects.get(date=self.today).total_sales, Decimal('36'))
+        self.assertEqual(Item.objects.get(pk=self.soap.pk).last_sold_date, self.today)
+
+        # Negative deltas never take units below zero
+        apply_rollup(self._rollup((self.soap.id, 'Soap', -5, Decimal('-30'))))
+        unit.refresh_from_db()
+        self.assertEqual((unit.total_quantity, unit.total_revenue), (0, Decimal('0')))
+
+    def test_cost_does_not_depend_on_sales_already_recorded(self):
+        def queries():
+            with CaptureQueriesContext(connection) as captured:
+                apply_rollup(self._rollup((self.soap.id, 'Soap', 1, Decimal('10')), (self.mop.id, 'Mop', 1, Decimal('80'))))
+            return len(captured)
+
+        first = queries()
+        for _ in range(20):
+            checkout([{'product_id': self.soap.id, 'quantity': 1}])
+        self.assertEqual(queries(), first)
+
+    def test_missing_index_is_rebuilt_after_merging_duplicates(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX "POS_saleitemunit_product_day_uniq"')
+        SaleItemUnit.objects.create(product_id=self.soap.id, product_name='Soap', date=self.today, total_quantity=2, total_revenue=20)
+        SaleItemUnit.objects.create(product_id=self.soap.id, product_name='Soap', date=self.today, total_quantity=3, total_revenue=30)
+        self.assertTrue(ensure_rollup_indexes())
+        self.assertFalse(ensure_rollup_indexes())
+        unit = SaleItemUnit.objects.get(product_id=self.soap.id, date=self.today)
+        self.assertEqual((unit.total_quantity, unit.total_revenue), (5, Decimal('50')))
+
+    def test_void_returns_stock_and_reverses_rollups(self):
+        sale = checkout([{'product_id': self.soap.id, 'quantity': 2}, {'product_id': self.mop.id, 'quantity': 1}])
+        checkout([{'product_id': self.soap.id, 'quantity': 1}])
+        self.assertEqual(void_sale(sale.pk), Decimal('100'))
+        self.assertFalse(Sale.objects.filter(pk=sale.pk).exists())
+        self.assertFalse(Transaction.objects.filter(sale_id=sale.pk).exists())
+        self.assertEqual(Item.objects.get(pk=self.soap.pk).stock, 19)
+        self.assertEqual(Item.objects.get(pk=self.mop.pk).stock, 5)
+        self.assertEqual(StockMovement.objects.get(item=self.mop, kind='return').quantity, 1)
+        soap = SaleItemUnit.objects.get(product_id=self.soap.id, date=self.today)
+        self.assertEqual((soap.total_quantity, soap.total_revenue), (1, Decimal('10')))
+        self.assertEqual(SaleItemUnit.objects.get(product_id=self.mop.id, date=self.today).total_quantity, 0)
+        self.assertEqual(DailySalesRecord.objects.get(date=self.today).total_sales, Decimal('10'))
+        self.assertEqual(ItemDemandStats.objects.get(item=self.soap).sold_7d, 1)
+
+    def test_partial_refund_reduces_the_sale_and_rollups(self):
+        sale = checkout(
+            [{'product_id': self.soap.id, 'quantity': 3}, {'product_id': self.mop.id, 'quantity': 1}], discount='5',
+        )
+        with self.assertRaises(CheckoutError):
+            refund_items(sale.pk, [{'product_id': self.soap.id, 'quantity': 4}])
+        self.assertEqual(refund_items(sale.pk, [{'product_id': self.soap.id, 'quantity': 2}]), Decimal('20'))
+        sale.refresh_from_db()
+        self.assertEqual((sale.subtotal, sale.total, sale.transaction.total), (Decimal('90'), Decimal('85'), Decimal('85')))
+        self.assertEqual(sale.items.get(product_id=self.soap.id).quantity, 1)
+        self.assertEqual(Item.objects.get(pk=self.soap.pk).stock, 19)
+        soap = SaleItemUnit.objects.get(product_id=self.soap.id, date=self.today)
+        self.assertEqual((soap.total_quantity, soap.total_revenue), (1, Decimal('10')))
+        self.assertEqual(DailySalesRecord.objects.get(date=self.today).total_sales, Decimal('85'))
+
+        # Refunding what is left voids the sale
+        refund_items(sale.pk, [{'product_id': self.soap.id, 'quantity': 1}, {'product_id': self.mop.id, 'quantity': 1}])
+        self.assertFalse(Sale.objects.filter(pk=sale.pk).exists())
+        self.assertEqual(DailySalesRecord.objects.get(date=self.today).total_sales, Decimal('0'))
+
+
+class RollupRebuildTests(TestCase):
+    def setUp(self):
+        self.soap = Item.objects.create(name="Soap", sku="S1", price=10, category="Bath", stock=100)
+        self.mop = Item.objects.create(name="Mop", sku="M1", price=80, category="Home", stock=100)
+        self.today = timezone.localdate()
+        # 23:30 local is the previous UTC day; the rollups must use the local one
+        late = timezone.localtime().replace(hour=23, minute=30, second=0, microsecond=0)
+        for days_ago, lines in ((9, [(self.soap, 2)]), (4, [(self.soap, 1), (self.mop, 1)]), (0, [(self.mop, 2)])):
+            checkout([{'product_id': item.id, 'quantity': quantity} for item, quantity in lines],
+                     sold_at=late - timedelta(days=days_ago))
+        self.expected = self._rollups()
+
+    def _rollups(self):
+        return (
+            sorted(SaleItemUnit.objects.values_list('product_id', 'date', 'total_quantity', 'total_revenue')),
+            sorted(DailySalesRecord.objects.values_list('date', 'total_sales')),
+        )
+
+    def test_partitions_cover_the_range(self):
+        start = self.today - timedelta(days=9)
+        partitions = rollup_partitions(start, self.today, 4)
+        self.assertEqual([(first - start).days for first, _ in partitions], [0, 4, 8])
+        self.assertEqual(partitions[-1][1], self.today)
+
+    def test_rebuild_restores_drifted_rollups(self):
+        SaleItemUnit.objects.filter(product_id=self.mop.id).update(total_quantity=99)
+        DailySalesRecord.objects.filter(date=self.today).delete()
+        SaleItemUnit.objects.create(product_id=self.soap.id, product_name='Soap', total_quantity=5,
+                                    date=self.today - timedelta(days=30))
+        self.assertEqual(rebuild_rollups(partition_days=3), (11, 4, 3))
+        self.assertEqual(self._rollups(), self.expected)
+        self.assertEqual(ItemDemandStats.objects.get(item=self.mop).sold_7d, 3)
+
+    def test_since_leaves_earlier_days_alone(self):
+        SaleItemUnit.objects.update(total_quantity=50)
+        out = StringIO()
+        call_command('rebuild_sales_rollups', since=str(self.today - timedelta(days=5)), workers=1, stdout=out)
+        self.assertIn('Rebuilt 1 partition(s)', out.getvalue())
+        early = SaleItemUnit.objects.get(product_id=self.soap.id, date=self.today - timedelta(days=9))
+        self.assertEqual(early.total_quantity, 50)
+        self.assertEqual(SaleItemUnit.objects.get(product_id=self.mop.id, date=self.today).total_quantity, 2)
+
+
+class RollupRebuildPoolTests(TransactionTestCase):
+    def test_sale_during_rebuild_is_kept(self):
+        item = Item.objects.create(name="Soap", sku="S1", price=10, category="Bath", stock=100)
+        checkout([{'product_id': item.id, 'quantity': 1}])
+        aggregate = rollups.aggregate_partition
+        sellers = []
+
+        def sell():
+            try:
+                checkout([{'product_id': item.id, 'quantity': 2}])
+            finally:
+                connection.close()
+
+        def aggregate_then_sell(first, last):
+            result = aggregate(first, last)
+            if not sellers:
+                # Another terminal commits a sale between the aggregate and the swap
+                sellers.append(threading.Thread(target=sell))
+                sellers[0].start()
+                sellers[0].join(0.5)
+            return result
+
+        with mock.patch('Inventory.rollups.aggregate_partition', side_effect=aggregate_then_sell):
+            rebuild_rollups(since=timezone.localdate(), workers=1)
+        sellers[0].join()
+        self.assertEqual(SaleItemUnit.objects.get(product_id=item.id, date=timezone.localdate()).total_quantity, 3)
+        self.assertEqual(DailySalesRecord.objects.get(date=timezone.localdate()).total_sales, 30)
+
+    def test_process_pool_matches_inline_rebuild(self):
+        item = Item.objects.create(name="Soap", sku="S1", price=10, category="Bath", stock=100)
+        now = timezone.now()
+        for days_ago in range(6):
+            checkout([{'product_id': item.id, 'quantity': days_ago + 1}], sold_at=now - timedelta(days=days_ago))
+        expected = sorted(SaleItemUnit.objects.values_list('date', 'total_quantity'))
+        SaleItemUnit.objects.all().delete()
+        self.assertEqual(rebuild_rollups(partition_days=2, workers=2)[1], 6)
+        self.assertEqual(sorted(SaleItemUnit.objects.values_list('date', 'total_quantity')), expected)
+
+
+class SyntheticSalesTests(TestCase):
+    def setUp(self):
+        for index in range(8):
+            Item.objects.create(name=f"Part {index}", sku=f"P{index}", price=10 + index, category="Parts", stock=50)
+
+    def test_same_seed_draws_the_same_sales(self):
+        args = (np.arange(1, 9), np.full(8, 1000), timezone.localdate(), 60)
+        first, second = draw_sales(*args, seed=3), draw_sales(*args, seed=3)
+        for a, b in zip(first, second):
+            for key in a:
+                np.testing.assert_array_equal(a[key], b[key])
+        self.assertFalse(np.array_equal(draw_sales(*args, seed=4)[1]['product'][:50], first[1]['product'][:50]))
+        sales, lines = first
+        self.assertTrue((np.diff(sales['day']) >= 0).all())
+        self.assertTrue((sales['subtotal'] - sales['discount'] == sales['total']).all())
+        self.assertEqual(sales['subtotal'].sum(), lines['line_total'].sum())
+
+    def test_generated_history_matches_its_rollups(self):
+        result = generate_sales(days=14, sales_per_day=15, seed=1)
+        self.assertEqual(Sale.objects.count(), result.sales)
+        self.assertEqual(SaleItem.objects.count(), result.lines)
+        self.assertEqual(Transaction.objects.count(), result.sales)
+        self.assertEqual(Item.objects.get(name="Part 0").stock, 50)
+        sale = Sale.objects.order_by('id').first()
+        self.assertEqual(sale.total, sale.items.aggregate(total=Sum('line_total'))['total'] - sale.discount)
+        self.assertEqual(timezone.localdate(sale.date), result.first_day)
+        self.assertEqual(
+            SaleItemUnit.objects.aggregate(q=Sum('total_quantity'), r=Sum('total_revenue')),
+            {'q': SaleItem.objects.aggregate(q=Sum('quantity'))['q'],
+             'r': SaleItem.objects.aggregate(r=Sum('line_total'))['r']},
+        )
+        self.assertEqual(DailySalesRecord.objects.aggregate(t=Sum('total_sales'))['t'],
+                         Sale.objects.aggregate(t=Sum('total'))['t'])
+
+        # Appending more history continues after the existing ids
+        out = StringIO()
+        call_command('generate_dummy_transactions', seed=2, days=3, sales_per_day=5, stdout=out)
+        self.assertIn('(seed 2)', out.getvalue())
+        self.assertEqual(Transaction.objects.count(), Sale.objects.count())
+
+
+def query_plan(queryset):
+    """EXPLAIN QUERY PLAN detail lines for a queryset (SQLite)."""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite-specific')
+class QueryPlanTests(TestCase):
+    """The hot POS queries must find their rows through an index, never a full table scan."""
+
+    def setUp(self):
+        self.day = timezone.localdate()
+        self.start = timezone.make_aware(datetime.combine(self.day, time.min))
+        self.end = self.start + timedelta(days=1)
+
+    def assertSearches(self, queryset, *indexes):
+        plan = query_plan(queryset)
+        self.assertFalse([step for step in plan if step.startswith('SCAN')], plan)
+        for index in indexes:
+            self.assertTrue(any(index in step for step in plan), plan)
+
+    def test_sale_lines_by_sale_date(self):
+        # DailySalesDetailsAPIView
+        self.assertSearches(
+            SaleItem.objects.filter(sale__date__gte=self.start, sale__date__lte=self.end)
+            .select_related('product').order_by('sale__date'),
+            'POS_sale_date_idx', 'POS_saleitem_sale_id',
+        )
+        # rollups.aggregate_partition
+        self.assertSearches(
+            SaleItem.objects.filter(sale_id__in=Sale.objects.filter(date__gte=self.start, date__lt=self.end).values('id'))
+            .values('product_id').annotate(quantity=Sum('quantity')),
+            'POS_sale_date_idx', 'POS_saleitem_sale_id',
+        )
+
+    def test_rollups_by_date_and_product(self):
+        # Dashboard top sellers
+        self.assertSearches(
+            SaleItemUnit.objects.filter(date__gte=self.day - timedelta(days=7))
+            .values('product_name').annotate(total=Sum('total_quantity')),
+            'POS_saleitemunit_date_product_idx',
+        )
+        # Demand stats for all products and for a few
+        window = SaleItemUnit.objects.filter(date__gte=self.day - timedelta(days=30), date__lte=self.day)
+        self.assertSearches(window.values('product_id').annotate(total=Sum('total_quantity')),
+                            'POS_saleitemunit_date_product_idx')
+        self.assertSearches(window.filter(product_id__in=[1, 2]).values('product_id').annotate(total=Sum('total_quantity')),
+                            'POS_saleitemunit_product_day_uniq')
+        self.assertSearches(DailySalesRecord.objects.filter(date__gte=self.day - timedelta(days=30)))
+
+    def test_transactions_by_date(self):
+        self.assertSearches(Transaction.objects.filter(date__gte=self.start, date__lt=self.end), 'POS_transaction_date_idx')
+
+    def test_dropped_index_is_recreated(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX "POS_transaction_date_idx"')
+        self.assertEqual(ensure_pos_indexes(), ['POS_transaction_date_idx'])
+        self.assertEqual(ensure_pos_indexes(), [])
+        self.assertSearches(Transaction.objects.filter(date__gte=self.start), 'POS_transaction_date_idx')
+
+
+class SalesArchiveTests(TestCase):
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp(prefix="sales_archive_")
+        self.addCleanup(shutil.rmtree, self.archive_dir, ignore_errors=True)
+        settings_override = override_settings(SALES_ARCHIVE_DIR=self.archive_dir, SALES_ARCHIVE_FORMAT='csv')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for index in range(6):
+            Item.objects.create(name=f"Part {index}", sku=f"P{index}", price=10 + index, category="Parts", stock=500)
+        self.today = timezone.localdate()
+        self.history = generate_sales(days=50, sales_per_day=6, seed=5, last_day=self.today - timedelta(days=40))
+        self.old_sale = Sale.objects.order_by('id').first()
+        SyncedSale.objects.create(client_id=uuid.uuid4(), sale=self.old_sale, terminal="T1")
+        checkout([{'product_id': Item.objects.first().id, 'quantity': 1}])
+        self.rows = self._rows()
+        self.rollups = self._rollups()
+
+    def _rows(self):
+        return [
+            sorted(model.objects.values_list(*[f.attname for f in model._meta.concrete_fields]))
+            for model in (Sale, SaleItem, Transaction, SyncedSale)
+        ]
+
+    def _rollups(self):
+        return (
+            sorted(SaleItemUnit.objects.values_list('product_id', 'date', 'total_quantity', 'total_revenue')),
+            sorted(DailySalesRecord.objects.values_list('date', 'total_sales')),
+        )
+
+    def _archive(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return archive_sales(older_than_days=0, **kwargs)
+
+    def test_archive_keeps_rollups_and_restore_puts_rows_back(self):
+        months = self._archive()
+        self.assertEqual([entry.month for entry in months], sorted({
+            (self.history.first_day + timedelta(days=offset)).replace(day=1) for offset in range(50)
+        }))
+        self.assertEqual(sum(entry.sales for entry in months), self.history.sales)
+        self.assertEqual(Sale.objects.count(), 1)
+        self.assertFalse(SyncedSale.objects.exists())
+        self.assertEqual(self._rollups(), self.rollups)
+        self.assertEqual(len(os.listdir(self.archive_dir)), 2 * len(months))
+        self.assertTrue(months[0].sales_file.endswith('.csv.gz'))
+
+        # Rebuilt rollups still count the archived days
+        rebuild_rollups()
+        self.assertEqual(self._rollups(), self.rollups)
+
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('restore_sales_archive', all=True, stdout=out)
+        self.assertIn(f'Restored {len(months)} month(s), {self.history.sales} sale(s)', out.getvalue())
+        self.assertEqual(self._rows(), self.rows)
+        self.assertFalse(ArchivedMonth.objects.exists())
+        self.assertEqual(os.listdir(self.archive_dir), [])
+        # Sequences continue after the restored ids
+        self.assertGreater(checkout([{'product_id': Item.objects.first().id, 'quantity': 1}]).id, self.rows[0][-1][0])
+
+    def test_archived_lines_are_read_back_on_demand(self):
+        day = self.history.first_day + timedelta(days=3)
+        expected = sorted(SaleItem.objects.filter(sale__date__date=day).values_list('id', 'product_id', 'quantity', 'line_total'))
+        self.assertTrue(expected)
+        url = "/sales_forecast/api/daily_sales_details/"
+        before = self.client.get(url, {"date": day.isoformat()}).json()
+        self._archive()
+
+        lines = archived_lines(day)
+        self.assertEqual(
+            sorted(zip(lines['id'].tolist(), lines['product_id'].tolist(), lines['quantity'].tolist(), map(Decimal, lines['line_total']))),
+            expected,
+        )
+        after = self.client.get(url, {"date": day.isoformat()}).json()
+        self.assertEqual(after, before)
+
+        frame = sale_lines(self.history.first_day, self.today)
+        self.assertEqual(len(frame), self.history.lines + 1)
+        self.assertEqual(frame['quantity'].sum(), sum(row[4] for row in self.rows[1]))
+
+    def test_late_sale_joins_its_archived_month(self):
+        first = self._archive()[0]
+        old_files = [first.sales_file, first.lines_file]
+        sold_at = timezone.make_aware(datetime.combine(self.history.first_day, time(12)))
+        late = checkout([{'product_id': Item.objects.first().id, 'quantity': 2}], sold_at=sold_at)
+        self.assertEqual([entry.month for entry in self._archive()], [first.month])
+        entry = ArchivedMonth.objects.get(month=first.month)
+        self.assertEqual((entry.sales, entry.lines), (first.sales + 1, first.lines + 1))
+        self.assertFalse(Sale.objects.filter(id=late.id).exists())
+        self.assertFalse(set(old_files) & set(os.listdir(self.archive_dir)))
+        self.assertIn(late.id, archived_lines(self.history.first_day)['sale_id'].tolist())
+
+    def test_damaged_file_is_not_restored(self):
+        entry = self._archive()[0]
+        with open(os.path.join(self.archive_dir, entry.lines_file), 'ab') as fh:
+            fh.write(b'x')
+        with self.assertRaises(ArchiveError):
+            restore_month(entry.month)
+        self.assertTrue(ArchivedMonth.objects.filter(month=entry.month).exists())
+        self.assertEqual(Sale.objects.count(), 1)
+
+    def test_command_and_formats(self):
+        out = StringIO()
+        call_command('archive_sales', older_than_days=3650, stdout=out)
+        self.assertIn('No sales old enough', out.getvalue())
+        if archive.pyarrow is None:
+            with self.assertRaises(ArchiveError):
+                archive_sales(older_than_days=0, fmt='parquet')
+        else:
+            months = self._archive(fmt='parquet')
+            self.assertTrue(months[0].lines_file.endswith('.parquet'))
+            with self.captureOnCommitCallbacks(execute=True):
+                for entry in months:
+                    restore_month(entry.month)
+            self.assertEqual(self._rows(), self.rows)
@@ -0,0 +1,138 @@
+"""
+Responsive derivatives (thumbnails) for product images.
+
+When an Item.image is uploaded or replaced, WebP and JPEG copies are written
+next to the original at a few fixed widths. Derivative names embed a short
+hash of the original's content, e.g.
+
+    inventory_images/soap.jpg -> inventory_images/soap-3f9a1c0b7d2e-192w.webp
+
+so a replaced image never serves a stale cached thumbnail, and the hash stored
+on Item.image_digest is enough to build every derivative URL without touching
+the filesystem.
+"""
+import hashlib
+import os
+import re
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    ImageOps = None
+
+THUMBNAIL_WIDTHS = (96, 192, 384)
+THUMBNAIL_FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+DIGEST_LENGTH = 12
+HASH_CHUNK_SIZE = 64 * 1024
+
+DERIVATIVE_RE = re.compile(r'-[0-9a-f]{%d}-\d+w\.(%s)$' % (DIGEST_LENGTH, '|'.join(THUMBNAIL_FORMATS)))
+
+
+def is_derivative_name(filename):
+    """True for files produced by this module (excluded from the image picker)."""
+    return bool(DERIVATIVE_RE.search(filename))
+
+
+def file_digest(path):
+    """Short SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:DIGEST_LENGTH]
+
+
+def derivative_name(image_name, digest, width, ext):
+    """Storage-relative name of one derivative of `image_name`."""
+    stem, _ = os.path.splitext(image_name)
+    return f"{stem}-{digest}-{width}w.{ext}"
+
+
+def generate_derivatives(path, widths=THUMBNAIL_WIDTHS, formats=tuple(THUMBNAIL_FORMATS), force=False):
+    """
+    Writes derivatives for the image at absolute `path` and returns
+    (digest, [written paths]). Every width gets a file so derivative URLs
+    are always valid, but small images are never upscaled: widths above the
+    original are written at the original size. Existing files are kept
+    unless `force` is set.
+
+    Plain paths in and out, so this can run in a worker process.
+    """
+    if Image is None:
+        raise RuntimeError("Pillow is required to generate thumbnails.")
+
+    digest = file_digest(path)
+    written = []
+    with Image.open(path) as original:
+        # Respect camera orientation and flatten alpha for JPEG output
+        img = ImageOps.exif_transpose(original)
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+        src_width, src_height = img.size
+
+        for width in sorted(widths):
+            target_width = min(width, src_width)
+            target_height = max(1, round(src_height * target_width / src_width))
+            resized = None
+            for ext in formats:
+                target = derivative_name(path, digest, width, ext)
+                if not force and os.path.exists(target):
+                    continue
+                if resized is None:
+                    resized = img if target_width == src_width else img.resize((target_width, target_height), Image.LANCZOS)
+                out = resized
+                if THUMBNAIL_FORMATS[ext]['format'] == 'JPEG' and out.mode == 'RGBA':
+                    background = Image.new('RGB', out.size, (255, 255, 255))
+                    background.paste(out, mask=out.getchannel('A'))
+                    out = background
+                options = dict(THUMBNAIL_FORMATS[ext])
+                out.save(target, options.pop('format'), **options)
+                written.append(target)
+    return digest, written
+
+
+def remove_derivatives(path):
+    """Deletes every derivative that belongs to the original at absolute `path`."""
+    directory, filename = os.path.split(path)
+    stem, _ = os.path.splitext(filename)
+    removed = 0
+    if not os.path.isdir(directory):
+        return removed
+    for name in os.listdir(directory):
+        if name.startswith(f"{stem}-") and is_derivative_name(name) and DERIVATIVE_RE.sub('', name) == stem:
+            try:
+                os.remove(os.path.join(directory, name))
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+def thumbnail_url(image, digest, width, ext='webp'):
+    """
+    URL of the smallest derivative at least `width` pixels wide, falling back
+    to the original image URL when no derivative exists for that size.
+    """
+    if not image:
+        return ''
+    if digest:
+        for candidate in sorted(THUMBNAIL_WIDTHS):
+            if candidate >= width:
+                # Every width is written, so trust the stored digest rather
+                # than stat the file on every render.
+                return image.storage.url(derivative_name(image.name, digest, candidate, ext))
+    return image.url
+
+
+def thumbnail_srcset(image, digest, ext='webp'):
+    """`srcset` value listing every derivative width."""
+    if not image or not digest:
+        return ''
+    return ', '.join(
+        f"{image.storage.url(derivative_name(image.name, digest, width, ext))} {width}w"
+        for width in THUMBNAIL_WIDTHS
+    )
@@ -9,8 +9,20 @@ app_name = 'inventory'
 urlpatterns = [
     path('', views.inventory_view, name='list'),
     path('add/', views.inventory_view, name='add_product'),
+    path('api/items/', views.inventory_items_api, name='items_api'),
+    path('api/search/', views.inventory_search_api, name='search_api'),
+    path('api/scan/', views.inventory_scan_api, name='scan_api'),
+    path('api/catalog/', views.inventory_catalog_api, name='catalog_api'),
+    path('api/sales/sync/', views.sale_sync_api, name='sale_sync_api'),
+    path('api/live/', views.inventory_live_stream, name='live_api'),
+    path('api/images/', views.inventory_images_api, name='images_api'),
     path('update/<int:product_id>/', views.update_product, name='update_product'),
     path('delete/<int:product_id>/', views.delete_product, name='delete_product'),
+    path('api/delete-jobs/<int:job_id>/', views.delete_job_status, name='delete_job_status'),
     path('restock/<int:product_id>/', views.restock_item, name='restock_item'),
+    path('api/restock/bulk/', views.bulk_restock_api, name='bulk_restock_api'),
+    path('api/import/', views.import_products_api, name='import_products_api'),
+    path('api/valuation/', views.inventory_valuation_api, name='valuation_api'),
     path('export/excel/', views.export_inventory_to_excel, name='export_inventory_to_excel'),
+    path('export/valuation/', views.export_valuation_report, name='export_valuation_report'),
 ]
\ No newline at end of file
@@ -1,8 +1,9 @@
-
 from django.utils import timezone
 from datetime import timedelta
-from django.db.models import Sum
-from django.db.models.functions import TruncDay
+from django.db import transaction
+from django.db.models import Sum, Count, Min, F
+from django.db.models.functions import TruncDay, Coalesce, Greatest
+import numpy as np
 
 # Attempt to import SaleItemUnit defensively
 try:
@@ -10,47 +11,301 @@ try:
 except ImportError:
     SaleItemUnit = None
 
-def get_dynamic_min_stock_level(item, sales_period_days=30, safety_multiplier=1.5):
+DEFAULT_MIN_STOCK_LEVEL = 10
+DEMAND_WINDOW_DAYS = 30
+SHORT_WINDOW_DAYS = 7
+SAFETY_MULTIPLIER = 1.5
+
+
+def _fixed_min_stock_level(item):
+    """Return the item's configured min_stock_level (or the app default)."""
+    return item.min_stock_level if hasattr(item, 'min_stock_level') else DEFAULT_MIN_STOCK_LEVEL
+
+
+def _aggregate_sales_stats(product_ids, start_date, end_date):
     """
-    Calculates a dynamic minimum stock level for an item based on its recent sales data.
+    One grouped query over SaleItemUnit returning
+    {product_id: (total_sold, sales_days)} for the given date range.
+    Pass product_ids=None to aggregate every product.
+    """
+    qs = SaleItemUnit.objects.filter(date__gte=start_date, date__lte=end_date)
+    if product_ids is not None:
+        qs = qs.filter(product_id__in=list(product_ids))
+    sales_data = (
+        qs.values('product_id')
+        .annotate(total_sold=Sum('total_quantity'), sales_days=Count('date', distinct=True))
+    )
+    return {
+        row['product_id']: (row['total_sold'] or 0, row['sales_days'] or 0)
+        for row in sales_data if row['product_id'] is not None
+    }
+
+
+def _dynamic_levels(stats, safety_multiplier=SAFETY_MULTIPLIER):
+    """
+    Vectorized threshold pass over {product_id: (total_sold, sales_days)}.
+    Products without sales are omitted so callers fall back to the fixed level.
+    """
+    if not stats:
+        return {}
+
+    product_ids = np.fromiter(stats.keys(), dtype=np.int64, count=len(stats))
+    totals = np.array([s[0] for s in stats.values()], dtype=float)
+    days = np.array([s[1] for s in stats.values()], dtype=float)
+
+    # Average over actual sales days (not the period length) so sparse sellers
+    # are not underestimated; ensure the threshold is at least 1 if sales occurred.
+    average_daily_sales = np.divide(totals, days, out=np.zeros_like(totals), where=days > 0)
+    dynamic = np.maximum(1, (average_daily_sales * safety_multiplier).astype(np.int64))
+
+    return {
+        product_id: level
+        for product_id, total, level in zip(product_ids.tolist(), totals.tolist(), dynamic.tolist())
+        if total > 0
+    }
+
+
+def _level_for(sold, sales_days, safety_multiplier=SAFETY_MULTIPLIER):
+    """Scalar version of the threshold formula used for incremental updates."""
+    if sold <= 0 or sales_days <= 0:
+        return None
+    return max(1, int((sold / sales_days) * safety_multiplier))
+
+
+# ==================== MATERIALIZED DEMAND STATS ====================
+def rebuild_item_demand_stats(product_ids=None, as_of=None):
+    """
+    Recomputes ItemDemandStats rows from SaleItemUnit for the rolling window
+    ending on `as_of` (defaults to today). Rebuilds every item when
+    product_ids is None, otherwise only the given items.
+    """
+    from .models import Item, ItemDemandStats
+
+    if SaleItemUnit is None:
+        return 0
+
+    as_of = as_of or timezone.now().date()
+    start_30 = as_of - timedelta(days=DEMAND_WINDOW_DAYS)
+    start_7 = as_of - timedelta(days=SHORT_WINDOW_DAYS)
+
+    stats_30 = _aggregate_sales_stats(product_ids, start_30, as_of)
+    stats_7 = _aggregate_sales_stats(stats_30.keys(), start_7, as_of) if stats_30 else {}
+    levels = _dynamic_levels(stats_30)
+
+    # SaleItemUnit.product_id is not a foreign key; skip rows for deleted items
+    existing_ids = set(Item.objects.filter(id__in=list(stats_30)).values_list('id', flat=True))
+    rows = [
+        ItemDemandStats(
+            item_id=product_id,
+            window_date=as_of,
+            sold_7d=stats_7.get(product_id, (0, 0))[0],
+            sold_30d=total,
+            sales_days_30d=days,
+            dynamic_min_level=levels.get(product_id),
+        )
+        for product_id, (total, days) in stats_30.items() if product_id in existing_ids
+    ]
+
+    with transaction.atomic():
+        stale = ItemDemandStats.objects.all()
+        if product_ids is not None:
+            stale = stale.filter(item_id__in=list(product_ids))
+        # Keep restock timestamps across rebuilds
+        restocks = dict(stale.exclude(last_restock_at__isnull=True).values_list('item_id', 'last_restock_at'))
+        stale.delete()
+        for row in rows:
+            row.last_restock_at = restocks.pop(row.item_id, None)
+        rows += [
+            ItemDemandStats(item_id=item_id, window_date=as_of, last_restock_at=restocked)
+            for item_id, restocked in restocks.items()
+        ]
+        ItemDemandStats.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def ensure_demand_stats_current():
+    """
+    Rebuilds all demand stats once the rolling window has moved to a new day.
+    Returns True when a rebuild happened.
+    """
+    from .models import Item, ItemDemandStats
+
+    today = timezone.now().date()
+    oldest = ItemDemandStats.objects.aggregate(oldest=Min('window_date'))['oldest']
+    if oldest is None:
+        # No rows: a rebuild only adds some if an existing item sold inside the window
+        if SaleItemUnit is None or not SaleItemUnit.objects.filter(
+            date__gte=today - timedelta(days=DEMAND_WINDOW_DAYS), date__lte=today,
+            product_id__in=Item.objects.values('id'),
+        ).exists():
+            return False
+    elif oldest >= today:
+        return False
+    rebuild_item_demand_stats(as_of=today)
+    return True
+
+
+def apply_sale_to_demand_stats(product_id, sale_date, quantity, new_sales_day=False):
+    """
+    Applies a committed sale delta (units for one product on one day) to the
+    item's materialized stats without re-aggregating its sales history.
+    """
+    from .models import ItemDemandStats
+
+    if not product_id or not quantity:
+        return
+    if hasattr(sale_date, 'date'):
+        sale_date = sale_date.date()
+    today = timezone.now().date()
+    if ensure_demand_stats_current():
+        # The window rolled over: the rebuild already reflects this sale
+        return
+    if sale_date > today or sale_date < today - timedelta(days=DEMAND_WINDOW_DAYS):
+        return
+
+    # Add the delta in SQL so terminals selling the same item concurrently
+    # do not overwrite each other's counts
+    changes = {'sold_30d': Greatest(F('sold_30d') + quantity, 0), 'updated_at': timezone.now()}
+    if sale_date >= today - timedelta(days=SHORT_WINDOW_DAYS):
+        changes['sold_7d'] = Greatest(F('sold_7d') + quantity, 0)
+    if new_sales_day:
+        changes['sales_days_30d'] = F('sales_days_30d') + 1
+    with transaction.atomic():
+        stats = ItemDemandStats.objects.filter(item_id=product_id)
+        if not stats.update(**changes):
+            # First sale of this item inside the window
+            rebuild_item_demand_stats(product_ids=[product_id], as_of=today)
+            return
+        # The UPDATE holds the row's write lock, so this reads our own totals
+        sold, sales_days = stats.values_list('sold_30d', 'sales_days_30d').get()
+        stats.update(dynamic_min_level=_level_for(sold, sales_days))
+
+
+def record_restock_in_demand_stats(item_id, restocked_at=None):
+    """Stamps the last restock time on the item's demand stats row."""
+    record_restocks_in_demand_stats([item_id], restocked_at)
+
+
+def record_restocks_in_demand_stats(item_ids, restocked_at=None):
+    """Batched record_restock_in_demand_stats for many items restocked together."""
+    from .models import ItemDemandStats
+
+    item_ids = list(item_ids)
+    if not item_ids:
+        return
+    restocked_at = restocked_at or timezone.now()
+    ensure_demand_stats_current()
+    updated = ItemDemandStats.objects.filter(item_id__in=item_ids).update(last_restock_at=restocked_at)
+    if updated == len(set(item_ids)):
+        return
+    existing = set(ItemDemandStats.objects.filter(item_id__in=item_ids).values_list('item_id', flat=True))
+    # No sales inside the window, so empty stats rows are accurate
+    ItemDemandStats.objects.bulk_create([
+        ItemDemandStats(item_id=item_id, window_date=timezone.now().date(), last_restock_at=restocked_at)
+        for item_id in item_ids if item_id not in existing
+    ], batch_size=500, ignore_conflicts=True)
+
+
+# ==================== THRESHOLD API ====================
+def compute_dynamic_thresholds(items, sales_period_days=DEMAND_WINDOW_DAYS, safety_multiplier=SAFETY_MULTIPLIER):
+    """
+    Calculates dynamic minimum stock levels for many items at once.
+
+    With the default window and multiplier the thresholds are read from the
+    materialized ItemDemandStats table in a single indexed lookup. Other
+    parameters fall back to one grouped query over SaleItemUnit followed by a
+    vectorized pass.
 
     Args:
-        item: The Inventory.Item object for which to calculate the threshold.
+        items: Iterable (list or queryset) of Inventory.Item objects.
         sales_period_days: The number of recent days to consider for sales data.
         safety_multiplier: Multiplier for average daily sales to determine safety stock.
 
     Returns:
-        An integer representing the dynamic minimum stock level.
+        A dict mapping item id -> integer dynamic minimum stock level.
     """
+    from .models import ItemDemandStats
+
+    items = list(items)
+    if not items:
+        return {}
+
+    thresholds = {item.id: _fixed_min_stock_level(item) for item in items}
     if SaleItemUnit is None:
         # Fallback if SaleItemUnit cannot be imported
-        return item.min_stock_level if hasattr(item, 'min_stock_level') else 10
-
-    end_date = timezone.now().date()
-    start_date = end_date - timedelta(days=sales_period_days)
-
-    # Aggregate sales data for the item over the period
-    sales_data = SaleItemUnit.objects.filter(
-        product_id=item.id,
-        date__gte=start_date,
-        date__lte=end_date
-    ).values('date').annotate(total_sold=Sum('total_quantity'))
-
-    if not sales_data:
-        # No sales data found for the period, return the item's fixed min_stock_level or a default
-        return item.min_stock_level if hasattr(item, 'min_stock_level') else 10
-
-    total_quantity_sold = sum(entry['total_sold'] for entry in sales_data)
-    
-    # Calculate the number of actual sales days, not just the period length
-    # This prevents underestimating average daily sales if sales are sparse
-    num_sales_days = len(set(entry['date'] for entry in sales_data))
-    if num_sales_days == 0:
-        average_daily_sales = 0
+        return thresholds
+
+    if sales_period_days == DEMAND_WINDOW_DAYS and safety_multiplier == SAFETY_MULTIPLIER:
+        ensure_demand_stats_current()
+        levels = dict(
+            ItemDemandStats.objects.filter(item_id__in=list(thresholds), dynamic_min_level__isnull=False)
+            .values_list('item_id', 'dynamic_min_level')
+        )
     else:
-        average_daily_sales = total_quantity_sold / num_sales_days
+        end_date = timezone.now().date()
+        start_date = end_date - timedelta(days=sales_period_days)
+        levels = _dynamic_levels(_aggregate_sales_stats(thresholds.keys(), start_date, end_date), safety_multiplier)
+
+    thresholds.update(levels)
+    return thresholds
+
+
+def get_dynamic_min_stock_level(item, sales_period_days=DEMAND_WINDOW_DAYS, safety_multiplier=SAFETY_MULTIPLIER):
+    """
+    Calculates a dynamic minimum stock level for an item based on its recent sales data.
+
+    Args:
+        item: The Inventory.Item object for which to calculate the threshold.
+        sales_period_days: The number of recent days to consider for sales data.
+        safety_multiplier: Multiplier for average daily sales to determine safety stock.
+
+    Returns:
+        An integer representing the dynamic minimum stock level.
+    """
+    thresholds = compute_dynamic_thresholds(
+        [item],
+        sales_period_days=sales_period_days,
+        safety_multiplier=safety_multiplier
+    )
+    return thresholds.get(item.id, _fixed_min_stock_level(item))
+
+
+def get_low_stock_items(items):
+    """
+    Returns the items whose stock is below their dynamic minimum level as a list
+    of dicts (name, stock, min_level) ready for templates and exports.
+    """
+    items = list(items)
+    thresholds = compute_dynamic_thresholds(items)
+    low_stock = []
+    for item in items:
+        min_level = thresholds.get(item.id, _fixed_min_stock_level(item))
+        if item.stock < min_level:
+            low_stock.append({
+                'id': item.id,
+                'name': item.name,
+                'stock': item.stock,
+                'min_level': min_level
+            })
+    return low_stock
+
+
+def annotate_min_levels(queryset):
+    """
+    Annotates an Item queryset with `effective_min_level` (the materialized
+    dynamic level, falling back to the fixed min_stock_level) so low-stock
+    filters can run inside the database.
+    """
+    if SaleItemUnit is not None:
+        ensure_demand_stats_current()
+    return queryset.annotate(
+        effective_min_level=Coalesce('demand_stats__dynamic_min_level', 'min_stock_level')
+    )
+
+
+def low_stock_queryset(queryset=None):
+    """Items whose stock is below their effective minimum level."""
+    from .models import Item
 
-    # Calculate dynamic threshold, ensuring it's at least 1 if sales occurred
-    dynamic_threshold = int(average_daily_sales * safety_multiplier)
-    
-    return max(1, dynamic_threshold) if total_quantity_sold > 0 else (item.min_stock_level if hasattr(item, 'min_stock_level') else 10)
+    queryset = queryset if queryset is not None else Item.objects.all()
+    return annotate_min_levels(queryset).filter(stock__lt=F('effective_min_level'))
@@ -0,0 +1,205 @@
+"""
+Inventory valuation by category and dead-stock reports.
+
+CategoryValuation holds the running stock value (stock x price), units and
+item count per category. On SQLite, triggers on Inventory_item apply each
+insert, delete and stock/price/category change to the affected category
+rows, so sales, restocks, imports and raw SQL all keep it current and the
+report reads one row per category. Item.last_sold_date is raised by
+triggers on POS_saleitemunit, which makes "no sales in N days" a range scan
+on an indexed column instead of a join against the sales history. Other
+backends aggregate Item directly and update last_sold_date from signals.
+
+ValuationSnapshot keeps the closing value per category per day
+(`manage.py snapshot_stock` writes it with the stock snapshots).
+"""
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, Q, Sum
+from django.utils import timezone
+
+from .models import CategoryValuation, Item, ValuationSnapshot
+
+try:
+    from POS.models import SaleItemUnit
+except ImportError:
+    SaleItemUnit = None
+
+DEAD_STOCK_DAYS = 60
+DEAD_STOCK_LIMIT = 500
+
+VALUE_TRIGGERS = ('Inventory_item_value_ai', 'Inventory_item_value_ad', 'Inventory_item_value_au')
+LAST_SOLD_TRIGGERS = ('POS_saleitemunit_last_sold_ai', 'POS_saleitemunit_last_sold_au')
+
+_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+_ADD_NEW = f"""INSERT INTO Inventory_categoryvaluation(category, item_count, units, value, updated_at)
+        VALUES (new.category, 1, new.stock, round(new.stock * new.price, 2), {_NOW})
+        ON CONFLICT(category) DO UPDATE SET item_count = item_count + 1, units = units + excluded.units,
+            value = round(value + excluded.value, 2), updated_at = excluded.updated_at;"""
+_REMOVE_OLD = f"""UPDATE Inventory_categoryvaluation SET item_count = item_count - 1, units = units - old.stock,
+            value = round(value - old.stock * old.price, 2), updated_at = {_NOW}
+        WHERE category = old.category;
+        DELETE FROM Inventory_categoryvaluation WHERE category = old.category AND item_count <= 0;"""
+_RAISE_LAST_SOLD = """UPDATE Inventory_item SET last_sold_date = new.date
+        WHERE id = new.product_id AND (last_sold_date IS NULL OR last_sold_date < new.date);"""
+
+# Same statements as migration 0012, used to repair the totals when a later
+# table rebuild (SQLite ALTER emulation) drops the triggers
+_VALUE_TRIGGER_SQL = [
+    f"""CREATE TRIGGER IF NOT EXISTS Inventory_item_value_ai AFTER INSERT ON Inventory_item BEGIN
+        {_ADD_NEW}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS Inventory_item_value_ad AFTER DELETE ON Inventory_item BEGIN
+        {_REMOVE_OLD}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS Inventory_item_value_au AFTER UPDATE OF stock, price, category ON Inventory_item
+    WHEN old.stock IS NOT new.stock OR old.price IS NOT new.price OR old.category IS NOT new.category
+    BEGIN
+        {_REMOVE_OLD}
+        {_ADD_NEW}
+    END""",
+]
+_LAST_SOLD_TRIGGER_SQL = [
+    f"""CREATE TRIGGER IF NOT EXISTS POS_saleitemunit_last_sold_ai AFTER INSERT ON POS_saleitemunit
+    WHEN new.product_id IS NOT NULL AND new.total_quantity > 0 BEGIN
+        {_RAISE_LAST_SOLD}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS POS_saleitemunit_last_sold_au
+    AFTER UPDATE OF product_id, total_quantity, date ON POS_saleitemunit
+    WHEN new.product_id IS NOT NULL AND new.total_quantity > 0 BEGIN
+        {_RAISE_LAST_SOLD}
+    END""",
+]
+
+
+def uses_valuation_triggers():
+    return connection.vendor == 'sqlite'
+
+
+def ensure_valuation_triggers():
+    """
+    Recreate missing valuation triggers and rebuild the totals they feed
+    (writes made without them were not counted). Returns True if any were missing.
+    """
+    if not uses_valuation_triggers():
+        return False
+    with connection.cursor() as cursor:
+        tables = set(connection.introspection.table_names(cursor))
+        names = list(VALUE_TRIGGERS) + (list(LAST_SOLD_TRIGGERS) if 'POS_saleitemunit' in tables else [])
+        cursor.execute(
+            f"SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name IN ({', '.join(['%s'] * len(names))})",
+            names,
+        )
+        if cursor.fetchone()[0] == len(names):
+            return False
+        for sql in _VALUE_TRIGGER_SQL + (_LAST_SOLD_TRIGGER_SQL if 'POS_saleitemunit' in tables else []):
+            cursor.execute(sql)
+    rebuild_valuation()
+    return True
+
+
+def _value_expression():
+    return ExpressionWrapper(F('stock') * F('price'), output_field=DecimalField(max_digits=16, decimal_places=2))
+
+
+def _aggregate_categories():
+    return (
+        Item.objects.values('category')
+        .annotate(item_count=Count('id'), units=Sum('stock'), value=Sum(_value_expression()))
+        .order_by('category')
+    )
+
+
+def rebuild_valuation():
+    """
+    Recompute the category totals and every item's last-sold date from
+    scratch (repair, or after writes made without the triggers). Returns
+    the number of categories.
+    """
+    rows = [
+        CategoryValuation(
+            category=row['category'], item_count=row['item_count'], units=row['units'] or 0,
+            value=round(row['value'] or 0, 2), updated_at=timezone.now(),
+        )
+        for row in _aggregate_categories()
+    ]
+    with transaction.atomic():
+        CategoryValuation.objects.all().delete()
+        CategoryValuation.objects.bulk_create(rows)
+        if SaleItemUnit is not None:
+            last_sold = (
+                SaleItemUnit.objects.filter(product_id__isnull=False, total_quantity__gt=0)
+                .values('product_id').annotate(last=Max('date')).values_list('product_id', 'last')
+            )
+            Item.objects.exclude(last_sold_date=None).update(last_sold_date=None)
+            by_date = {}
+            for product_id, day in last_sold:
+                by_date.setdefault(day, []).append(product_id)
+            for day, product_ids in by_date.items():
+                Item.objects.filter(id__in=product_ids).update(last_sold_date=day)
+    return len(rows)
+
+
+def record_last_sold(product_id, day):
+    """last_sold_date update for backends without the triggers (called from signals.py)."""
+    if uses_valuation_triggers() or not product_id:
+        return
+    if hasattr(day, 'date'):
+        day = day.date()
+    Item.objects.filter(id=product_id).filter(
+        Q(last_sold_date__isnull=True) | Q(last_sold_date__lt=day)
+    ).update(last_sold_date=day)
+
+
+def category_values():
+    """[{category, item_count, units, value}] ordered by category: one row per category."""
+    if uses_valuation_triggers():
+        return list(
+            CategoryValuation.objects.filter(item_count__gt=0).order_by('category')
+            .values('category', 'item_count', 'units', 'value')
+        )
+    return [
+        {**row, 'units': row['units'] or 0, 'value': round(row['value'] or 0, 2)}
+        for row in _aggregate_categories()
+    ]
+
+
+def inventory_value():
+    """Total stock value across categories."""
+    return sum((row['value'] for row in category_values()), 0)
+
+
+def dead_stock(days=DEAD_STOCK_DAYS, limit=DEAD_STOCK_LIMIT, as_of=None):
+    """
+    Items in stock with no sales in the last `days` days, never-sold and
+    longest-unsold first. Returns a queryset of dicts (id, sku, name,
+    category, stock, price, value, last_sold_date).
+    """
+    cutoff = (as_of or timezone.localdate()) - timedelta(days=days)
+    items = (
+        Item.objects.filter(stock__gt=0)
+        .filter(Q(last_sold_date__isnull=True) | Q(last_sold_date__lt=cutoff))
+        .annotate(value=_value_expression())
+        .order_by(F('last_sold_date').asc(nulls_first=True), 'name', 'id')
+        .values('id', 'sku', 'name', 'category', 'stock', 'price', 'value', 'last_sold_date')
+    )
+    return items[:limit] if limit else items
+
+
+def snapshot_valuation(day=None):
+    """Record the current category values as `day`'s closing values (default today). Returns rows written."""
+    day = day or timezone.localdate()
+    rows = [ValuationSnapshot(date=day, **row) for row in category_values()]
+    with transaction.atomic():
+        ValuationSnapshot.objects.filter(date=day).delete()
+        ValuationSnapshot.objects.bulk_create(rows)
+    return len(rows)
+
+
+def valuation_history(start, end=None):
+    """Daily closing values per category between `start` and `end` (inclusive)."""
+    snapshots = ValuationSnapshot.objects.filter(date__gte=start)
+    if end is not None:
+        snapshots = snapshots.filter(date__lte=end)
+    return list(snapshots.order_by('date', 'category').values('date', 'category', 'item_count', 'units', 'value'))
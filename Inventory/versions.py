@@ -0,0 +1,107 @@
+"""
+Data versions for conditional GET.
+
+DataVersion keeps one counter per group of tables. On SQLite, triggers
+bump the counter on every insert, update and delete, including bulk and
+F() writes. Other backends bump it from model signals (signals.py). Views
+wrapped with `conditional_on(...)` get a strong ETag built from their
+counters, and a Last-Modified header from the latest change. A client
+polling with If-None-Match gets 304 Not Modified after a single primary-key
+query, before the view runs or serializes anything.
+"""
+from datetime import datetime, time
+
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from .models import DataVersion
+
+# counter name -> tables whose writes bump it
+VERSIONED_TABLES = {
+    'item': ('Inventory_item',),
+    'sale': ('POS_sale', 'POS_saleitem', 'POS_saleitemunit', 'POS_dailysalesrecord'),
+    'forecast': ('Sales_forecast_forecastrun', 'Sales_forecast_forecastresult'),
+}
+
+
+def version_trigger_sql(name, table):
+    """CREATE TRIGGER statements bumping counter `name` on writes to `table`."""
+    bump = (
+        "UPDATE Inventory_dataversion SET version = version + 1, "
+        f"updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE name = '{name}';"
+    )
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_version_{op[0].lower()} AFTER {op} ON {table} BEGIN {bump} END"
+        for op in ('INSERT', 'UPDATE', 'DELETE')
+    ]
+
+
+def _trigger_names():
+    return [
+        f"{table}_version_{op}"
+        for tables in VERSIONED_TABLES.values() for table in tables for op in ('i', 'u', 'd')
+    ]
+
+
+def ensure_version_triggers():
+    """Recreate missing counter triggers (table rebuilds drop them). Returns True if any were missing."""
+    if connection.vendor != 'sqlite':
+        return False
+    names = _trigger_names()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name IN ({', '.join(['%s'] * len(names))})",
+            names,
+        )
+        if cursor.fetchone()[0] == len(names):
+            return False
+        existing = set(connection.introspection.table_names(cursor))
+        for name, tables in VERSIONED_TABLES.items():
+            for table in tables:
+                if table in existing:
+                    for sql in version_trigger_sql(name, table):
+                        cursor.execute(sql)
+    return True
+
+
+def bump_version(name):
+    """Counter bump for backends without the triggers (connected in signals.py)."""
+    if not DataVersion.objects.filter(name=name).update(version=F('version') + 1, updated_at=timezone.now()):
+        DataVersion.objects.get_or_create(name=name, defaults={'version': 1})
+
+
+def data_versions(*names):
+    """{name: (version, updated_at)} for the given counters (missing ones read as 0)."""
+    found = {row[0]: row[1:] for row in DataVersion.objects.filter(name__in=names).values_list('name', 'version', 'updated_at')}
+    return {name: found.get(name, (0, None)) for name in names}
+
+
+def conditional_on(*names, daily=False):
+    """
+    View decorator: ETag and Last-Modified from the named counters, so an
+    unchanged resource is answered with 304 without calling the view.
+    daily=True is for views that look back from today: their ETag includes
+    the date and Last-Modified is never before midnight.
+    """
+    def versions(request):
+        # condition() asks for the ETag and Last-Modified separately; read once
+        if not hasattr(request, '_data_versions'):
+            request._data_versions = data_versions(*names)
+        return request._data_versions
+
+    def etag(request, *args, **kwargs):
+        current = versions(request)
+        parts = [f"{name}{current[name][0]}" for name in names]
+        if daily:
+            parts.append(timezone.localdate().isoformat())
+        return '-'.join(parts)
+
+    def last_modified(request, *args, **kwargs):
+        stamps = [updated_at for _, updated_at in versions(request).values() if updated_at]
+        if daily:
+            stamps.append(timezone.make_aware(datetime.combine(timezone.localdate(), time.min)))
+        return max(stamps) if stamps else None
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
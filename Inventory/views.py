@@ -1,65 +1,96 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
-from django.db import models
-from .models import Item
-from .utils import get_dynamic_min_stock_level
-from io import BytesIO
-from openpyxl import Workbook
-from django.http import HttpResponse
+from django.db import IntegrityError, models, transaction
+from .models import Item, ProductDeletionJob
+from .utils import annotate_min_levels, low_stock_queryset
+from django.http import StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from .exports import ReportSheet, stream_report, QUERYSET_CHUNK_SIZE
+from .images import image_exists, invalidate_image_catalogue, search_images
+from .thumbnails import THUMBNAIL_WIDTHS, derivative_name
+from .stock import bulk_restock, increment_stock, set_stock
+from .imports import ImportFormatError, import_products
+from .categories import category_id, category_names
+from .search import SEARCH_LIMIT, search_items
+from .catalog import SCAN_MAX_CODES, catalog_changes, catalog_modified, catalog_version, lookup_codes
+from .versions import conditional_on
+from .sale_sync import SaleSyncError, sync_sales
+from .valuation import DEAD_STOCK_DAYS, category_values, dead_stock, valuation_history
+from .live import async_event_stream, parse_cursor, sync_event_stream
+from .deletion import BACKGROUND_DELETE_THRESHOLD, delete_item_cascade, related_sales_count, start_deletion_job
 from Account_management.models import UserLog, Account
 import uuid
+import csv
+import io
 import json
+import base64
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
 from django.http import JsonResponse
-import os
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import condition
 from django.conf import settings
 
+# Number of low-stock rows rendered in the alert box on first paint
+LOW_STOCK_ALERT_LIMIT = 20
 
-def _get_existing_inventory_images():
-    """Return list of existing images under MEDIA_ROOT/inventory_images as dicts with path and url."""
-    images = []
-    media_root = getattr(settings, 'MEDIA_ROOT', None)
-    media_url = getattr(settings, 'MEDIA_URL', '/media/')
-    if not media_root:
-        return images
+# Keyset pagination settings for the inventory items API
+ITEMS_PAGE_SIZE = 50
+ITEMS_MAX_PAGE_SIZE = 200
+ITEMS_SORT_FIELDS = ('name', 'stock', 'created_at')
+
+# Image picker page size for the existing-images API
+IMAGES_PAGE_SIZE = 48
+IMAGES_MAX_PAGE_SIZE = 200
+
+# Largest delivery accepted by the bulk restock API in one request
+BULK_RESTOCK_MAX_LINES = 20000
 
-    images_dir = os.path.join(media_root, 'inventory_images')
-    if not os.path.isdir(images_dir):
-        return images
+# Days of closing values included in the valuation export
+VALUATION_HISTORY_DAYS = 30
 
-    for fname in sorted(os.listdir(images_dir)):
-        fpath = os.path.join(images_dir, fname)
-        if os.path.isfile(fpath):
-            images.append({
-                'name': fname,
-                'path': os.path.join('inventory_images', fname).replace('\\', '/'),
-                'url': os.path.join(media_url, 'inventory_images', fname).replace('\\', '/')
-            })
-    return images
+
+# Existing server images (paginated, searchable) for the image picker
+@login_required
+def inventory_images_api(request):
+    """
+    Returns a page of previously uploaded images from the cached catalogue.
+    Query params: q (name contains), offset, limit.
+    """
+    try:
+        offset = max(int(request.GET.get('offset', 0)), 0)
+        limit = min(max(int(request.GET.get('limit', IMAGES_PAGE_SIZE)), 1), IMAGES_MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'offset and limit must be integers.'}, status=400)
+
+    results, total = search_images(request.GET.get('q', ''), offset=offset, limit=limit)
+    next_offset = offset + len(results)
+    return JsonResponse({
+        'success': True,
+        'results': results,
+        'total': total,
+        'next_offset': next_offset if next_offset < total else None,
+    })
 
 
 # Main inventory view (list + add)
 @login_required
 def inventory_view(request):
-    products = Item.objects.all().order_by('-id')
-    categories = (
-        Item.objects.exclude(category__isnull=True)
-        .exclude(category__exact='')
-        .values_list('category', flat=True)
-        .distinct()
-    )
-
-    all_items = Item.objects.all()
-    low_stock_items_list = []
-    for item in all_items:
-        dynamic_min_stock = get_dynamic_min_stock_level(item)
-        if item.stock < dynamic_min_stock:
-            low_stock_items_list.append({
-                'name': item.name,
-                'stock': item.stock,
-                'min_level': dynamic_min_stock
-            })
+    categories = category_names()
+
+    # Products themselves are loaded page by page through inventory_items_api;
+    # only a bounded slice of low-stock rows is rendered up front.
+    low_stock_qs = low_stock_queryset().order_by('stock', 'id')
+    low_stock_items_list = [
+        {'id': row['id'], 'name': row['name'], 'stock': row['stock'], 'min_level': row['effective_min_level']}
+        for row in low_stock_qs.values('id', 'name', 'stock', 'effective_min_level')[:LOW_STOCK_ALERT_LIMIT]
+    ]
+    low_stock_more = 0
+    if len(low_stock_items_list) == LOW_STOCK_ALERT_LIMIT:
+        low_stock_more = low_stock_qs.count() - LOW_STOCK_ALERT_LIMIT
 
     if request.method == 'POST':
         name = request.POST.get('name', '').strip()
@@ -98,6 +129,9 @@ def inventory_view(request):
                 image=image_field_value,
             )
 
+            if image:
+                invalidate_image_catalogue()
+
             UserLog.objects.create(
                 user=request.user,
                 action='add',
@@ -112,13 +146,274 @@ def inventory_view(request):
             print(f"Error adding product: {e}")
 
     return render(request, 'Inventory/inventory.html', {
-        'products': products,
+        'product_count': Item.objects.count(),
         'categories': categories,
         'low_stock_items': low_stock_items_list,
-        'existing_images': _get_existing_inventory_images()
+        'low_stock_more': low_stock_more,
+        'page_size': ITEMS_PAGE_SIZE,
     })
 
 
+def _encode_cursor(sort_value, item_id):
+    """Pack the last row's sort key and id into an opaque URL-safe cursor."""
+    raw = json.dumps([sort_value, item_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def _decode_cursor(cursor, sort_field):
+    """Inverse of _encode_cursor; raises ValueError on malformed input."""
+    try:
+        sort_value, item_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError("Invalid cursor.")
+    if sort_field == 'created_at':
+        sort_value = parse_datetime(sort_value or '')
+        if sort_value is None:
+            raise ValueError("Invalid cursor.")
+    return sort_value, int(item_id)
+
+
+def _parse_price(value):
+    """Parse an optional price filter; raises ValueError on bad input."""
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f"Invalid price: {value}")
+
+
+# Inventory listing API (keyset paginated)
+@login_required
+@conditional_on('item', 'sale', daily=True)
+def inventory_items_api(request):
+    """
+    Returns one page of inventory items as JSON.
+
+    Query params: category, low_stock (1/true), min_price, max_price,
+    sort (name, stock or created_at; prefix with '-' for descending),
+    limit and cursor (the `next_cursor` of the previous page).
+    Pages are fetched with a keyset (seek) condition on (sort field, id),
+    so every page costs the same no matter how deep the client scrolls.
+    """
+    sort = request.GET.get('sort', 'name')
+    descending = sort.startswith('-')
+    sort_field = sort.lstrip('-')
+    if sort_field not in ITEMS_SORT_FIELDS:
+        return JsonResponse({'success': False, 'message': f"Unsupported sort field '{sort_field}'."}, status=400)
+
+    try:
+        limit = min(max(int(request.GET.get('limit', ITEMS_PAGE_SIZE)), 1), ITEMS_MAX_PAGE_SIZE)
+        min_price = _parse_price(request.GET.get('min_price'))
+        max_price = _parse_price(request.GET.get('max_price'))
+        cursor = request.GET.get('cursor')
+        after = _decode_cursor(cursor, sort_field) if cursor else None
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+    qs = annotate_min_levels(Item.objects.all())
+    category = request.GET.get('category', '').strip()
+    if category:
+        # Indexed foreign-key lookup; the id comes from the cached category list
+        ref_id = category_id(category)
+        qs = qs.filter(category_ref_id=ref_id) if ref_id else qs.none()
+    if request.GET.get('low_stock', '').lower() in ('1', 'true', 'yes'):
+        qs = qs.filter(stock__lt=models.F('effective_min_level'))
+    if min_price is not None:
+        qs = qs.filter(price__gte=min_price)
+    if max_price is not None:
+        qs = qs.filter(price__lte=max_price)
+
+    if after is not None:
+        last_value, last_id = after
+        op = 'lt' if descending else 'gt'
+        qs = qs.filter(
+            models.Q(**{f'{sort_field}__{op}': last_value})
+            | models.Q(**{sort_field: last_value, f'id__{op}': last_id})
+        )
+    prefix = '-' if descending else ''
+    qs = qs.order_by(f'{prefix}{sort_field}', f'{prefix}id')
+
+    rows = list(qs.values(
+        'id', 'sku', 'name', 'category', 'price', 'stock', 'min_stock_level',
+        'effective_min_level', 'color_hex', 'image', 'image_digest', 'created_at'
+    )[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    media_url = getattr(settings, 'MEDIA_URL', '/media/')
+    results = [{
+        'id': row['id'],
+        'sku': row['sku'],
+        'name': row['name'],
+        'category': row['category'],
+        'price': str(row['price']),
+        'stock': row['stock'],
+        'min_stock_level': row['min_stock_level'],
+        'min_level': row['effective_min_level'],
+        'is_low_stock': row['stock'] < row['effective_min_level'],
+        'color_hex': row['color_hex'],
+        'image_url': f"{media_url}{row['image']}" if row['image'] else None,
+        'thumbnail_url': (
+            f"{media_url}{derivative_name(row['image'], row['image_digest'], THUMBNAIL_WIDTHS[0], 'webp')}"
+            if row['image'] and row['image_digest'] else None
+        ),
+        'created_at': row['created_at'].isoformat(),
+    } for row in rows]
+
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        last_value = last[sort_field]
+        if sort_field == 'created_at':
+            last_value = last_value.isoformat()
+        next_cursor = _encode_cursor(last_value, last['id'])
+
+    return JsonResponse({'success': True, 'results': results, 'next_cursor': next_cursor, 'has_more': has_more})
+
+
+# Product search (ranked prefix match on name, SKU and category)
+@login_required
+def inventory_search_api(request):
+    """
+    Query params: q (search text), limit. Results are ordered best match first.
+    """
+    try:
+        limit = int(request.GET.get('limit', SEARCH_LIMIT))
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'limit must be an integer.'}, status=400)
+
+    media_url = getattr(settings, 'MEDIA_URL', '/media/')
+    rows = search_items(
+        request.GET.get('q', ''), limit=limit,
+        fields=('id', 'sku', 'name', 'category', 'price', 'stock', 'color_hex', 'image', 'image_digest'),
+    )
+    results = [{
+        'id': row['id'],
+        'sku': row['sku'],
+        'name': row['name'],
+        'category': row['category'],
+        'price': str(row['price']),
+        'stock': row['stock'],
+        'color_hex': row['color_hex'],
+        'image_url': f"{media_url}{row['image']}" if row['image'] else None,
+        'thumbnail_url': (
+            f"{media_url}{derivative_name(row['image'], row['image_digest'], THUMBNAIL_WIDTHS[0], 'webp')}"
+            if row['image'] and row['image_digest'] else None
+        ),
+    } for row in rows]
+    return JsonResponse({'success': True, 'results': results})
+
+
+# Barcode scans resolved against the in-memory SKU snapshot (see catalog.py)
+@login_required
+def inventory_scan_api(request):
+    """
+    Resolves a batch of scanned codes in one call, without a query per code.
+    POST JSON {"codes": [...]} or GET ?codes=a,b,c. Unknown codes are listed
+    under `missing`. `version` is the catalogue version the answer came from.
+    """
+    if request.method == 'POST':
+        try:
+            codes = json.loads(request.body or b'{}').get('codes')
+        except (ValueError, AttributeError):
+            return JsonResponse({'success': False, 'message': 'Invalid JSON body.'}, status=400)
+    else:
+        codes = [code for code in request.GET.get('codes', '').split(',') if code.strip()]
+    if not isinstance(codes, list) or not all(isinstance(code, (str, int)) for code in codes):
+        return JsonResponse({'success': False, 'message': 'codes must be a list of strings.'}, status=400)
+    if len(codes) > SCAN_MAX_CODES:
+        return JsonResponse({'success': False, 'message': f'At most {SCAN_MAX_CODES} codes per request.'}, status=400)
+
+    version, found = lookup_codes([str(code) for code in codes])
+    return JsonResponse({
+        'success': True,
+        'version': version,
+        'items': {code: item for code, item in found.items() if item is not None},
+        'missing': [code for code, item in found.items() if item is None],
+    })
+
+
+# Validators for the catalogue API come from the snapshot itself, so a 304
+# never hides a change the snapshot already serves
+def _catalog_etag(request, *args, **kwargs):
+    return f"catalog{catalog_version()}"
+
+
+def _catalog_last_modified(request, *args, **kwargs):
+    return catalog_modified()
+
+
+# Catalogue delta for terminals that keep their own copy
+@login_required
+@condition(etag_func=_catalog_etag, last_modified_func=_catalog_last_modified)
+def inventory_catalog_api(request):
+    """
+    Query param: since (the `version` of the client's copy). Returns the
+    items changed and the ids removed since then; `reset` is true when the
+    whole catalogue is returned instead (no or expired version).
+    """
+    try:
+        since = int(request.GET['since']) if request.GET.get('since') else None
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'since must be an integer.'}, status=400)
+    version, items, removed, reset = catalog_changes(since)
+    return JsonResponse({'success': True, 'version': version, 'reset': reset, 'items': items, 'removed': removed})
+
+
+# Offline terminals upload their queued sales here when they reconnect (see sale_sync.py)
+@login_required
+def sale_sync_api(request):
+    """
+    POST JSON {"terminal": "...", "sales": [{"client_id": "<uuid>", "date": "...",
+    "payment_method": "Cash", "discount": "0", "amount_given": "...",
+    "items": [{"product_id": 1, "quantity": 2, "price": "10.00"}]}, ...]}.
+    Returns one result per sale: created and duplicate sales can be dropped
+    from the terminal's queue, rejected ones carry a message.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Invalid request method.'}, status=405)
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Invalid JSON body.'}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({'success': False, 'message': 'Body must be a JSON object.'}, status=400)
+    try:
+        terminal = str(payload.get('terminal') or '')
+        results = sync_sales(payload.get('sales'), terminal=terminal, user=request.user)
+    except SaleSyncError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    except IntegrityError:
+        # Another upload of the same sales committed first; a retry reports them as duplicates
+        return JsonResponse({'success': False, 'message': 'Upload conflicted with another; retry it.'}, status=409)
+
+    counts = {status: 0 for status in ('created', 'duplicate', 'rejected')}
+    for result in results:
+        counts[result['status']] += 1
+    return JsonResponse({'success': True, 'results': results, **counts})
+
+
+# Server-Sent Events stream of stock and sale changes (see live.py)
+@login_required
+def inventory_live_stream(request):
+    """
+    text/event-stream of `stock`, `removed`, `sale` and `reset` events.
+    Reconnects resume from the Last-Event-ID header (or ?since=) so a
+    terminal that dropped off gets what it missed.
+    """
+    since = parse_cursor(request.headers.get('Last-Event-ID') or request.GET.get('since'))
+    if isinstance(request, ASGIRequest):
+        stream = async_event_stream(since)
+    else:
+        stream = sync_event_stream(since)
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
 def update_product(request, product_id):
     product = get_object_or_404(Item, id=product_id)
@@ -128,7 +423,7 @@ def update_product(request, product_id):
         product.name = request.POST.get('name', product.name)
         product.category = request.POST.get('category', product.category)
         product.price = request.POST.get('price', product.price)
-        product.stock = request.POST.get('stock', product.stock)
+        requested_stock = request.POST.get('stock', '')
         product.min_stock_level = request.POST.get('min_stock_level', product.min_stock_level)
 
         # Image replacement handling
@@ -150,9 +445,7 @@ def update_product(request, product_id):
                     product.image = uploaded_image
                 elif selected_image and selected_image.startswith('inventory_images/'):
                     # User selected an existing server image; validate it exists
-                    media_root = getattr(settings, 'MEDIA_ROOT', None)
-                    sel_path = os.path.join(media_root or '', selected_image)
-                    if media_root and os.path.exists(sel_path):
+                    if image_exists(selected_image):
                         try:
                             if product.image and hasattr(product.image, 'delete'):
                                 product.image.delete(save=False)
@@ -177,8 +470,15 @@ def update_product(request, product_id):
                         pass
                     product.image = None
 
-            # Save product after processing all fields
-            product.save()
+            # Save product after processing all fields. Stock is applied on its
+            # own so the ledger records the edit as an adjustment.
+            product.save(update_fields=['name', 'category', 'price', 'min_stock_level', 'image'])
+            if str(requested_stock).strip():
+                set_stock(product.id, int(requested_stock), reference='product edit', user=request.user)
+                product.stock = int(requested_stock)
+            if replace_image:
+                # Files may have been uploaded or deleted under MEDIA_ROOT
+                invalidate_image_catalogue()
         except Exception as e:
             messages.error(request, f"Error updating product image: {e}")
             print(f"Error updating product image: {e}")
@@ -193,17 +493,11 @@ def update_product(request, product_id):
         return redirect('inventory:list')
 
     # GET request - show edit form
-    categories = (
-        Item.objects.exclude(category__isnull=True)
-        .exclude(category__exact='')
-        .values_list('category', flat=True)
-        .distinct()
-    )
+    categories = category_names()
     
     return render(request, 'Inventory/edit_product.html', {
         'product': product,
         'categories': categories,
-        'existing_images': _get_existing_inventory_images()
     })
 
 
@@ -220,69 +514,67 @@ def delete_product(request, product_id):
     if request.method == 'POST':
         product_name = product.name
         product_sku = product.sku
-        product_id_to_delete = product.id
 
         try:
-            from django.db import connection
-            
-            # Use raw SQL for all deletions to bypass any ORM schema issues
-            with connection.cursor() as cursor:
-                
-                # Step 1: Delete from POS.SaleItem
-                try:
-                    cursor.execute("DELETE FROM POS_saleitem WHERE product_id = %s", [product_id_to_delete])
-                    print(f"? Deleted SaleItems for product {product_id_to_delete}")
-                except Exception as e:
-                    print(f"SaleItem deletion: {e}")
-                
-                # Step 2: Delete from Sales_forecast.ForecastResult
-                try:
-                    cursor.execute("DELETE FROM Sales_forecast_forecastresult WHERE product_id = %s", [product_id_to_delete])
-                    print(f"? Deleted ForecastResults for product {product_id_to_delete}")
-                except Exception as e:
-                    print(f"ForecastResult deletion: {e}")
-                
-                # Step 3: Delete from Inventory.RestockLog
-                try:
-                    cursor.execute("DELETE FROM Inventory_restocklog WHERE item_id = %s", [product_id_to_delete])
-                    print(f"? Deleted RestockLogs for product {product_id_to_delete}")
-                except Exception as e:
-                    print(f"RestockLog deletion: {e}")
-                
-                # Step 4: Delete from Inventory.Item
-                try:
-                    cursor.execute("DELETE FROM Inventory_item WHERE id = %s", [product_id_to_delete])
-                    print(f"? Deleted Item (product) {product_id_to_delete}")
-                except Exception as e:
-                    print(f"Item deletion error: {e}")
-                    raise Exception(f"Failed to delete product: {e}")
+            sales_count = related_sales_count(product.id)
+            if sales_count > BACKGROUND_DELETE_THRESHOLD:
+                # Years of history: delete in committed batches so terminals keep selling
+                job = start_deletion_job(product, request.user)
+                UserLog.objects.create(
+                    user=request.user,
+                    action='delete',
+                    description=f"ADMIN DELETE (background job {job.id}): Product '{product_name}' (SKU: {product_sku}) with {sales_count} sales records"
+                )
+                status_url = reverse('inventory:delete_job_status', args=[job.id])
+                messages.info(request, f"Deleting '{product_name}' and {sales_count} sales record(s) in the background. Progress: {status_url}")
+                return redirect('inventory:list')
 
-            # Log the successful deletion
+            removed = delete_item_cascade(product.id)
             UserLog.objects.create(
                 user=request.user,
                 action='delete',
-                description=f"ADMIN DELETE: Product '{product_name}' (SKU: {product_sku}) - All references removed from POS, Sales_forecast, and Inventory"
+                description=f"ADMIN DELETE: Product '{product_name}' (SKU: {product_sku}) - {removed} related records removed from POS, Sales_forecast, and Inventory"
             )
 
             messages.success(request, f"? ADMIN DELETED: Product '{product_name}' (SKU: {product_sku}) and all associated records removed from ALL applications.")
             return redirect('inventory:list')
 
         except Exception as e:
-            error_msg = str(e)
-            messages.error(request, f"? Deletion failed: {error_msg}")
+            # The cascade is transactional, so a failure leaves the product untouched
+            messages.error(request, f"? Deletion failed: {e}")
             print(f"Error during product deletion: {e}")
-            import traceback
-            traceback.print_exc()
             return redirect('inventory:list')
 
     # GET request - show confirmation page (ADMIN ONLY)
     return render(request, 'Inventory/delete_confirmation.html', {
         'product': product,
-        'related_sales_count': 0,
+        'related_sales_count': related_sales_count(product.id),
         'is_admin': request.user.is_superuser or request.user.is_staff
     })
 
 
+# Status of a background product deletion
+@login_required
+def delete_job_status(request, job_id):
+    job = get_object_or_404(ProductDeletionJob, id=job_id)
+    # Only the administrator who started the deletion (or a superuser) may follow it;
+    # every account is staff by default, so is_staff alone would admit everyone
+    if not request.user.is_superuser and job.requested_by_id != request.user.id:
+        return JsonResponse({'success': False, 'message': 'Only the administrator who started this deletion can view it.'}, status=403)
+    return JsonResponse({
+        'success': True,
+        'id': job.id,
+        'item_id': job.item_id,
+        'item_name': job.item_name,
+        'status': job.status,
+        'total_rows': job.total_rows,
+        'deleted_rows': job.deleted_rows,
+        'progress': round(job.progress, 4),
+        'error': job.error,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    })
+
+
 # Restock product view
 @login_required
 def restock_item(request, product_id):
@@ -308,9 +600,8 @@ def restock_item(request, product_id):
                 messages.warning(request, "Please enter a valid restock quantity.")
                 return redirect('inventory:list')
 
-            old_stock = product.stock
-            product.stock += restock_amount
-            product.save()
+            product.stock = increment_stock(product.id, restock_amount, reference='manual restock', user=request.user)
+            old_stock = product.stock - restock_amount
 
             UserLog.objects.create(
                 user=request.user,
@@ -337,37 +628,230 @@ def restock_item(request, product_id):
     return redirect('inventory:list')
 
 
-# Export inventory to Excel
+# Bulk restock (JSON or CSV of sku, quantity, note)
+def _read_restock_lines(request):
+    """
+    Returns ([(line_number, sku, quantity, note)], errors) from a JSON body
+    ({"lines": [{"sku", "quantity", "note"}], "note": default} or a bare list),
+    an uploaded CSV file (`file`) or a text/csv body. CSV needs a header row.
+    `errors` lists JSON lines that are not objects.
+    """
+    content_type = request.headers.get('Content-Type', '')
+    upload = request.FILES.get('file')
+    if upload is not None or content_type.startswith('text/csv'):
+        raw = upload.read() if upload is not None else request.body
+        reader = csv.DictReader(io.StringIO(raw.decode('utf-8-sig')))
+        reader.fieldnames = [(name or '').strip().lower() for name in reader.fieldnames or []]
+        if 'sku' not in reader.fieldnames or 'quantity' not in reader.fieldnames:
+            raise ValueError("CSV must have 'sku' and 'quantity' columns.")
+        default_note = request.POST.get('note', '')
+        return [
+            (reader.line_num, row.get('sku'), row.get('quantity'), row.get('note') or default_note)
+            for row in reader
+        ], []
+
+    payload = json.loads(request.body.decode('utf-8') or '{}')
+    default_note = ''
+    if isinstance(payload, dict):
+        default_note = payload.get('note') or ''
+        payload = payload.get('lines', [])
+    if not isinstance(payload, list):
+        raise ValueError("'lines' must be a list.")
+    lines, errors = [], []
+    for number, line in enumerate(payload, start=1):
+        if isinstance(line, dict):
+            lines.append((number, line.get('sku'), line.get('quantity'), line.get('note') or default_note))
+        else:
+            errors.append({'line': number, 'sku': '', 'message': 'Line must be an object with sku and quantity.'})
+    return lines, errors
+
+
 @login_required
-def export_inventory_to_excel(request):
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Inventory Report"
+def bulk_restock_api(request):
+    """
+    Restocks a whole delivery in one request. SKUs are resolved with one
+    query and stock is added with batched CASE updates; nothing is written
+    unless every line is valid. One RestockLog per line, one UserLog overall.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'POST required.'}, status=405)
+    try:
+        raw_lines, errors = _read_restock_lines(request)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return JsonResponse({'success': False, 'message': f'Invalid restock data: {e}'}, status=400)
+    if not raw_lines and not errors:
+        return JsonResponse({'success': False, 'message': 'No restock lines provided.'}, status=400)
+    if len(raw_lines) + len(errors) > BULK_RESTOCK_MAX_LINES:
+        return JsonResponse({'success': False, 'message': f'At most {BULK_RESTOCK_MAX_LINES} lines per request.'}, status=400)
+
+    skus = {str(sku).strip() for _, sku, _, _ in raw_lines if sku not in (None, '')}
+    item_ids = dict(Item.objects.filter(sku__in=skus).values_list('sku', 'id'))
+
+    lines = []
+    for number, sku, quantity, note in raw_lines:
+        sku = str(sku).strip() if sku is not None else ''
+        try:
+            quantity = int(str(quantity).strip())
+        except (TypeError, ValueError):
+            quantity = 0
+        if sku not in item_ids:
+            errors.append({'line': number, 'sku': sku, 'message': 'Unknown SKU.'})
+        elif quantity <= 0:
+            errors.append({'line': number, 'sku': sku, 'message': 'Quantity must be a positive whole number.'})
+        else:
+            lines.append((item_ids[sku], quantity, (note or '').strip()[:200]))
+    if errors:
+        errors.sort(key=lambda error: error['line'])
+        return JsonResponse({
+            'success': False,
+            'message': f'{len(errors)} line(s) could not be restocked; nothing was changed.',
+            'errors': errors,
+        }, status=400)
+
+    units = sum(quantity for _, quantity, _ in lines)
+    try:
+        with transaction.atomic():
+            new_stock = bulk_restock(lines, reference='bulk restock', user=request.user)
+            UserLog.objects.create(
+                user=request.user,
+                action='restock',
+                description=f"Bulk restock: {len(lines)} line(s), {len(new_stock)} product(s), +{units} units"
+            )
+    except Exception as e:
+        print(f"Error during bulk restock: {e}")
+        return JsonResponse({'success': False, 'message': f'Error during restock: {e}'}, status=500)
+    skus_by_id = {item_id: sku for sku, item_id in item_ids.items()}
+    return JsonResponse({
+        'success': True,
+        'message': f'Restocked {len(new_stock)} product(s) (+{units} units).',
+        'lines': len(lines),
+        'units': units,
+        'stock': {skus_by_id[item_id]: stock for item_id, stock in new_stock.items()},
+    })
+
 
-    headers = ['Product Name', 'SKU', 'Price', 'Category', 'Stock Quantity', 'Date Added']
-    ws.append(headers)
+# Product import (CSV/XLSX, upsert by SKU)
+@login_required
+def import_products_api(request):
+    """
+    Imports an uploaded product catalogue (`file`, .csv or .xlsx). Rows are
+    upserted by SKU in chunks; invalid rows are skipped and listed in `errors`.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'POST required.'}, status=405)
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'success': False, 'message': 'Please choose a CSV or XLSX file.'}, status=400)
+
+    try:
+        result = import_products(upload, upload.name)
+    except (ImportFormatError, UnicodeDecodeError, csv.Error) as e:
+        return JsonResponse({'success': False, 'message': f'Could not read file: {e}'}, status=400)
+    except Exception as e:
+        print(f"Error importing products: {e}")
+        return JsonResponse({'success': False, 'message': f'Error importing products: {e}'}, status=500)
+
+    UserLog.objects.create(
+        user=request.user,
+        action='add',
+        description=f"Imported products from '{upload.name}': {result.created} added, {result.updated} updated, {result.skipped} skipped"
+    )
+    return JsonResponse({
+        'success': True,
+        'message': f'{result.created} product(s) added, {result.updated} updated, {result.skipped} row(s) skipped.',
+        'rows': result.rows,
+        'created': result.created,
+        'updated': result.updated,
+        'skipped': result.skipped,
+        'errors': result.errors,
+    })
 
-    items = Item.objects.all().order_by('name')
 
-    for item in items:
-        ws.append([
-            item.name,
-            item.sku,
-            float(item.price),
-            item.category,
-            item.stock,
-            item.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        ])
+# Export inventory to Excel (or CSV with ?format=csv)
+@login_required
+def export_inventory_to_excel(request):
+    headers = ['Product Name', 'SKU', 'Price', 'Category', 'Stock Quantity', 'Min Stock Level', 'Date Added']
 
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
+    def rows():
+        items = (
+            annotate_min_levels(Item.objects.all())
+            .order_by('name')
+            .values_list('name', 'sku', 'price', 'category', 'stock', 'effective_min_level', 'created_at')
+        )
+        for name, sku, price, category, stock, min_level, created_at in items.iterator(chunk_size=QUERYSET_CHUNK_SIZE):
+            yield [name, sku, float(price), category, stock, min_level, created_at.strftime('%Y-%m-%d %H:%M:%S')]
 
     current_date = timezone.now().strftime('%Y-%m-%d')
-    filename = f"inventory_report_{current_date}.xlsx"
-    response = HttpResponse(
-        buffer.getvalue(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    return response
+    return stream_report(request, f"inventory_report_{current_date}", [
+        ReportSheet(title="Inventory Report", header=headers, rows=rows()),
+    ])
+
+
+def _dead_stock_days(request):
+    return max(int(request.GET.get('days', DEAD_STOCK_DAYS)), 1)
+
+
+# Stock value by category and dead stock, read from the maintained totals (see valuation.py)
+@login_required
+@conditional_on('item', 'sale', daily=True)
+def inventory_valuation_api(request):
+    """
+    Query param: days (dead-stock window, default DEAD_STOCK_DAYS). Returns
+    the value per category, the total, and the items in stock with no sales
+    in that many days.
+    """
+    try:
+        days = _dead_stock_days(request)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'days must be an integer.'}, status=400)
+    categories = category_values()
+    return JsonResponse({
+        'success': True,
+        'total_value': str(sum((row['value'] for row in categories), 0)),
+        'categories': [{**row, 'value': str(row['value'])} for row in categories],
+        'dead_stock_days': days,
+        'dead_stock': [{
+            **row,
+            'price': str(row['price']),
+            'value': str(row['value']),
+            'last_sold_date': row['last_sold_date'].isoformat() if row['last_sold_date'] else None,
+        } for row in dead_stock(days)],
+    })
+
+
+@login_required
+def export_valuation_report(request):
+    """Value by category, daily closing values and dead stock as XLSX (or CSV with ?format=csv)."""
+    try:
+        days = _dead_stock_days(request)
+    except ValueError:
+        days = DEAD_STOCK_DAYS
+    today = timezone.localdate()
+
+    def category_rows():
+        categories = category_values()
+        for row in categories:
+            yield [row['category'], row['item_count'], row['units'], float(row['value'])]
+        yield ['Total', sum(row['item_count'] for row in categories), sum(row['units'] for row in categories),
+               float(sum((row['value'] for row in categories), 0))]
+
+    def history_rows():
+        for row in valuation_history(today - timedelta(days=VALUATION_HISTORY_DAYS)):
+            yield [row['date'].isoformat(), row['category'], row['units'], float(row['value'])]
+
+    def dead_stock_rows():
+        for row in dead_stock(days, limit=None).iterator(chunk_size=QUERYSET_CHUNK_SIZE):
+            yield [
+                row['sku'], row['name'], row['category'], row['stock'], float(row['price']), float(row['value']),
+                row['last_sold_date'].isoformat() if row['last_sold_date'] else 'Never',
+            ]
+
+    return stream_report(request, f"inventory_valuation_{today:%Y-%m-%d}", [
+        ReportSheet(title="Value by Category", header=['Category', 'Items', 'Units', 'Value'],
+                    rows=category_rows(), bold_header=True),
+        ReportSheet(title="Daily Value", header=['Date', 'Category', 'Units', 'Value'],
+                    rows=history_rows(), bold_header=True),
+        ReportSheet(title=f"No Sales in {days} Days",
+                    header=['SKU', 'Product Name', 'Category', 'Stock', 'Price', 'Value', 'Last Sold'],
+                    rows=dead_stock_rows(), bold_header=True),
+    ])
@@ -1,4 +1,6 @@
-from django.core.management.base import BaseCommand
+import time as timer
+
+from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
 from datetime import datetime, timedelta, time as dtime
 import random
@@ -16,6 +18,11 @@ try:
 except Exception:
     Item = None
 
+try:
+    from Inventory.synthetic import generate_sales
+except Exception:
+    generate_sales = None
+
 SAMPLE_NAMES = [
     "SkyGlow 1L", "MaxGlow 1L", "Dishwash Pro 1L", "SparkClean 500ml",
     "HandWash 250ml", "FloorClean 2L"
@@ -28,6 +35,10 @@ class Command(BaseCommand):
         parser.add_argument('--days', type=int, default=30, help='Number of past days to generate (default: 30)')
         parser.add_argument('--max-sales-per-day', type=int, default=6, help='Max number of sales per day (default:6)')
         parser.add_argument('--max-items-per-sale', type=int, default=4, help='Max distinct items per sale (default:4)')
+        parser.add_argument('--seed', type=int, default=None,
+                            help='Draw a reproducible high-volume dataset with NumPy from this seed (see Inventory/synthetic.py)')
+        parser.add_argument('--sales-per-day', type=int, default=300,
+                            help='Average sales per day with --seed (default: 300)')
 
     def handle(self, *args, **options):
         if Sale is None or SaleItem is None:
@@ -38,6 +49,10 @@ class Command(BaseCommand):
         max_sales = options['max_sales_per_day']
         max_items = options['max_items_per_sale']
 
+        if options['seed'] is not None:
+            self._generate_seeded(days, options['sales_per_day'], max_items, options['seed'])
+            return
+
         tz = timezone.get_current_timezone()
         today = timezone.now().date()
 
@@ -104,3 +119,18 @@ class Command(BaseCommand):
                 created += 1
 
         self.stdout.write(self.style.SUCCESS(f'Generated {created} dummy sales/transactions for last {days} days.'))
+
+    def _generate_seeded(self, days, sales_per_day, max_items, seed):
+        if generate_sales is None:
+            raise CommandError('Inventory.synthetic is not available.')
+        if days < 1 or sales_per_day < 1 or max_items < 1:
+            raise CommandError('--days, --sales-per-day and --max-items-per-sale must be positive.')
+        started = timer.monotonic()
+        try:
+            result = generate_sales(days=days, sales_per_day=sales_per_day, max_items=max_items, seed=seed)
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {result.sales} sales with {result.lines} lines from {result.first_day} to '
+            f'{result.last_day} (seed {seed}) in {timer.monotonic() - started:.1f}s.'
+        ))
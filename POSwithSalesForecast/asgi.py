@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Serve it under ASGI so the live inventory stream (/inventory/api/live/) costs
+an asyncio task per terminal instead of a worker thread:
+
+    gunicorn POSwithSalesForecast.asgi:application -k uvicorn.workers.UvicornWorker
 """
 
 import os
@@ -73,6 +73,16 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Several terminals write concurrently: take the write lock when a
+        # transaction starts and wait for it instead of failing immediately
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # A file-backed test database so threaded tests share real locking
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -127,3 +137,10 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
 # Forecast models directory
 FORECAST_MODELS_DIR = os.path.join(BASE_DIR, 'forecast_models')
+
+# Sales archive (Inventory/archive.py): months of sales older than
+# SALES_ARCHIVE_AFTER_DAYS move to compressed files here; 'parquet' needs
+# pyarrow and falls back to gzip CSV without it
+SALES_ARCHIVE_DIR = os.path.join(BASE_DIR, 'sales_archive')
+SALES_ARCHIVE_AFTER_DAYS = 730
+SALES_ARCHIVE_FORMAT = 'parquet'
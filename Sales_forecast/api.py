@@ -3,15 +3,17 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAdminUser
 from rest_framework import status
 from django.utils.dateparse import parse_date
-from django.db.models import Avg
 import pandas as pd
 import datetime
 
 from .ml_pipeline import load_model, predict_future_sales, train_and_persist_default
 from django.conf import settings
 from .demo_mode import ForecastDemoMode  # Demo utilities (kept for explicit demo testing only)
+from .restock import recommendations_by_date, restock_plan as build_restock_plan
 from POS.utils import get_daily_sales_df
 from django.utils import timezone
+from django.utils.decorators import method_decorator
+from Inventory.versions import conditional_on
 
 # Minimum historical points required before showing model forecast
 MIN_HISTORY_FOR_FORECAST = 30
@@ -20,6 +22,8 @@ from .serializers import ForecastResponseSerializer
 class ForecastAPIView(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    # Polls with an unchanged ETag get 304 before any forecasting work
+    @method_decorator(conditional_on('sale', 'forecast', 'item', daily=True))
     def get(self, request):
         horizon = int(request.query_params.get('horizon', 7))
         product_id = request.query_params.get('product_id')
@@ -137,68 +141,17 @@ class ForecastAPIView(APIView):
             forecast_records = []
         
         # ✅ Add product restock recommendations based on predicted sales
+        restock_plan = []
         restock_recommendations = {}
         try:
-            from Inventory.models import Item
-            from POS.models import SaleItemUnit
-            
-            # Get all products with their current stock
-            products = Item.objects.all().values('id', 'name', 'sku', 'stock')
-            
-            # Get recent product sales (last 7 days) to identify top-selling products
-            week_ago = timezone.now().date() - datetime.timedelta(days=7)
-            recent_product_sales = (
-                SaleItemUnit.objects.filter(date__gte=week_ago)
-                .values('product_id', 'product_name')
-                .annotate(avg_daily=Avg('total_quantity'))
-                .order_by('-avg_daily')
+            restock_plan = build_restock_plan()
+            # The forecast table shows one product per date with predicted sales
+            restock_recommendations = recommendations_by_date(
+                restock_plan, [r['date'] for r in forecast_records if float(r['predicted'] or 0) > 0]
             )
-            
-            # Create a dict of product sales patterns
-            product_sales_patterns = {r['product_id']: {
-                'name': r['product_name'],
-                'avg_daily': float(r['avg_daily'] or 0),
-            } for r in recent_product_sales if r['product_id']}
-            
-            # For each forecast date, recommend which products to restock
-            for forecast_record in forecast_records:
-                forecast_date = forecast_record['date']
-                predicted_sales = float(forecast_record['predicted'] or 0)
-                
-                restock_list = []
-                
-                # If predicted sales are positive, recommend best-selling products with low stock
-                if predicted_sales > 0 and product_sales_patterns:
-                    # Check all products
-                    for product in products:
-                        product_id = product['id']
-                        if product_id in product_sales_patterns:
-                            pattern = product_sales_patterns[product_id]
-                            avg_daily = pattern['avg_daily']
-                            current_stock = product['stock']
-                            
-                            # Recommend restock if:
-                            # 1. Product is frequently sold (avg_daily > 0)
-                            # 2. Current stock is low (less than 2 days of average sales)
-                            if avg_daily > 0 and current_stock < (avg_daily * 2):
-                                restock_list.append({
-                                    'product_id': product_id,
-                                    'product_name': product['name'],
-                                    'sku': product['sku'],
-                                    'current_stock': current_stock,
-                                    'avg_daily_sales': round(avg_daily, 2),
-                                    'suggested_restock': max(int(avg_daily * 7), 10)
-                                })
-                    
-                    # Sort by current_stock (lowest first - restock urgent items first)
-                    restock_list.sort(key=lambda x: x['current_stock'])
-                    
-                    # Take top 1 recommendation for this date (just product name)
-                    if restock_list:
-                        restock_recommendations[str(forecast_date)] = restock_list[0]
         except Exception as e:
             print(f"Restock recommendation error: {str(e)}")
-            restock_recommendations = {}
+            restock_plan, restock_recommendations = [], {}
 
         # Format historical entries as dicts with date as date object (already set above)
         hist_serial = []
@@ -217,6 +170,7 @@ class ForecastAPIView(APIView):
                 'historical': hist_serial,
                 'forecast': [],
                 'restock_recommendations': {},
+                'restock_plan': restock_plan,
                 'meta': {'model': None, 'forced': bool(force)}
             }
             serializer = ForecastResponseSerializer(payload)
@@ -228,6 +182,7 @@ class ForecastAPIView(APIView):
             'historical': hist_serial,
             'forecast': forecast_records,
             'restock_recommendations': restock_recommendations,
+            'restock_plan': restock_plan,
             'meta': {'model': 'statsmodels.SARIMAX', 'forced': bool(force)}
         }
         serializer = ForecastResponseSerializer(payload)
@@ -297,6 +252,7 @@ class DailySalesDetailsAPIView(APIView):
     """
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    @method_decorator(conditional_on('sale', 'item'))
     def get(self, request):
         date_str = request.query_params.get('date')
         
@@ -323,14 +279,27 @@ class DailySalesDetailsAPIView(APIView):
                 sale__date__gte=day_start,
                 sale__date__lte=day_end
             ).select_related('product').order_by('sale__date')
+            lines = [
+                (item.product.id if item.product else None,
+                 item.product.name if item.product else item.product_name,
+                 item.price, item.quantity, item.line_total)
+                for item in sale_items
+            ]
+            
+            # Sales of archived months are read back from their archive files
+            from Inventory.archive import archived_lines, line_rows
+            from Inventory.models import Item
+            archived = line_rows(archived_lines(sale_date))
+            if archived:
+                names = dict(Item.objects.filter(id__in={row[0] for row in archived if row[0]}).values_list('id', 'name'))
+                for product_id, product_name, _day, quantity, price, line_total in archived:
+                    product_id = product_id if product_id in names else None
+                    lines.append((product_id, names.get(product_id, product_name), price, quantity, line_total))
             
             # Group by product
             products_dict = {}
-            for item in sale_items:
-                product_name = item.product.name if item.product else item.product_name
-                product_id = item.product.id if item.product else None
-                unit_price = float(item.price)
-                quantity = item.quantity
+            for product_id, product_name, price, quantity, line_total in lines:
+                unit_price = float(price)
                 
                 if product_name not in products_dict:
                     products_dict[product_name] = {
@@ -342,7 +311,7 @@ class DailySalesDetailsAPIView(APIView):
                     }
                 
                 products_dict[product_name]['quantity'] += quantity
-                products_dict[product_name]['total_amount'] += float(item.line_total)
+                products_dict[product_name]['total_amount'] += float(line_total)
             
             # Get grand total from DailySalesRecord
             from POS.models import DailySalesRecord
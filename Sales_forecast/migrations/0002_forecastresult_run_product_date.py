@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Inventory', '0015_pos_indexes'),
+        ('Sales_forecast', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='forecastresult',
+            index=models.Index(fields=['run', 'product', 'date'], name='Sales_forec_run_id_2b875c_idx'),
+        ),
+    ]
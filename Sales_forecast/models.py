@@ -35,7 +35,8 @@ class ForecastResult(models.Model):
         ordering = ['date']
         indexes = [
             models.Index(fields=['date']),
-            # models.Index(fields=['product_id']) # Removed as product_id is replaced by product ForeignKey,
+            # Per-product forecasts of one run (restock plan, forecast report)
+            models.Index(fields=['run', 'product', 'date']),
         ]
 
     def __str__(self):
@@ -0,0 +1,133 @@
+"""
+Restock recommendations shared by the forecast API, the dashboard export and
+the forecast report.
+
+Stock, demand stats and the latest run's per-product forecasts are loaded
+into arrays with three queries, then days of cover, reorder points and
+suggested quantities are computed for every product in one NumPy pass:
+
+- daily demand: the product's mean forecast over the run's remaining dates,
+  or its recent sales rate (the higher of the 7- and 30-day averages) when
+  the run has no forecast for it
+- reorder point: demand over LEAD_TIME_DAYS plus the product's effective
+  minimum stock level (dynamic when it has sales) as safety stock
+- suggested quantity: enough to reach the reorder point plus REVIEW_DAYS of
+  demand, at least MIN_ORDER_QUANTITY
+
+Products with demand whose stock is below the reorder point are returned,
+fewest days of cover first.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from Inventory.models import Item
+from Inventory.utils import SHORT_WINDOW_DAYS, DEMAND_WINDOW_DAYS, ensure_demand_stats_current
+from .models import ForecastResult, ForecastRun
+
+LEAD_TIME_DAYS = 3
+REVIEW_DAYS = 7
+MIN_ORDER_QUANTITY = 10
+
+
+def _load_items():
+    rows = list(
+        Item.objects.annotate(min_level=Coalesce('demand_stats__dynamic_min_level', 'min_stock_level'))
+        .order_by('id')
+        .values_list('id', 'name', 'sku', 'stock', 'min_level', 'demand_stats__sold_7d', 'demand_stats__sold_30d')
+    )
+    count = len(rows)
+    columns = list(zip(*rows)) if rows else [()] * 7
+    return {
+        'id': np.fromiter(columns[0], dtype=np.int64, count=count),
+        'name': columns[1],
+        'sku': columns[2],
+        'stock': np.fromiter(columns[3], dtype=float, count=count),
+        'min_level': np.fromiter(columns[4], dtype=float, count=count),
+        'sold_7d': np.fromiter((value or 0 for value in columns[5]), dtype=float, count=count),
+        'sold_30d': np.fromiter((value or 0 for value in columns[6]), dtype=float, count=count),
+    }
+
+
+def _forecast_rates(ids, run, as_of):
+    """(mean daily forecast per product, has-forecast mask) aligned with `ids`."""
+    rates = np.zeros(len(ids))
+    has_forecast = np.zeros(len(ids), dtype=bool)
+    if run is None or not len(ids):
+        return rates, has_forecast
+    rows = list(
+        ForecastResult.objects.filter(run=run, product__isnull=False, date__gte=as_of)
+        .values_list('product_id', 'predicted')
+    )
+    if not rows:
+        return rates, has_forecast
+    product_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    predicted = np.fromiter((row[1] for row in rows), dtype=float, count=len(rows))
+    # ids are sorted, so searchsorted maps each forecast row to its product
+    index = np.searchsorted(ids, product_ids)
+    known = (index < len(ids)) & (ids[np.minimum(index, len(ids) - 1)] == product_ids)
+    index, predicted = index[known], np.clip(predicted[known], 0, None)
+    totals = np.bincount(index, weights=predicted, minlength=len(ids))
+    days = np.bincount(index, minlength=len(ids))
+    has_forecast = days > 0
+    np.divide(totals, days, out=rates, where=has_forecast)
+    return rates, has_forecast
+
+
+def restock_plan(as_of=None, run=None):
+    """
+    Ranked restock recommendations for every product, as dicts with
+    product_id, product_name, sku, current_stock, avg_daily_sales,
+    days_of_cover, reorder_point, suggested_restock and restock_by.
+    `run` defaults to the latest ForecastRun.
+    """
+    as_of = as_of or timezone.now().date()
+    ensure_demand_stats_current()
+    items = _load_items()
+    if run is None:
+        run = ForecastRun.objects.order_by('-created_at').first()
+    forecast, has_forecast = _forecast_rates(items['id'], run, as_of)
+
+    history = np.maximum(items['sold_7d'] / SHORT_WINDOW_DAYS, items['sold_30d'] / DEMAND_WINDOW_DAYS)
+    demand = np.where(has_forecast, forecast, history)
+    stock = np.clip(items['stock'], 0, None)
+    cover = np.full(len(stock), np.inf)
+    np.divide(stock, demand, out=cover, where=demand > 0)
+    reorder_point = np.ceil(demand * LEAD_TIME_DAYS) + items['min_level']
+    order_up_to = reorder_point + np.ceil(demand * REVIEW_DAYS)
+    needs = (demand > 0) & (items['stock'] < reorder_point)
+    suggested = np.maximum(order_up_to - items['stock'], MIN_ORDER_QUANTITY)
+    # Order by the time left before the lead time runs out
+    restock_in = np.floor(np.clip(cover - LEAD_TIME_DAYS, 0, None))
+
+    selected = np.flatnonzero(needs)
+    ranked = selected[np.lexsort((items['id'][selected], items['stock'][selected], cover[selected]))]
+    return [{
+        'product_id': int(items['id'][i]),
+        'product_name': items['name'][i],
+        'sku': items['sku'][i] or '',
+        'current_stock': int(items['stock'][i]),
+        'avg_daily_sales': round(float(demand[i]), 2),
+        'days_of_cover': round(float(cover[i]), 1),
+        'reorder_point': int(reorder_point[i]),
+        'suggested_restock': int(suggested[i]),
+        'restock_by': as_of + timedelta(days=int(restock_in[i])),
+    } for i in ranked]
+
+
+def recommendations_by_date(plan, dates):
+    """
+    {date string: recommendation} for the forecast table: each product goes
+    to the first of `dates` on or after its restock_by date, most urgent
+    first, one product per date.
+    """
+    dates = sorted(dates)
+    by_date = {}
+    for recommendation in plan:
+        for day in dates:
+            if day >= recommendation['restock_by'] and str(day) not in by_date:
+                by_date[str(day)] = recommendation
+                break
+    return by_date
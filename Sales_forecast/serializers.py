@@ -15,6 +15,9 @@ class RestockRecommendationSerializer(serializers.Serializer):
     current_stock = serializers.IntegerField()
     avg_daily_sales = serializers.FloatField()
     suggested_restock = serializers.IntegerField()
+    days_of_cover = serializers.FloatField(required=False)
+    reorder_point = serializers.IntegerField(required=False)
+    restock_by = serializers.DateField(required=False)
 
 
 class ForecastResponseSerializer(serializers.Serializer):
@@ -23,4 +26,5 @@ class ForecastResponseSerializer(serializers.Serializer):
     historical = ForecastPointSerializer(many=True)
     forecast = ForecastPointSerializer(many=True)
     restock_recommendations = serializers.DictField(required=False, allow_null=True)
+    restock_plan = RestockRecommendationSerializer(many=True, required=False)
     meta = serializers.DictField()
\ No newline at end of file
@@ -12,9 +12,11 @@ Run with:
 """
 import os
 import tempfile
+import unittest
 from datetime import timedelta
 
 import pandas as pd
+from django.db import connection
 from django.test import TestCase, override_settings, Client
 from django.utils import timezone
 
@@ -26,7 +28,7 @@ from Sales_forecast.ml_pipeline import (
     predict_future_sales,
     train_and_persist_default,
 )
-from Sales_forecast.models import ForecastRun
+from Sales_forecast.models import ForecastResult, ForecastRun
 
 
 class UtilsTests(TestCase):
@@ -183,4 +185,153 @@ class APITests(TestCase):
             if isinstance(payload, dict):
                 self.assertIn("run_id", payload)
         except ValueError:
-            pass
\ No newline at end of file
+            pass
+
+class ReportExportTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        from Inventory.models import Item
+        from Sales_forecast.models import ForecastResult
+
+        self.client.force_login(get_user_model().objects.create_user(username="viewer", password="pass1234"))
+        self.today = timezone.now().date()
+        self.item = Item.objects.create(name="Mop", sku="MOP1", price=50, category="Cleaning", stock=1, min_stock_level=5)
+        SaleItemUnit.objects.create(product_name="Mop", product_id=self.item.id, total_quantity=3, total_revenue=150, date=self.today)
+        run = ForecastRun.objects.create(model_name="test")
+        ForecastResult.objects.create(run=run, date=self.today + timedelta(days=1), product=self.item, predicted=2.4)
+        ForecastResult.objects.create(run=run, date=self.today + timedelta(days=1), product=None, predicted=10.0)
+
+    def test_dashboard_export_streams_all_sections(self):
+        resp = self.client.get("/sales_forecast/export_excel/", {"format": "csv"})
+        self.assertTrue(resp.streaming)
+        text = b"".join(resp.streaming_content).decode("utf-8")
+        self.assertIn("Top Products (Last 7 Days)", text)
+        self.assertIn("Mop,3,150.0", text)
+        # demand 2.4/day from the forecast; reorder point 3 days of it plus the dynamic min level (4)
+        self.assertIn(f"Mop,MOP1,1,2.4,0.4,12,28,{self.today.isoformat()}", text)
+
+    def test_forecast_report_excel_is_streamed(self):
+        from io import BytesIO
+        from openpyxl import load_workbook
+
+        resp = self.client.get("/sales_forecast/forecast_report/", {"excel": "true"})
+        self.assertTrue(resp.streaming)
+        rows = list(load_workbook(BytesIO(b"".join(resp.streaming_content))).active.iter_rows(values_only=True))
+        self.assertEqual(rows[0], ("Date", "Product to Restock", "Units", "Estimated Revenue"))
+        self.assertEqual(sorted(r[1] for r in rows[1:]), ["Mop", "Total Sales"])
+        plan = load_workbook(BytesIO(b"".join(
+            self.client.get("/sales_forecast/forecast_report/", {"excel": "true"}).streaming_content
+        )))["Restock Plan"]
+        self.assertEqual([row[0] for row in plan.iter_rows(values_only=True)], ["Product Name", "Mop"])
+
+
+class RestockEngineTests(TestCase):
+    def setUp(self):
+        from Inventory.models import Item
+
+        self.today = timezone.now().date()
+        self.run = ForecastRun.objects.create(model_name="test")
+        self.soap = Item.objects.create(name="Soap", sku="S1", price=10, category="Bath", stock=3, min_stock_level=2)
+        self.mop = Item.objects.create(name="Mop", sku="M1", price=80, category="Home", stock=20, min_stock_level=5)
+        self.rag = Item.objects.create(name="Rag", sku="R1", price=5, category="Home", stock=0, min_stock_level=5)
+        self.broom = Item.objects.create(name="Broom", sku="B1", price=60, category="Home", stock=1, min_stock_level=5)
+        # Soap: 14 sold this week, no forecast; Mop: forecast 10/day; Broom: no demand at all
+        for days_ago in range(7):
+            SaleItemUnit.objects.create(product_name="Soap", product_id=self.soap.id, total_quantity=2,
+                                        total_revenue=20, date=self.today - timedelta(days=days_ago))
+        SaleItemUnit.objects.create(product_name="Rag", product_id=self.rag.id, total_quantity=1,
+                                    total_revenue=5, date=self.today - timedelta(days=20))
+        from Sales_forecast.models import ForecastResult
+        ForecastResult.objects.bulk_create([
+            ForecastResult(run=self.run, date=self.today + timedelta(days=i), product=self.mop, predicted=10.0)
+            for i in range(1, 4)
+        ])
+
+    def test_plan_is_ranked_by_days_of_cover(self):
+        from Sales_forecast.restock import restock_plan
+
+        plan = restock_plan()
+        self.assertEqual([rec["product_name"] for rec in plan], ["Rag", "Soap", "Mop"])
+        soap = plan[1]
+        self.assertEqual((soap["avg_daily_sales"], soap["days_of_cover"]), (2.0, 1.5))
+        # 3 days of lead time plus the dynamic min level (int(2 * 1.5) = 3)
+        self.assertEqual(soap["reorder_point"], 9)
+        self.assertEqual(soap["suggested_restock"], 20)
+        mop = plan[2]
+        self.assertEqual((mop["avg_daily_sales"], mop["reorder_point"], mop["days_of_cover"]), (10.0, 35, 2.0))
+        self.assertEqual(mop["restock_by"], self.today)
+        self.assertNotIn(self.broom.id, [rec["product_id"] for rec in plan])
+
+    def test_plan_runs_a_fixed_number_of_queries(self):
+        from Sales_forecast.restock import restock_plan
+
+        restock_plan()
+        with self.assertNumQueries(4):
+            # demand-stats freshness check, items, latest run, forecasts
+            restock_plan()
+
+    def test_forecast_api_returns_full_plan(self):
+        from Sales_forecast.restock import recommendations_by_date, restock_plan
+
+        data = self.client.get("/sales_forecast/api/forecast/", {"horizon": 3}).json()
+        self.assertEqual([rec["product_name"] for rec in data["restock_plan"]], ["Rag", "Soap", "Mop"])
+        self.assertEqual(data["restock_plan"][0]["restock_by"], self.today.isoformat())
+        # One product per forecast date, most urgent first
+        dates = [self.today + timedelta(days=i) for i in (1, 2)]
+        by_date = recommendations_by_date(restock_plan(), dates)
+        self.assertEqual([by_date[str(day)]["product_name"] for day in dates], ["Rag", "Soap"])
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.today = timezone.now().date()
+        SaleItemUnit.objects.create(product_name="TOTAL", product_id=None, total_quantity=4, total_revenue=100, date=self.today)
+
+    def test_forecast_api_answers_304_without_running(self):
+        from unittest import mock
+
+        url = "/sales_forecast/api/forecast/"
+        first = self.client.get(url, {"horizon": 3})
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first.has_header("Last-Modified"))
+        etag = first["ETag"]
+        self.assertFalse(etag.startswith("W/"))
+
+        with mock.patch("Sales_forecast.api.get_daily_sales_df") as daily_sales:
+            again = self.client.get(url, {"horizon": 3}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(again.status_code, 304)
+        daily_sales.assert_not_called()
+
+        ForecastRun.objects.create(model_name="test")
+        self.assertEqual(self.client.get(url, {"horizon": 3}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_daily_sales_details_follow_sales(self):
+        url = "/sales_forecast/api/daily_sales_details/"
+        params = {"date": self.today.isoformat()}
+        etag = self.client.get(url, params)["ETag"]
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Bulk writes bypass signals but still bump the counter
+        SaleItemUnit.objects.filter(date=self.today).update(total_quantity=5)
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite-specific')
+class ForecastQueryPlanTests(TestCase):
+    def _plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_run_queries_use_the_run_product_date_index(self):
+        run = ForecastRun.objects.create(model_name="test")
+        for queryset in (
+            # restock.py: the run's per-product forecasts from today on
+            ForecastResult.objects.filter(run=run, product__isnull=False, date__gte=timezone.now().date())
+            .values_list('product_id', 'predicted'),
+            # Dashboard: the run's total forecast
+            ForecastResult.objects.filter(run=run, product_id__isnull=True).order_by('date'),
+        ):
+            plan = self._plan(queryset)
+            self.assertFalse([step for step in plan if step.startswith('SCAN')], plan)
+            self.assertTrue(any('run_id=?' in step and 'product_id' in step for step in plan), plan)
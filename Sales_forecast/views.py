@@ -7,16 +7,14 @@ from django.core.cache import cache
 from django.db.models import Sum
 from django.db.models.functions import TruncMonth
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, JsonResponse
+from django.http import JsonResponse
 from django.shortcuts import render
-from io import BytesIO
-import openpyxl
-from openpyxl.styles import Font
-from openpyxl import Workbook
 from POS.utils import get_daily_sales_df
 from POS.models import SaleItemUnit, DailySalesRecord, Transaction
 from Inventory.models import Item
+from Inventory.exports import ReportSheet, stream_report, QUERYSET_CHUNK_SIZE
 from .models import ForecastRun, ForecastResult
+from .restock import restock_plan
 
 
 
@@ -182,106 +180,77 @@ class SalesForecastDashboardView(LoginRequiredMixin, TemplateView):
 # ------------------------------
 # Export Sales Dashboard to Excel
 # ------------------------------
-@login_required
-def export_sales_dashboard_to_excel(request):
-    """Generates and returns an Excel file of the current sales dashboard data."""
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Sales Dashboard Report"
+RESTOCK_HEADER = [
+    'Product Name', 'SKU', 'Current Stock', 'Avg Daily Sales', 'Days of Cover',
+    'Reorder Point', 'Suggested Quantity', 'Restock By',
+]
+
+
+def _restock_rows(plan):
+    for rec in plan:
+        yield [
+            rec['product_name'], rec['sku'], rec['current_stock'], rec['avg_daily_sales'], rec['days_of_cover'],
+            rec['reorder_point'], rec['suggested_restock'], rec['restock_by'].strftime('%Y-%m-%d'),
+        ]
 
+
+def _dashboard_report_rows():
+    """Rows of the sales dashboard report, produced lazily section by section."""
     # --- Section 1: Top Products (last 7 days) ---
-    ws.append(["Top Products (Last 7 Days)"])
-    ws.append(['Product Name', 'Quantity Sold', 'Revenue'])
+    yield ["Top Products (Last 7 Days)"]
+    yield ['Product Name', 'Quantity Sold', 'Revenue']
     try:
         seven_days_ago = timezone.now().date() - timedelta(days=7)
         top_products_qs = (
             SaleItemUnit.objects.filter(date__gte=seven_days_ago)
-            .values('product_name')
+            .values_list('product_name')
             .annotate(qty_sold=Sum('total_quantity'), revenue=Sum('total_revenue'))
             .order_by('-qty_sold')[:10]
         )
-        for p in top_products_qs:
-            ws.append([p['product_name'], p['qty_sold'], float(p['revenue'])])
+        for product_name, qty_sold, revenue in top_products_qs:
+            yield [product_name, qty_sold, float(revenue)]
     except Exception as e:
-        ws.append([f"Error fetching top products: {e}"])
-    ws.append([]) # Blank row for separation
+        yield [f"Error fetching top products: {e}"]
+    yield [] # Blank row for separation
 
     # --- Section 2: Monthly Sales --- 
-    ws.append(["Monthly Sales (Last 13 Months)"])
-    ws.append(['Month', 'Total Sales'])
+    yield ["Monthly Sales (Last 13 Months)"]
+    yield ['Month', 'Total Sales']
     try:
         monthly_sales_data = (
             DailySalesRecord.objects
             .annotate(month=TruncMonth('date'))
-            .values('month')
+            .values_list('month')
             .annotate(total_sales=Sum('total_sales'))
             .order_by('month')
         )
-
-
-        for ms in monthly_sales_data:
-            ws.append([ms['month'].strftime('%Y-%m'), float(ms['total_sales'])])
+        for month, total_sales in monthly_sales_data.iterator(chunk_size=QUERYSET_CHUNK_SIZE):
+            yield [month.strftime('%Y-%m'), float(total_sales)]
     except Exception as e:
-        ws.append([f"Error fetching monthly sales: {e}"])
-    ws.append([]) # Blank row for separation
+        yield [f"Error fetching monthly sales: {e}"]
+    yield [] # Blank row for separation
 
-    # --- Section 3: Products to Restock (based on next prediction date) ---
-    ws.append(["Products to Restock (Next Predicted Sale Date)"])
-    ws.append(['Product Name', 'Prediction Date', 'Predicted Sales Count', 'Current Stock', 'Min Stock Level'])
+    # --- Section 3: Products to Restock (shared restock engine) ---
+    yield ["Products to Restock"]
+    yield RESTOCK_HEADER
     try:
-        # Get the latest forecast run
-        latest_run = ForecastRun.objects.order_by('-created_at').first()
-        if latest_run:
-            # Filter for product-specific forecasts, ordered by date
-            restock_predictions = ForecastResult.objects.filter(
-                run=latest_run, 
-                product__isnull=False # Only product-specific predictions
-            ).order_by('date', 'product__name')
-
-            seen_products = set()
-            for fr in restock_predictions:
-                # Use fr.product.name directly and check if predicted quantity is below min_stock_level for restock alert
-                if fr.product and fr.product.id not in seen_products:
-                    # Heuristic: if predicted sales exceed current stock or fall below min_stock_level
-                    # For simplicity, let's recommend restock if predicted units are > 0 and stock is below min_stock_level.
-                    # A more complex heuristic would involve comparing predicted units with current stock and min_stock_level.
-                    current_stock = fr.product.stock if fr.product else 0
-                    min_stock_level = fr.product.min_stock_level if fr.product else 0
-
-                    # If current stock + predicted units for next day < min_stock_level, suggest restock
-                    if current_stock < min_stock_level and fr.predicted > 0:
-                         ws.append([fr.product.name, fr.date.strftime('%Y-%m-%d'), round(fr.predicted), current_stock, min_stock_level])
-                         seen_products.add(fr.product.id)
-
-        else:
-             ws.append(["No forecast runs available for restock predictions."])
+        plan = restock_plan()
+        for row in _restock_rows(plan):
+            yield row
+        if not plan:
+            yield ["No products need restocking."]
     except Exception as e:
-        ws.append([f"Error fetching restock predictions: {e}"])
-    ws.append([]) # Blank row for separation
+        yield [f"Error fetching restock predictions: {e}"]
+    yield [] # Blank row for separation
 
-    # Prepare the Excel file for download
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
 
+@login_required
+def export_sales_dashboard_to_excel(request):
+    """Streams an Excel (or CSV with ?format=csv) file of the current sales dashboard data."""
     current_month_year = timezone.now().strftime('%Y-%m')
-    filename = f"sales_dashboard_report_{current_month_year}.xlsx"
-    response = HttpResponse(
-        buffer.getvalue(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    return response
-
-
-
-
-
-
-
-
-
-
+    return stream_report(request, f"sales_dashboard_report_{current_month_year}", [
+        ReportSheet(title="Sales Dashboard Report", rows=_dashboard_report_rows()),
+    ])
 
 
 # ==================== FORECAST REPORT VIEW ====================
@@ -292,11 +261,37 @@ def forecast_report_view(request):
     # Get the latest forecast run
     latest_run = ForecastRun.objects.order_by('-created_at').first()
 
+    if download_excel:
+        header = ['Date', 'Product to Restock', 'Units', 'Estimated Revenue']
+
+        def rows():
+            if not latest_run:
+                return
+            results = (
+                ForecastResult.objects.filter(run=latest_run)
+                .order_by('date', 'product__name')
+                .values_list('date', 'product__name', 'predicted', 'product__price')
+            )
+            for forecast_date, product_name, predicted, price in results.iterator(chunk_size=QUERYSET_CHUNK_SIZE):
+                yield [
+                    forecast_date.isoformat(),
+                    product_name or "Total Sales",
+                    round(predicted),
+                    float(predicted * float(price)) if price else ''
+                ]
+
+        # Write-only sheets cannot be measured after the fact, so use fixed widths
+        return stream_report(request, "forecast_report", [
+            ReportSheet(title="Forecast Report", header=header, rows=rows(), bold_header=True, column_widths=[12, 40, 10, 20]),
+            ReportSheet(title="Restock Plan", header=RESTOCK_HEADER, rows=_restock_rows(restock_plan(run=latest_run)),
+                        bold_header=True, column_widths=[40, 16, 14, 16, 14, 14, 18, 12]),
+        ])
+
     forecast_data = []
     if latest_run:
         # Group forecast results by product and sum predicted units for each date
         # This assumes 'predicted' represents units/quantity for restock prediction
-        forecast_results = ForecastResult.objects.filter(run=latest_run).order_by('date', 'product__name')
+        forecast_results = ForecastResult.objects.filter(run=latest_run).select_related('product').order_by('date', 'product__name')
 
         for result in forecast_results:
             product_name = result.product.name if result.product else "Total Sales"
@@ -307,49 +302,8 @@ def forecast_report_view(request):
                 'total_revenue': result.predicted * result.product.price if result.product and result.product.price else None # Assuming predicted units are needed for total revenue estimation
             })
 
-    if download_excel:
-        workbook = openpyxl.Workbook()
-        sheet = workbook.active
-        sheet.title = "Forecast Report"
-
-        # Add header row
-        header = ['Date', 'Product to Restock', 'Units', 'Estimated Revenue']
-        sheet.append(header)
-
-        # Style header
-        header_font = Font(bold=True)
-        for col_idx in range(1, len(header) + 1):
-            sheet.cell(row=1, column=col_idx).font = header_font
-
-        # Add data rows
-        for data in forecast_data:
-            sheet.append([
-                data['date'].isoformat(),
-                data['product_name'],
-                data['predicted_units'],
-                float(data['total_revenue']) if data['total_revenue'] is not None else ''
-            ])
-
-        # Adjust column widths
-        for col in sheet.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = (max_length + 2)
-            sheet.column_dimensions[column].width = adjusted_width
-
-        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = 'attachment; filename="forecast_report.xlsx"'
-        workbook.save(response)
-        return response
-
     context = {
         'latest_run': latest_run,
         'forecast_data': forecast_data,
     }
-    return render(request, 'Sales_forecast/forecast_report.html', context)
\ No newline at end of file
+    return render(request, 'Sales_forecast/forecast_report.html', context)